@@ -15,13 +15,14 @@ import os
 from pathlib import Path
 
 from dotenv import load_dotenv
-from sse_bus import SESSIONS
+from sse_bus import SESSIONS, event_id_key, sse_event, with_event_id
 from sse_bus import resolve_elicitation
 from starlette.responses import StreamingResponse
 import asyncio
 from pydantic import BaseModel
 import json
-from typing import Any, Dict, List
+import time
+from typing import Any, AsyncIterator, Dict, List
 from mcp_client import MCPClient
 from openai import AsyncAzureOpenAI
 from azure.identity.aio import DefaultAzureCredential, get_bearer_token_provider
@@ -36,7 +37,15 @@ import logging
 import sys, asyncio
 if sys.platform.startswith("win"):
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
-from pg_age_helper import PGAgeHelper
+from pg_age_helper import (
+    BATCH_MAX_ITEMS, EXPAND_MAX_NODES, EXPAND_PER_HOP_LIMIT, NEIGHBORHOOD_FANOUT, PGAgeHelper,
+    SUMMARY_MAX_EDGES, SUMMARY_MAX_GROUPS, decode_cursor, encode_cursor,
+)
+from metrics import DB_CONNECTIONS, DB_QUERY_LATENCY, DB_ROWS_RETURNED, HTTP_LATENCY, render_metrics
+import tracing
+import graph_wire
+import graph_layout
+import response_cache
 
 
 logger = logging.getLogger("uvicorn.error")
@@ -98,6 +107,118 @@ async def _get_pg_helper(graph_name: str) -> PGAgeHelper:
         _pg_helpers[graph_name] = await PGAgeHelper.create(DSN, graph_name)
     return _pg_helpers[graph_name]
 
+DB_CONNECTIONS.set_function(lambda: sum(1 for h in _pg_helpers.values() if not h._conn.closed))
+
+
+def _observe_viewer(operation: str, started: float, rows: list) -> None:
+    DB_QUERY_LATENCY.labels(operation).observe(time.perf_counter() - started)
+    DB_ROWS_RETURNED.labels(operation).observe(len(rows))
+
+
+NDJSON = "application/x-ndjson"
+
+
+def _wants_ndjson(request: Request) -> bool:
+    return NDJSON in request.headers.get("accept", "")
+
+
+async def _ndjson_response(operation: str, records: AsyncIterator[dict]) -> StreamingResponse:
+    """Stream viewer records as NDJSON, one record per line, as they come off the database.
+
+    The first record is fetched before the response starts, so errors raised while the query
+    is set up still become HTTP errors; a failure mid-stream ends it with a {"kind": "error"} line."""
+    started = time.perf_counter()
+    first = await anext(records, None)
+
+    async def lines():
+        count = 0
+        try:
+            rec = first
+            while rec is not None:
+                if rec.get("kind") != "meta":
+                    count += 1
+                yield json.dumps(rec, ensure_ascii=False) + "\n"
+                rec = await anext(records, None)
+        except Exception as e:
+            logger.exception(f"{operation} stream failed")
+            yield json.dumps({"kind": "error", "detail": str(e)}) + "\n"
+        finally:
+            DB_QUERY_LATENCY.labels(operation).observe(time.perf_counter() - started)
+            DB_ROWS_RETURNED.labels(operation).observe(count)
+
+    return StreamingResponse(lines(), media_type=NDJSON)
+
+
+async def _with_next_cursor(records: AsyncIterator[dict], label: str, limit: int) -> AsyncIterator[dict]:
+    """Pass records through, then a {"kind": "meta", "next_cursor"} line (X-Next-Cursor when streaming)."""
+    last, nodes = None, 0
+    async for rec in records:
+        if rec["kind"] == "node":
+            last, nodes = rec["id"], nodes + 1
+        yield rec
+    yield {"kind": "meta", "next_cursor": encode_cursor(label, last) if last and nodes >= limit else None}
+
+
+async def _iter_list(rows: list[dict]) -> AsyncIterator[dict]:
+    for row in rows:
+        yield row
+
+
+def _columnar_response(request: Request, rows: list[dict], headers: dict | None = None, **meta) -> Response | None:
+    """Columnar encoding (graph_wire.py) when the Accept header asks for it, else None."""
+    media_type = graph_wire.negotiate(request.headers.get("accept", ""))
+    if media_type is None:
+        return None
+    body, wire_headers = graph_wire.encode(rows, media_type, request.headers.get("accept-encoding", ""), **meta)
+    return Response(body, media_type=media_type, headers={**(headers or {}), **wire_headers})
+
+
+def _render_viewer(request: Request, rows: list[dict], headers: dict | None = None) -> response_cache.CachedResponse:
+    """Serialize a viewer result once, as the cache stores it (columnar when negotiated, else JSON)."""
+    media_type = graph_wire.negotiate(request.headers.get("accept", ""))
+    if media_type is not None:
+        body, wire_headers = graph_wire.encode(rows, media_type, request.headers.get("accept-encoding", ""))
+        return response_cache.CachedResponse(body, media_type, {**(headers or {}), **wire_headers})
+    body = json.dumps(rows, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+    return response_cache.CachedResponse(body, "application/json", {**(headers or {}), "Vary": "Accept"})
+
+
+def _representation(request: Request) -> str:
+    """The part of the request headers that changes the response bytes (part of the cache key)."""
+    media_type = graph_wire.negotiate(request.headers.get("accept", "")) or "application/json"
+    gzip_ok = media_type != "application/json" and "gzip" in request.headers.get("accept-encoding", "")
+    return media_type + (";gzip" if gzip_ok else "")
+
+
+async def _cached_viewer(request: Request, helper: PGAgeHelper, endpoint: str, params: dict,
+                         render) -> Response:
+    """Serve a viewer GET from the response cache, keyed on the graph version.
+
+    `If-None-Match` with the current ETag gets a 304 before any viewer query runs; otherwise a
+    cached body is returned, or `render()` (async, returning a CachedResponse) runs and is stored."""
+    version = await helper.graph_version()
+    if version is None:
+        response_cache.record(endpoint, "bypass")
+        entry = await render()
+        return Response(entry.body, media_type=entry.media_type, headers=entry.headers)
+
+    key = response_cache.CACHE.key(helper.graph, version, endpoint, params, _representation(request))
+    etag = response_cache.CACHE.etag(version, key)
+    validators = {"ETag": etag, "Cache-Control": "no-cache"}
+    if response_cache.etag_matches(request.headers.get("if-none-match"), etag):
+        known = response_cache.CACHE.peek(key)
+        response_cache.record(endpoint, "not_modified", len(known.body) if known else 0)
+        return Response(status_code=304, headers=validators)
+
+    entry = response_cache.CACHE.get(key)
+    if entry is not None:
+        response_cache.record(endpoint, "hit", len(entry.body))
+    else:
+        response_cache.record(endpoint, "miss")
+        entry = await render()
+        response_cache.CACHE.put(key, entry)
+    return Response(entry.body, media_type=entry.media_type, headers={**entry.headers, **validators})
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     try:
@@ -117,9 +238,37 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET","POST","OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 
+@app.middleware("http")
+async def http_metrics(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template (not raw path) to keep cardinality bounded
+    route = getattr(request.scope.get("route"), "path", "unmatched")
+    HTTP_LATENCY.labels(route, request.method, str(response.status_code)).observe(time.perf_counter() - started)
+    return response
+
+
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """Spans of one trace from the in-memory exporter (TRACE_EXPORTERS must include 'memory')."""
+    if tracing.MEMORY_EXPORTER is None:
+        raise HTTPException(status_code=404, detail="In-memory trace exporter is not enabled")
+    spans = tracing.MEMORY_EXPORTER.spans(trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return {"trace_id": trace_id, "spans": [s.to_dict() for s in sorted(spans, key=lambda s: s.start_ns)]}
+
+
 def _normalize_session_id(raw: str | None, default: str = "default") -> str:
     if not raw:
         return default
@@ -128,26 +277,54 @@ def _normalize_session_id(raw: str | None, default: str = "default") -> str:
 
 @app.get("/events")
 async def sse_events(request: Request):
+    """SSE stream of a session's bus events. Every event carries an `id:` (its Redis Stream
+    entry id); a reconnect with `Last-Event-ID` (sent by EventSource automatically, or the
+    `last_event_id` query parameter) first replays what was missed, from any pod, followed by
+    an `event: replay` frame with {"replayed", "complete"}."""
     sid = request.query_params.get("sid")  
     session_id = _normalize_session_id(sid)
-    print(f"[@app.get(/events)] session={session_id} pod={POD} rev={REV}", flush=True)
+    last_event_id = request.headers.get("last-event-id") or request.query_params.get("last_event_id")
+    print(f"[@app.get(/events)] session={session_id} pod={POD} rev={REV} last_event_id={last_event_id}", flush=True)
+    # Registered before the replay read, so nothing published in between is missed
     session = await SESSIONS.get_or_create(session_id)
 
     async def event_stream():
-        # flush headers immediately (APIM/ACA friendly)
-        yield "event: open\ndata: {}\n\n"
-
-        heartbeat_every = 1.0  # seconds
-        while True:
-            if await request.is_disconnected():
-                break
-            try:
-                msg = await asyncio.wait_for(session.q.get(), timeout=heartbeat_every)
-                print(f"[@app.get(/events)] SSE YIELD session={session_id} msg={msg}...", flush=True)
-                yield msg
-            except asyncio.TimeoutError:
-                # heartbeat — SSE comment keeps the connection alive without triggering client events
-                yield ": heartbeat\n\n"
+        try:
+            # flush headers immediately (APIM/ACA friendly)
+            yield "event: open\ndata: {}\n\n"
+
+            last_seen = (-1, -1)
+            if last_event_id:
+                try:
+                    entries, complete = await SESSIONS.replay(session_id, last_event_id)
+                except Exception as e:
+                    logger.warning(f"SSE replay failed for session {session_id}: {e}")
+                    entries, complete = [], False
+                for event_id, frame in entries:
+                    yield with_event_id(event_id, frame)
+                if entries:
+                    last_seen = event_id_key(entries[-1][0])
+                yield sse_event({"replayed": len(entries), "complete": complete}, event="replay")
+
+            heartbeat_every = 1.0  # seconds
+            while True:
+                # closed: dropped as a slow consumer; ending the stream makes the browser reconnect
+                if session.closed or await request.is_disconnected():
+                    break
+                try:
+                    event_id, msg = await asyncio.wait_for(session.q.get(), timeout=heartbeat_every)
+                    if not event_id:
+                        yield msg  # local marker (e.g. "N events dropped"), not in the stream
+                        continue
+                    if event_id_key(event_id) <= last_seen:
+                        continue  # already sent by the replay
+                    print(f"[@app.get(/events)] SSE YIELD session={session_id} msg={msg}...", flush=True)
+                    yield with_event_id(event_id, msg)
+                except asyncio.TimeoutError:
+                    # heartbeat — SSE comment keeps the connection alive without triggering client events
+                    yield ": heartbeat\n\n"
+        finally:
+            await SESSIONS.release(session)
 
     return StreamingResponse(
         event_stream(),
@@ -210,6 +387,29 @@ class ConversationIn(BaseModel):
     #client_id: str
 
 
+class ExpandIn(BaseModel):
+    seeds: List[int]
+    hops: int = 1
+    direction: str = "both"            # "out" | "in" | "both"
+    edge_types: List[str] = []         # expand only over these edge labels (all if empty)
+    labels: List[str] = []             # admit only neighbors with these node labels (all if empty)
+    per_hop_limit: int = EXPAND_PER_HOP_LIMIT
+    max_nodes: int = EXPAND_MAX_NODES
+
+
+class PathsIn(BaseModel):
+    source: Dict[str, Any]             # {"id": payload.id, "label": optional} or {"graphid": ...}
+    target: Dict[str, Any]
+    max_depth: int = 4
+    k: int = 1                         # number of shortest paths to return
+    direction: str = "both"            # "out" follows edges source -> target, "in" the reverse
+    edge_types: List[str] = []         # traverse only these edge labels (all if empty)
+
+
+class ElementsIn(BaseModel):
+    ids: List[str]                     # vertex and / or edge graphids
+
+
 def _normalize_graph_name(graph_name: str) -> str:
     if graph_name in {"meeting_graph", "meetings_graph"}:
         return "meetings_graph"
@@ -218,48 +418,343 @@ def _normalize_graph_name(graph_name: str) -> str:
 
 # ---- Graph viewer routes ----
 
+@app.get("/graph/cache/stats")
+async def graph_cache_stats():
+    """Viewer response cache size, hit ratio and bytes saved per endpoint."""
+    return response_cache.stats()
+
+
 @app.get("/graph/{graph_name}/discover")
-async def discover_graph_labels(graph_name: str):
-    """Return distinct node labels with counts and sample payload (schema overview)."""
+async def discover_graph_labels(graph_name: str, request: Request):
+    """Return distinct node labels with counts and sample payload (schema overview).
+
+    Cached per graph version, with an ETag (If-None-Match -> 304)."""
     normalized = _normalize_graph_name(graph_name)
     try:
         helper = await _get_pg_helper(normalized)
-        rows = await helper.discover_labels()
-        return rows
+
+        async def render():
+            started = time.perf_counter()
+            rows = await helper.discover_labels()
+            _observe_viewer("discover", started, rows)
+            return _render_viewer(request, rows)
+
+        return await _cached_viewer(request, helper, "discover", {}, render)
     except Exception as e:
         logger.exception(f"discover_graph_labels failed for {normalized}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @app.get("/graph/{graph_name}/nodes")
-async def get_graph_nodes(graph_name: str, limit: int = 100, label: str = ""):
-    """Return nodes (optionally filtered by label) + edges for the graph viewer."""
+async def get_graph_nodes(graph_name: str, request: Request,
+                          limit: int = 100, label: str = "", cursor: str = "", layout: bool = False,
+                          sample: str = "", strategy: str = "proportional", seed: int = 0,
+                          skeleton: bool = False):
+    """Return nodes (optionally filtered by label) + the edges between them for the graph viewer.
+
+    Keyset-paged: a full page sets the X-Next-Cursor header; pass it back as `cursor` (with the
+    same `label`) for the next page. With `Accept: application/x-ndjson` the records are streamed
+    off a server-side cursor and the last line is {"kind": "meta", "next_cursor": ...}.
+    Non-streamed pages are cached per graph version, with an ETag (If-None-Match -> 304).
+    With `layout=true` (non-streamed only) node records carry server-computed x / y
+    (graph_layout.py), cached per (graph, label, limit, page, graph version).
+
+    `sample=system|bernoulli` returns a stratified TABLESAMPLE sample across labels instead of
+    the first page (`strategy` proportional or capped per label, `seed` makes it repeatable);
+    samples are not paged.
+
+    `skeleton=true` sends node properties as {"id", "name", "degree", "skeleton": true} and no
+    edge properties; POST /graph/{graph}/elements returns the full records of inspected ids."""
     normalized = _normalize_graph_name(graph_name)
+    if sample and (sample not in ("system", "bernoulli") or strategy not in ("proportional", "capped")):
+        raise HTTPException(status_code=400, detail="sample must be 'system' or 'bernoulli', strategy 'proportional' or 'capped'")
+    try:
+        after = decode_cursor(cursor, label) if cursor and not sample else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     try:
         helper = await _get_pg_helper(normalized)
-        if label:
-            rows = await helper.get_nodes_by_label(label, limit)
-        else:
-            rows = await helper.get_graph_overview(limit)
-        return rows
+        operation = "sample" if sample else "nodes_by_label" if label else "overview"
+        if sample and _wants_ndjson(request):
+            # Bounded by `limit` like a page; streamed for a uniform client path
+            rows = await helper.sample_overview(limit, label, sample, strategy, seed, skeleton)
+            return await _ndjson_response(operation, _iter_list(rows))
+        if _wants_ndjson(request):
+            return await _ndjson_response(
+                operation, _with_next_cursor(helper.stream_nodes(label, limit, after, skeleton), label, limit),
+            )
+
+        async def render():
+            started = time.perf_counter()
+            if sample:
+                rows = await helper.sample_overview(limit, label, sample, strategy, seed, skeleton)
+            elif label:
+                rows = await helper.get_nodes_by_label(label, limit, after, skeleton)
+            else:
+                rows = await helper.get_graph_overview(limit, after, skeleton)
+            _observe_viewer(operation, started, rows)
+            if layout:
+                version = await helper.graph_version()
+                page = f"sample:{sample}:{strategy}:{seed}" if sample else after
+                key = None if version is None else (helper.graph, label, limit, page, version)
+                graph_layout.apply(rows, await graph_layout.CACHE.coordinates(key, rows))
+            node_ids = [r["id"] for r in rows if r["kind"] == "node"]
+            headers = {}
+            if node_ids and len(node_ids) >= limit and not sample:
+                headers["X-Next-Cursor"] = encode_cursor(label, node_ids[-1])
+            return _render_viewer(request, rows, headers)
+
+        params = {"limit": limit, "label": label, "after": after, "layout": layout, "skeleton": skeleton}
+        if sample:
+            params.update(sample=sample, strategy=strategy, seed=seed)
+        return await _cached_viewer(request, helper, operation, params, render)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.exception(f"get_graph_nodes failed for {normalized}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/graph/{graph_name}/elements")
+async def get_graph_elements(graph_name: str, body: ElementsIn, request: Request):
+    """Full viewer records (properties included) for up to ELEMENTS_MAX_IDS vertex / edge
+    graphids: the details of elements loaded with `skeleton=true`. Unknown ids are skipped.
+    Columnar encodings are negotiated as for the viewer GETs."""
+    normalized = _normalize_graph_name(graph_name)
+    try:
+        helper = await _get_pg_helper(normalized)
+        started = time.perf_counter()
+        rows = await helper.get_elements(body.ids)
+        _observe_viewer("elements", started, rows)
+        entry = _render_viewer(request, rows)
+        return Response(entry.body, media_type=entry.media_type, headers=entry.headers)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception(f"get_graph_elements failed for {normalized}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/graph/{graph_name}/summary")
+async def get_graph_summary(graph_name: str, request: Request, group_by: str = "auto", prefix: str = "",
+                            max_groups: int = SUMMARY_MAX_GROUPS, max_edges: int = SUMMARY_MAX_EDGES):
+    """Label summary graph: one super-node per label (count) and one super-edge per
+    (source label, edge type, target label) with estimated count and average degrees, all from
+    catalog statistics. Graphs with more than `max_groups` labels are grouped by label prefix
+    (`group_by`); `prefix` expands the labels under one prefix. Every record's properties carry
+    a "drill" request (nodes / traverse / summary) for its real elements. Cached per graph
+    version, with an ETag (If-None-Match -> 304)."""
+    normalized = _normalize_graph_name(graph_name)
+    if group_by not in ("auto", "label", "prefix"):
+        raise HTTPException(status_code=400, detail="group_by must be 'auto', 'label', or 'prefix'")
+    max_groups, max_edges = max(1, min(max_groups, 500)), max(0, min(max_edges, 5000))
+    try:
+        helper = await _get_pg_helper(normalized)
+
+        async def render():
+            started = time.perf_counter()
+            rows = await helper.summary_graph(group_by, prefix, max_groups, max_edges)
+            _observe_viewer("summary", started, rows)
+            return _render_viewer(request, rows)
+
+        params = {"group_by": group_by, "prefix": prefix, "max_groups": max_groups, "max_edges": max_edges}
+        return await _cached_viewer(request, helper, "summary", params, render)
+    except Exception as e:
+        logger.exception(f"get_graph_summary failed for {normalized}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @app.get("/graph/{graph_name}/nodes/{node_id}/neighborhood")
-async def get_node_neighborhood(graph_name: str, node_id: int):
-    """Return a node and all its direct neighbors + edges (both directions)."""
+async def get_node_neighborhood(graph_name: str, node_id: int, request: Request, fanout: int = NEIGHBORHOOD_FANOUT):
+    """Return a node and its direct neighbors + edges (both directions), at most `fanout` edges
+    per direction; the node record's "truncated" flags say whether a direction was cut off.
+    Cached per graph version, with an ETag (If-None-Match -> 304)."""
     normalized = _normalize_graph_name(graph_name)
     try:
         helper = await _get_pg_helper(normalized)
-        rows = await helper.get_node_neighborhood(node_id)
-        return rows
+        if _wants_ndjson(request):
+            # Already bounded by the fan-out cap; streamed for a uniform client path
+            rows = await helper.get_node_neighborhood(node_id, fanout)
+            return await _ndjson_response("neighborhood", _iter_list(rows))
+
+        async def render():
+            started = time.perf_counter()
+            rows = await helper.get_node_neighborhood(node_id, fanout)
+            _observe_viewer("neighborhood", started, rows)
+            return _render_viewer(request, rows)
+
+        return await _cached_viewer(request, helper, "neighborhood", {"node": node_id, "fanout": fanout}, render)
     except Exception as e:
         logger.exception(f"get_node_neighborhood failed for node {node_id} in {normalized}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/graph/{graph_name}/traverse")
+async def traverse_graph(graph_name: str, request: Request, direction: str = "out",
+                         src_label: str = "", edge_label: str = "", dst_label: str = "",
+                         src_id: str | None = None, dst_id: str | None = None, edges: bool = True,
+                         fields: str = "", limit: int = 100, cursor: str = ""):
+    """Nodes related by type: (s:src_label)-[e:edge_label]->(t:dst_label) ("in" reverses,
+    "both" matches either way), optionally anchored by src_id / dst_id (payload.id). Empty
+    labels match any. Returns viewer records (sources, targets, then edges when `edges`);
+    `fields` (comma-separated payload keys) trims node properties. `limit` is the page size,
+    at most GRAPH_TRAVERSE_MAX_LIMIT (1000; larger or < 1 is a 400). Keyset-paged through
+    X-Next-Cursor like /nodes, and cached per graph version with an ETag."""
+    normalized = _normalize_graph_name(graph_name)
+    field_list = [f for f in (x.strip() for x in fields.split(",")) if f]
+    scope = json.dumps([direction, src_label, edge_label, dst_label, src_id, dst_id, edges, field_list])
+    try:
+        after = decode_cursor(cursor, scope) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    options = dict(
+        direction=direction, src_label=src_label or None, edge_label=edge_label or None,
+        dst_label=dst_label or None, src_id=src_id, dst_id=dst_id, return_edges=edges,
+        limit=limit, after=after, fields=field_list or None,
+    )
+    try:
+        helper = await _get_pg_helper(normalized)
+
+        async def run() -> tuple[list[dict], dict]:
+            started = time.perf_counter()
+            rows, next_after = await helper.traverse(**options)
+            _observe_viewer("traverse", started, rows)
+            return rows, ({"X-Next-Cursor": encode_cursor(scope, next_after)} if next_after else {})
+
+        if _wants_ndjson(request):
+            rows, headers = await run()
+            response = await _ndjson_response("traverse", _iter_list(rows))
+            response.headers.update(headers)
+            return response
+
+        async def render():
+            rows, headers = await run()
+            return _render_viewer(request, rows, headers)
+
+        return await _cached_viewer(request, helper, "traverse", options, render)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception(f"traverse_graph failed for {normalized}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/graph/{graph_name}/expand")
+async def expand_graph(graph_name: str, body: ExpandIn, request: Request):
+    """k-hop BFS from the seed nodes, one SQL statement per hop, with per-hop and total node
+    budgets. Returns {"elements", "hops", "queries", "truncated"}; node elements carry "hop".
+    With `Accept: application/x-ndjson` each hop is streamed as soon as its statement returns,
+    followed by a {"kind": "meta", "hops", "queries", "truncated"} line."""
+    normalized = _normalize_graph_name(graph_name)
+    if not body.seeds:
+        raise HTTPException(status_code=400, detail="seeds must not be empty")
+    try:
+        helper = await _get_pg_helper(normalized)
+        options = dict(
+            hops=body.hops, direction=body.direction, edge_types=body.edge_types, labels=body.labels,
+            per_hop_limit=body.per_hop_limit, max_nodes=body.max_nodes,
+        )
+        if _wants_ndjson(request):
+            return await _ndjson_response("expand", helper.iter_expand(body.seeds, **options))
+        started = time.perf_counter()
+        result = await helper.expand(body.seeds, **options)
+        _observe_viewer("expand", started, result["elements"])
+        summary = {k: v for k, v in result.items() if k != "elements"}
+        return _columnar_response(request, result["elements"], **summary) or result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.exception(f"expand_graph failed for seeds {body.seeds} in {normalized}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/graph/{graph_name}/paths")
+async def find_graph_paths(graph_name: str, body: PathsIn):
+    """Up to k shortest paths between two nodes by bidirectional BFS (one SQL statement per
+    level, hub nodes not expanded through). Returns {"paths": [{"length", "nodes", "edges",
+    "text"}], "nodes", "edges", "stats"}; 404 when an endpoint matches no node."""
+    normalized = _normalize_graph_name(graph_name)
+    try:
+        helper = await _get_pg_helper(normalized)
+        return await helper.find_paths(
+            body.source, body.target, max_depth=body.max_depth, k=body.k,
+            direction=body.direction, edge_types=body.edge_types or None,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.exception(f"find_graph_paths failed in {normalized}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _read_batch(request: Request) -> list:
+    """Batch items from a JSON array (or {"items": [...]}) or, with Content-Type
+    application/x-ndjson, one item per line (a line that is not JSON fails only that item)."""
+    raw = await request.body()
+    if NDJSON in request.headers.get("content-type", ""):
+        items = []
+        for line in raw.splitlines():
+            if line.strip():
+                try:
+                    items.append(json.loads(line))
+                except ValueError:
+                    items.append(None)
+    else:
+        try:
+            data = json.loads(raw or b"[]")
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON: {e}")
+        items = data.get("items") if isinstance(data, dict) else data
+        if not isinstance(items, list):
+            raise HTTPException(status_code=400, detail="Body must be a JSON array of items")
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per request")
+    return items
+
+
+def _batch_summary(results: list[dict]) -> dict:
+    ok = sum(1 for r in results if r["ok"])
+    return {"created": ok, "failed": len(results) - ok, "results": results}
+
+
+@app.post("/graph/{graph_name}/nodes:batch")
+async def create_nodes_batch(graph_name: str, request: Request):
+    """Bulk node insert: items {"label", "payload"}, as a JSON array or NDJSON. Written with
+    multi-row INSERTs into the label tables, one transaction per chunk; returns per-item
+    results {"index", "ok", "id" | "error"} in input order."""
+    normalized = _normalize_graph_name(graph_name)
+    items = await _read_batch(request)
+    try:
+        helper = await _get_pg_helper(normalized)
+        started = time.perf_counter()
+        results = await helper.insert_nodes_batch(items)
+        _observe_viewer("nodes_batch", started, results)
+        return _batch_summary(results)
+    except Exception as e:
+        logger.exception(f"create_nodes_batch failed for {normalized}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/graph/{graph_name}/edges:batch")
+async def create_edges_batch(graph_name: str, request: Request):
+    """Bulk edge insert: items {"label", "src_label", "dst_label", "src", "dst", "payload"} with
+    src / dst given as payload.id values, as a JSON array or NDJSON. Endpoints are resolved
+    through the payload.id index; per-item results like nodes:batch."""
+    normalized = _normalize_graph_name(graph_name)
+    items = await _read_batch(request)
+    try:
+        helper = await _get_pg_helper(normalized)
+        started = time.perf_counter()
+        results = await helper.create_edges_batch(items)
+        _observe_viewer("edges_batch", started, results)
+        return _batch_summary(results)
+    except Exception as e:
+        logger.exception(f"create_edges_batch failed for {normalized}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 
 
 class SessionManager:
@@ -317,31 +812,37 @@ async def start_conversation(user_id: str, convo: ConversationIn, request: Reque
 
     async def safe_workflow_stream():
         stream = workflow.run_workflow(history)
-        try:
-            async for chunk in stream:
-                yield chunk
-        except asyncio.CancelledError:
-            logger.info(f"conversation stream cancelled session={session_id} user_id={user_id}")
-            return
-        except BaseException as e:
-            logger.exception(f"conversation stream failed session={session_id} user_id={user_id}")
-            error_payload = {
-                "response_message": {
-                    "type": "error",
-                    "message": f"Workflow execution failed: {e}",
+        # Root span of the trace; workflow, agent rounds, MCP calls and DB statements nest under it
+        with tracing.start_span(
+            "start_conversation", kind="server",
+            session_id=session_id, user_id=user_id, graph=normalized_graph_name, mode=orchestration_mode,
+        ) as root_span:
+            try:
+                async for chunk in stream:
+                    yield chunk
+            except asyncio.CancelledError:
+                logger.info(f"conversation stream cancelled session={session_id} user_id={user_id}")
+                return
+            except BaseException as e:
+                logger.exception(f"conversation stream failed session={session_id} user_id={user_id}")
+                error_payload = {
+                    "response_message": {
+                        "type": "error",
+                        "message": f"Workflow execution failed: {e}",
+                    }
                 }
-            }
-            done_payload = {
-                "response_message": {
-                    "type": "done",
-                    "result": None,
+                done_payload = {
+                    "response_message": {
+                        "type": "done",
+                        "result": None,
+                    }
                 }
-            }
-            yield (json.dumps(error_payload, ensure_ascii=False) + "\n").encode("utf-8")
-            yield (json.dumps(done_payload, ensure_ascii=False) + "\n").encode("utf-8")
-        finally:
-            with contextlib.suppress(Exception):
-                await stream.aclose()
+                yield (json.dumps(error_payload, ensure_ascii=False) + "\n").encode("utf-8")
+                yield (json.dumps(done_payload, ensure_ascii=False) + "\n").encode("utf-8")
+            finally:
+                with contextlib.suppress(Exception):
+                    await stream.aclose()
+                tracing.stage_breakdown(root_span.trace_id, pop=True)
 
     return StreamingResponse(
         safe_workflow_stream(),
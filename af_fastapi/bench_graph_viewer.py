@@ -0,0 +1,396 @@
+# bench_graph_viewer.py
+"""
+Graph viewer latency benchmark against a synthetic AGE graph.
+
+Run:  python bench_graph_viewer.py [--rebuild] [--repeats N]
+
+Builds `viewer_bench` (BenchNode vertices, LINKS edges) with one hub per degree in
+HUB_DEGREES, half of each hub's edges outgoing and half incoming, plus one isolated node
+and a CHAIN_LENGTH-long path n1 -> n2 -> ... through the leaves.
+Loading uses direct INSERTs into the label tables (like load_customer_graph.py) and the
+id / start_id / end_id indexes from build_graph_indexes.py.
+
+neighborhood: a node click. "cypher" is the previous implementation (node, out and in
+Cypher queries); "sql" is PGAgeHelper.get_node_neighborhood (one statement, fan-out capped).
+
+overview: the initial viewer load. "cypher" fetched N nodes and 3N arbitrary edges and kept
+those with both endpoints in the node set; "sql" is the induced-subgraph statement.
+
+expand: a 3-hop exploration from hub10. "clicks" calls get_node_neighborhood for every node
+of each ring (what the viewer had to do); "expand" is PGAgeHelper.expand (one statement per hop).
+
+pages: scrolling BenchNode in pages of PAGE_SIZE. "grow" re-requests limit = (page+1) * size
+(the only option before cursors); "keyset" fetches the page after the previous page's last id.
+
+stream: the 10k-node overview as one list vs streamed off a server-side cursor (NDJSON mode):
+time until the first record is available and until the last one.
+
+wire: payload size and decode time of a ~10k-element subgraph as JSON records vs the columnar
+format (graph_wire.py), plain, gzip'd and msgpack-encoded.
+
+writes: WRITE_ROWS nodes and then WRITE_ROWS edges between them, in a separate graph
+(WRITE_BENCH_GRAPH, recreated each run). "per-row" is insert_node / create_edge_by_ids (one
+statement and commit each); "batch" is insert_nodes_batch / create_edges_batch (the
+nodes:batch and edges:batch endpoints). "edge latency vs label size" times single
+create_edge_by_ids calls between vertices of a WRITE_ROWS label and of a BIG_LABEL_ROWS label,
+cold (lookup table) and warm (in-process payload.id cache).
+"""
+
+import os, sys, gzip, json, time, asyncio, statistics
+from psycopg import sql
+
+import msgpack
+
+import graph_wire
+
+from pg_age_helper import DSN, NEIGHBORHOOD_FANOUT, PGAgeHelper
+
+BENCH_GRAPH = os.getenv("BENCH_GRAPH", "viewer_bench")
+HUB_DEGREES = (10, 1_000, 100_000)
+VERTEX_LABEL = "BenchNode"
+EDGE_LABEL = "LINKS"
+CHAIN_LENGTH = 10_000
+OVERVIEW_LIMITS = (100, 1_000, 10_000)
+EXPAND_HOPS = 3
+PAGE_SIZE = 100
+PAGE_DEPTHS = (0, 10, 100, 900)
+WRITE_BENCH_GRAPH = os.getenv("WRITE_BENCH_GRAPH", "write_bench")
+WRITE_ROWS = 2_000
+BIG_LABEL_ROWS = 100_000
+EDGE_SAMPLES = 200
+
+
+async def build_graph(helper: PGAgeHelper) -> None:
+    g = BENCH_GRAPH
+    vertex = sql.Identifier(g, VERTEX_LABEL)
+    edge = sql.Identifier(g, EDGE_LABEL)
+    started = time.perf_counter()
+    async with helper._conn.cursor() as cur:
+        await cur.execute("SELECT 1 FROM ag_catalog.ag_graph WHERE name = %s;", (g,))
+        if await cur.fetchone():
+            await cur.execute("SELECT ag_catalog.drop_graph(%s, true);", (g,))
+        await cur.execute("SELECT ag_catalog.create_graph(%s::name);", (g,))
+        await cur.execute("SELECT ag_catalog.create_vlabel(%s::name, %s::name);", (g, VERTEX_LABEL))
+        await cur.execute("SELECT ag_catalog.create_elabel(%s::name, %s::name);", (g, EDGE_LABEL))
+
+        # Leaf vertices n1..nN, then one hub per degree and an isolated vertex
+        await cur.execute(sql.SQL("""
+            INSERT INTO {} (properties)
+            SELECT ('{{"payload": {{"id": "n' || i || '", "name": "Node ' || i || '"}}}}')::text::ag_catalog.agtype
+            FROM generate_series(1, %s) i;
+        """).format(vertex), (max(HUB_DEGREES),))
+        for name in [f"hub{d}" for d in HUB_DEGREES] + ["isolated"]:
+            await cur.execute(
+                sql.SQL("INSERT INTO {} (properties) VALUES (%s::ag_catalog.agtype);").format(vertex),
+                (json.dumps({"payload": {"id": name, "name": name}}),),
+            )
+
+        for degree in HUB_DEGREES:
+            # First half hub -> leaf, second half leaf -> hub
+            await cur.execute(sql.SQL("""
+                WITH hub AS (
+                    SELECT id FROM {vertex} WHERE (properties::text)::jsonb -> 'payload' ->> 'id' = %(hub)s
+                ),
+                leaves AS (
+                    SELECT id, row_number() OVER (ORDER BY id) AS rn FROM (
+                        SELECT id FROM {vertex}
+                        WHERE (properties::text)::jsonb -> 'payload' ->> 'id' LIKE 'n%%'
+                        ORDER BY id LIMIT %(degree)s
+                    ) l
+                )
+                INSERT INTO {edge} (start_id, end_id, properties)
+                SELECT CASE WHEN l.rn <= %(half)s THEN h.id ELSE l.id END,
+                       CASE WHEN l.rn <= %(half)s THEN l.id ELSE h.id END,
+                       '{{"payload": {{}}}}'::text::ag_catalog.agtype
+                FROM hub h CROSS JOIN leaves l;
+            """).format(vertex=vertex, edge=edge), {"hub": f"hub{degree}", "degree": degree, "half": degree // 2})
+
+        # Leaf path, inserted after the hub edges
+        await cur.execute(sql.SQL("""
+            WITH leaves AS (
+                SELECT id, row_number() OVER (ORDER BY id) AS rn FROM (
+                    SELECT id FROM {vertex} ORDER BY id LIMIT %(n)s
+                ) l
+            )
+            INSERT INTO {edge} (start_id, end_id, properties)
+            SELECT a.id, b.id, '{{"payload": {{}}}}'::text::ag_catalog.agtype
+            FROM leaves a JOIN leaves b ON b.rn = a.rn + 1;
+        """).format(vertex=vertex, edge=edge), {"n": CHAIN_LENGTH})
+
+        for table in (vertex, edge):
+            await cur.execute(sql.SQL("CREATE INDEX ON {} (id);").format(table))
+        await cur.execute(sql.SQL("CREATE INDEX ON {} (start_id);").format(edge))
+        await cur.execute(sql.SQL("CREATE INDEX ON {} (end_id);").format(edge))
+        await cur.execute(sql.SQL("ANALYZE {};").format(vertex))
+        await cur.execute(sql.SQL("ANALYZE {};").format(edge))
+    await helper._conn.commit()
+    print(f"Built {g} in {time.perf_counter() - started:.1f}s")
+
+
+async def vertex_ids(helper: PGAgeHelper) -> dict[str, str]:
+    """payload.id -> graphid text for the hubs and the isolated vertex."""
+    async with helper._conn.cursor() as cur:
+        await cur.execute(sql.SQL("""
+            SELECT id::text AS id, (properties::text)::jsonb -> 'payload' ->> 'id' AS pid
+            FROM {} WHERE (properties::text)::jsonb -> 'payload' ->> 'id' NOT LIKE 'n%';
+        """).format(sql.Identifier(BENCH_GRAPH, VERTEX_LABEL)))
+        return {r["pid"]: r["id"] for r in await cur.fetchall()}
+
+
+async def _cypher(helper: PGAgeHelper, cypher_text: str, columns: list[str], params: dict) -> list[dict]:
+    q = (
+        sql.SQL("SELECT * FROM ag_catalog.cypher(") + sql.Literal(helper.graph)
+        + sql.SQL("::name, $cypher$\n") + sql.SQL(cypher_text) + sql.SQL("\n$cypher$, %s::ag_catalog.agtype)\n")
+        + sql.SQL("AS (" + ", ".join(f"{c} ag_catalog.agtype" for c in columns) + ");")
+    )
+    async with helper._conn.cursor() as cur:
+        await cur.execute(q, (json.dumps(params),))
+        return await cur.fetchall()
+
+
+async def cypher_neighborhood(helper: PGAgeHelper, node_id: str) -> int:
+    """The previous get_node_neighborhood: three sequential Cypher queries (no fan-out cap)."""
+    params = {"node_id": int(node_id)}
+    rows = await _cypher(helper, """
+        MATCH (n) WHERE id(n) = toInteger($node_id)
+        RETURN id(n) AS id, labels(n) AS label, n.payload AS properties
+    """, ["id", "label", "properties"], params)
+    for direction in ("(n)-[e]->(t)", "(n)<-[e]-(t)"):
+        rows += await _cypher(helper, f"""
+            MATCH {direction} WHERE id(n) = toInteger($node_id)
+            RETURN id(t) AS tid, labels(t) AS tlabel, t.payload AS tprops,
+                   id(e) AS eid, type(e) AS elabel, properties(e) AS eprops
+        """, ["tid", "tlabel", "tprops", "eid", "elabel", "eprops"], params)
+    return len(rows)
+
+
+async def sql_neighborhood(helper: PGAgeHelper, node_id: str) -> int:
+    return len(await helper.get_node_neighborhood(node_id))
+
+
+async def cypher_overview(helper: PGAgeHelper, limit: int) -> tuple[int, int]:
+    """The previous get_graph_overview: N nodes, 3N arbitrary edges, endpoint filter in Python."""
+    nodes = await _cypher(helper, """
+        MATCH (n) RETURN id(n) AS id, labels(n) AS label, n.payload AS properties
+        ORDER BY id(n) LIMIT toInteger($lim)
+    """, ["id", "label", "properties"], {"lim": limit})
+    edges = await _cypher(helper, """
+        MATCH (n)-[e]->(t)
+        RETURN id(e) AS id, type(e) AS label, properties(e) AS properties, id(n) AS src, id(t) AS dst
+        LIMIT toInteger($lim)
+    """, ["id", "label", "properties", "src", "dst"], {"lim": limit * 3})
+    ids = {str(r["id"]) for r in nodes}
+    return len(nodes), sum(1 for r in edges if str(r["src"]) in ids and str(r["dst"]) in ids)
+
+
+async def sql_overview(helper: PGAgeHelper, limit: int) -> tuple[int, int]:
+    rows = await helper.get_graph_overview(limit)
+    edges = sum(1 for r in rows if r["kind"] == "edge")
+    return len(rows) - edges, edges
+
+
+async def click_expand(helper: PGAgeHelper, seed: str, hops: int) -> tuple[int, int]:
+    seen, frontier, clicks = {seed}, [seed], 0
+    for _ in range(hops):
+        ring = []
+        for node_id in frontier:
+            clicks += 1
+            for r in await helper.get_node_neighborhood(node_id):
+                if r["kind"] == "node" and r["id"] not in seen:
+                    seen.add(r["id"])
+                    ring.append(r["id"])
+        frontier = ring
+    return len(seen), clicks
+
+
+async def sql_expand(helper: PGAgeHelper, seed: str, hops: int) -> tuple[int, int]:
+    result = await helper.expand([seed], hops=hops, max_nodes=100_000, per_hop_limit=100_000)
+    return sum(1 for r in result["elements"] if r["kind"] == "node"), result["queries"]
+
+
+async def _time(fn, repeats: int) -> tuple[float, int]:
+    size = await fn()  # warm-up (plan cache, label map, buffers)
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), size
+
+
+async def bench_neighborhood(helper: PGAgeHelper, ids: dict[str, str], repeats: int) -> None:
+    print(f"\nneighborhood (fan-out cap {NEIGHBORHOOD_FANOUT} per direction)")
+    print(f"{'node':<12}{'cypher ms':>12}{'records':>10}{'sql ms':>10}{'records':>10}{'speedup':>10}")
+    for name in [f"hub{d}" for d in HUB_DEGREES] + ["isolated"]:
+        node_id = ids[name]
+        legacy_ms, legacy_n = await _time(lambda: cypher_neighborhood(helper, node_id), repeats)
+        new_ms, new_n = await _time(lambda: sql_neighborhood(helper, node_id), repeats)
+        print(f"{name:<12}{legacy_ms:>12.1f}{legacy_n:>10}{new_ms:>10.1f}{new_n:>10}{legacy_ms / new_ms:>9.1f}x")
+
+
+async def bench_overview(helper: PGAgeHelper, repeats: int) -> None:
+    print("\noverview (nodes / edges returned)")
+    print(f"{'limit':<12}{'cypher ms':>12}{'n/e':>14}{'sql ms':>10}{'n/e':>14}")
+    for limit in OVERVIEW_LIMITS:
+        legacy_ms, (ln, le) = await _time(lambda: cypher_overview(helper, limit), repeats)
+        new_ms, (nn, ne) = await _time(lambda: sql_overview(helper, limit), repeats)
+        print(f"{limit:<12}{legacy_ms:>12.1f}{f'{ln}/{le}':>14}{new_ms:>10.1f}{f'{nn}/{ne}':>14}")
+
+
+async def bench_expand(helper: PGAgeHelper, ids: dict[str, str], repeats: int) -> None:
+    print(f"\nexpand ({EXPAND_HOPS} hops from hub10; nodes / queries)")
+    print(f"{'clicks ms':>12}{'n/q':>14}{'expand ms':>12}{'n/q':>14}")
+    seed = ids["hub10"]
+    clicks_ms, (cn, cq) = await _time(lambda: click_expand(helper, seed, EXPAND_HOPS), repeats)
+    expand_ms, (en, eq) = await _time(lambda: sql_expand(helper, seed, EXPAND_HOPS), repeats)
+    print(f"{clicks_ms:>12.1f}{f'{cn}/{cq}':>14}{expand_ms:>12.1f}{f'{en}/{eq}':>14}")
+
+
+async def page_start(helper: PGAgeHelper, page: int) -> str | None:
+    """graphid the keyset query for `page` starts after (None for the first page)."""
+    if page == 0:
+        return None
+    async with helper._conn.cursor() as cur:
+        await cur.execute(sql.SQL("SELECT id::text AS id FROM {} ORDER BY id OFFSET %s LIMIT 1;").format(
+            sql.Identifier(BENCH_GRAPH, VERTEX_LABEL)), (page * PAGE_SIZE - 1,))
+        return (await cur.fetchone())["id"]
+
+
+async def bench_pages(helper: PGAgeHelper, repeats: int) -> None:
+    print(f"\npages ({VERTEX_LABEL}, {PAGE_SIZE} nodes per page)")
+    print(f"{'page':<12}{'grow ms':>12}{'records':>10}{'keyset ms':>12}{'records':>10}")
+    for page in PAGE_DEPTHS:
+        after = await page_start(helper, page)
+        grow_ms, grow_n = await _time(
+            lambda: _count(helper.get_nodes_by_label(VERTEX_LABEL, (page + 1) * PAGE_SIZE)), repeats)
+        keyset_ms, keyset_n = await _time(
+            lambda: _count(helper.get_nodes_by_label(VERTEX_LABEL, PAGE_SIZE, after)), repeats)
+        print(f"{page:<12}{grow_ms:>12.1f}{grow_n:>10}{keyset_ms:>12.1f}{keyset_n:>10}")
+
+
+async def bench_stream(helper: PGAgeHelper, limit: int = 10_000) -> None:
+    started = time.perf_counter()
+    rows = await helper.get_graph_overview(limit)
+    list_ms = (time.perf_counter() - started) * 1000
+    started, first_ms, count = time.perf_counter(), None, 0
+    async for _ in helper.stream_nodes("", limit):
+        count += 1
+        if first_ms is None:
+            first_ms = (time.perf_counter() - started) * 1000
+    stream_ms = (time.perf_counter() - started) * 1000
+    print(f"\nstream (overview, {limit} nodes)")
+    print(f"list:   first/last record {list_ms:.1f} / {list_ms:.1f} ms ({len(rows)} records)")
+    print(f"stream: first/last record {first_ms or 0:.1f} / {stream_ms:.1f} ms ({count} records)")
+
+
+def bench_wire(records: list[dict], repeats: int) -> None:
+    """Size and client-side decode time (bytes -> viewer records) per wire format."""
+    columnar = graph_wire.to_columnar(records)
+    plain_json = json.dumps(records).encode("utf-8")
+    col_json = json.dumps(columnar, separators=(",", ":")).encode("utf-8")
+    col_msgpack = msgpack.packb(columnar, use_bin_type=True)
+    formats = [
+        ("json records", plain_json, lambda b: json.loads(b)),
+        ("json records gzip", gzip.compress(plain_json, 5), lambda b: json.loads(gzip.decompress(b))),
+        ("columnar json", col_json, lambda b: graph_wire.from_columnar(json.loads(b))),
+        ("columnar json gzip", gzip.compress(col_json, 5),
+         lambda b: graph_wire.from_columnar(json.loads(gzip.decompress(b)))),
+        ("columnar msgpack", col_msgpack, lambda b: graph_wire.from_columnar(msgpack.unpackb(b))),
+    ]
+    print(f"\nwire ({len(records)} elements)")
+    print(f"{'format':<22}{'bytes':>12}{'vs json':>10}{'decode ms':>12}")
+    for name, body, decode in formats:
+        samples = []
+        for _ in range(max(1, repeats)):
+            started = time.perf_counter()
+            decode(body)
+            samples.append((time.perf_counter() - started) * 1000)
+        print(f"{name:<22}{len(body):>12}{len(body) / len(plain_json):>9.0%}{statistics.median(samples):>12.1f}")
+
+
+async def bench_writes(rows: int = WRITE_ROWS) -> None:
+    helper = await PGAgeHelper.create(DSN, WRITE_BENCH_GRAPH)
+    try:
+        await helper.recreate_graph()
+        results = []
+        for mode in ("per-row", "batch"):
+            label, edge_label = ("RowNode", "ROW_LINK") if mode == "per-row" else ("BatchNode", "BATCH_LINK")
+            nodes = [{"label": label, "payload": {"id": f"{mode}-{i}", "n": i}} for i in range(rows)]
+            edges = [{"label": edge_label, "src_label": label, "dst_label": label,
+                      "src": f"{mode}-{i}", "dst": f"{mode}-{(i + 1) % rows}", "payload": {"w": i}}
+                     for i in range(rows)]
+            started = time.perf_counter()
+            if mode == "per-row":
+                for item in nodes:
+                    await helper.insert_node(item["payload"], label)
+            else:
+                created = await helper.insert_nodes_batch(nodes)
+                assert all(r["ok"] for r in created), created[:3]
+            node_s = time.perf_counter() - started
+            started = time.perf_counter()
+            if mode == "per-row":
+                for e in edges:
+                    await helper.create_edge_by_ids(label, label, edge_label, e["src"], e["dst"], e["payload"])
+            else:
+                created = await helper.create_edges_batch(edges)
+                assert all(r["ok"] for r in created), created[:3]
+            edge_s = time.perf_counter() - started
+            results.append((mode, node_s, edge_s))
+
+        big = [{"label": "BigNode", "payload": {"id": f"big-{i}"}} for i in range(BIG_LABEL_ROWS)]
+        await helper.insert_nodes_batch(big, chunk_size=10_000)
+        sizes = []
+        for label, prefix, n in (("RowNode", "per-row", rows), ("BigNode", "big", BIG_LABEL_ROWS)):
+            timings = []
+            for phase in ("cold", "warm"):
+                if phase == "cold":
+                    helper._id_cache.clear()
+                samples = []
+                for k in range(EDGE_SAMPLES):
+                    i = (k * 7919) % n
+                    started = time.perf_counter()
+                    await helper.create_edge_by_ids(label, label, "SIZE_LINK", f"{prefix}-{i}", f"{prefix}-{(i + 1) % n}")
+                    samples.append((time.perf_counter() - started) * 1000)
+                timings.append(statistics.median(samples))
+            sizes.append((label, n, *timings))
+    finally:
+        await helper.close()
+    print(f"\nwrites ({rows} nodes, then {rows} edges by payload.id)")
+    print(f"{'path':<12}{'nodes/s':>12}{'edges/s':>12}{'total s':>10}")
+    for mode, node_s, edge_s in results:
+        print(f"{mode:<12}{rows / node_s:>12.0f}{rows / edge_s:>12.0f}{node_s + edge_s:>10.2f}")
+    print("\nedge latency vs label size (create_edge_by_ids, median ms)")
+    print(f"{'label':<12}{'vertices':>10}{'cold ms':>10}{'warm ms':>10}")
+    for label, n, cold_ms, warm_ms in sizes:
+        print(f"{label:<12}{n:>10}{cold_ms:>10.2f}{warm_ms:>10.2f}")
+
+
+async def _count(coro) -> int:
+    return len(await coro)
+
+
+async def main() -> None:
+    repeats = int(sys.argv[sys.argv.index("--repeats") + 1]) if "--repeats" in sys.argv else 5
+    helper = await PGAgeHelper.create(DSN, BENCH_GRAPH)
+    try:
+        async with helper._conn.cursor() as cur:
+            await cur.execute("SELECT 1 FROM ag_catalog.ag_graph WHERE name = %s;", (BENCH_GRAPH,))
+            exists = await cur.fetchone() is not None
+        if "--rebuild" in sys.argv or not exists:
+            await build_graph(helper)
+        ids = await vertex_ids(helper)
+        await bench_neighborhood(helper, ids, repeats)
+        await bench_overview(helper, repeats)
+        await bench_expand(helper, ids, repeats)
+        await bench_pages(helper, repeats)
+        await bench_stream(helper)
+        # ~10k elements: hub1k's 3-hop neighborhood plus the leaf path
+        expanded = await helper.expand([ids["hub1k"]], hops=3, max_nodes=5_000, per_hop_limit=5_000)
+        bench_wire(expanded["elements"], repeats)
+    finally:
+        await helper.close()
+    await bench_writes()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+# bench_layout.py
+"""
+Layout benchmark for graph_layout.py: time to lay out 1k-50k node graphs, all-pairs vs grid
+repulsion, and the cost of a cached lookup.
+
+Run:  python bench_layout.py [--sizes 1000,5000,10000,50000] [--iterations N] [--exact-max N]
+
+Graphs are synthetic and shaped like the viewer's label pages: a random tree (every node
+attached to an earlier one, preferring low ids, so a few hubs emerge) plus 50% extra edges.
+"edge/nn" is mean edge length over mean nearest-neighbour distance: lower means connected
+nodes sit closer than unrelated ones. All-pairs runs are skipped above --exact-max nodes.
+"""
+
+import sys, time, asyncio
+
+import numpy as np
+
+import graph_layout
+
+SIZES = (1_000, 2_000, 5_000, 10_000, 20_000, 50_000)
+NN_SAMPLE = 500
+
+
+def synthetic_graph(n: int, seed: int = 7) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    child = np.arange(1, n)
+    parent = (rng.random(n - 1) ** 2 * child).astype(np.intp)
+    extra = n // 2
+    src = np.concatenate([parent, rng.integers(0, n, extra)])
+    dst = np.concatenate([child, rng.integers(0, n, extra)])
+    return src, dst
+
+
+def quality(pos: np.ndarray, src: np.ndarray, dst: np.ndarray) -> float:
+    edge = np.hypot(*(pos[src] - pos[dst]).T).mean()
+    nearest = []
+    for i in range(min(NN_SAMPLE, len(pos))):
+        d2 = ((pos - pos[i]) ** 2).sum(axis=1)
+        d2[i] = np.inf
+        nearest.append(np.sqrt(d2.min()))
+    return float(edge / np.mean(nearest))
+
+
+def run(n: int, src: np.ndarray, dst: np.ndarray, exact: bool, iterations: int) -> tuple[float, float]:
+    started = time.perf_counter()
+    pos = graph_layout.fruchterman_reingold(
+        n, src, dst, iterations=iterations, exact_max_nodes=n if exact else 0)
+    return (time.perf_counter() - started) * 1000, quality(pos, src, dst)
+
+
+async def cached_lookup_ms(n: int, src: np.ndarray, dst: np.ndarray) -> tuple[float, float]:
+    """(miss ms, hit ms) through LayoutCache, with viewer records as the input."""
+    records = [{"kind": "node", "id": str(i)} for i in range(n)]
+    records += [{"kind": "edge", "id": f"e{i}", "src": str(s), "dst": str(d)} for i, (s, d) in enumerate(zip(src, dst))]
+    cache = graph_layout.LayoutCache()
+    key = ("bench", "", n, None, 1)
+    started = time.perf_counter()
+    await cache.coordinates(key, records)
+    miss = (time.perf_counter() - started) * 1000
+    started = time.perf_counter()
+    await cache.coordinates(key, records)
+    return miss, (time.perf_counter() - started) * 1000
+
+
+async def main() -> None:
+    sizes = (tuple(int(s) for s in sys.argv[sys.argv.index("--sizes") + 1].split(","))
+             if "--sizes" in sys.argv else SIZES)
+    iterations = (int(sys.argv[sys.argv.index("--iterations") + 1])
+                  if "--iterations" in sys.argv else graph_layout.LAYOUT_ITERATIONS)
+    exact_max = int(sys.argv[sys.argv.index("--exact-max") + 1]) if "--exact-max" in sys.argv else 5_000
+
+    print(f"Fruchterman-Reingold, {iterations} iterations, k={graph_layout.LAYOUT_SPACING} "
+          f"(server switches to grid above {graph_layout.LAYOUT_EXACT_MAX_NODES} nodes)")
+    print(f"{'nodes':>8}{'edges':>8}{'all-pairs ms':>14}{'edge/nn':>9}{'grid ms':>10}{'edge/nn':>9}"
+          f"{'cache miss ms':>15}{'hit ms':>8}")
+    for n in sizes:
+        src, dst = synthetic_graph(n)
+        exact = f"{'-':>14}{'-':>9}"
+        if n <= exact_max:
+            exact_ms, exact_q = run(n, src, dst, True, iterations)
+            exact = f"{exact_ms:>14.0f}{exact_q:>9.2f}"
+        grid_ms, grid_q = run(n, src, dst, False, iterations)
+        miss_ms, hit_ms = await cached_lookup_ms(n, src, dst)
+        print(f"{n:>8}{len(src):>8}{exact}{grid_ms:>10.0f}{grid_q:>9.2f}{miss_ms:>15.0f}{hit_ms:>8.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+# bench_paths.py
+"""
+Path engine benchmark: PGAgeHelper.find_paths (bidirectional BFS, graph_paths.py) against the
+variable-length Cypher an agent would otherwise write:
+
+    MATCH p = (a:Src)-[*1..D]-(b:Dst) WHERE a.payload.id = ... AND b.payload.id = ... RETURN p LIMIT k
+
+Run:  python bench_paths.py [--rebuild] [--repeats N] [--scale N] [--timeout-ms N]
+
+Uses the `crm_bench` graph built by bench_traverse.py (built here if it does not exist). Cypher
+runs are cut off by statement_timeout and reported as "timeout".
+"""
+
+import sys, json, time, asyncio, statistics
+
+import psycopg
+from psycopg import sql
+
+from pg_age_helper import DSN, PGAgeHelper
+from bench_traverse import BENCH_GRAPH, build_graph, pick_customer
+
+# (name, source label, source id, target label, target id); "{customer}" / "{other}" are replaced
+# with a mid-sized customer's and another customer's payload.id
+PAIRS = [
+    ("customer -> feature", "Customer", "{customer}", "Feature", "feat_copilot"),
+    ("customer -> product", "Customer", "{customer}", "Product", "prod_core"),
+    ("customer -> customer", "Customer", "{customer}", "Customer", "{other}"),
+]
+DEPTHS = (2, 3, 4)
+K = 3
+
+
+async def cypher_paths(helper: PGAgeHelper, src_label: str, src_id: str, dst_label: str, dst_id: str,
+                       depth: int, k: int, timeout_ms: int) -> int | None:
+    """Row count of the [*1..depth] Cypher, or None if statement_timeout cancelled it."""
+    q = sql.SQL("""
+        SELECT * FROM ag_catalog.cypher({graph}::name, $cypher$
+            MATCH p = (a:{src})-[*1..{depth}]-(b:{dst})
+            WHERE a.payload.id = $src_id AND b.payload.id = $dst_id
+            RETURN p LIMIT {k}
+        $cypher$, %s::ag_catalog.agtype) AS (p ag_catalog.agtype);
+    """.replace("{src}", src_label).replace("{dst}", dst_label)
+       .replace("{depth}", str(depth)).replace("{k}", str(k))).format(graph=sql.Literal(helper.graph))
+    try:
+        async with helper._conn.cursor() as cur:
+            await cur.execute(f"SET LOCAL statement_timeout = {int(timeout_ms)};")
+            await cur.execute(q, (json.dumps({"src_id": src_id, "dst_id": dst_id}),))
+            n = len(await cur.fetchall())
+        await helper._conn.rollback()
+        return n
+    except psycopg.errors.QueryCanceled:
+        await helper._conn.rollback()
+        return None
+
+
+async def _time(fn, repeats: int) -> tuple[float, object]:
+    result = await fn()  # warm-up
+    if result is None:
+        return float("nan"), None
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+
+async def bench_pairs(helper: PGAgeHelper, customer: str, other: str, repeats: int, timeout_ms: int) -> None:
+    print(f"\npaths (k={K}, customer {customer}, other {other}, cypher timeout {timeout_ms} ms)")
+    print(f"{'pair':<24}{'depth':>6}{'cypher ms':>12}{'rows':>6}{'bfs ms':>10}{'paths':>7}{'len':>5}{'levels':>8}")
+    for name, src_label, src_id, dst_label, dst_id in PAIRS:
+        src_id = {"{customer}": customer, "{other}": other}.get(src_id, src_id)
+        dst_id = {"{customer}": customer, "{other}": other}.get(dst_id, dst_id)
+        for depth in DEPTHS:
+            cy_ms, cy_n = await _time(
+                lambda: cypher_paths(helper, src_label, src_id, dst_label, dst_id, depth, K, timeout_ms), repeats)
+            bfs_ms, result = await _time(lambda: helper.find_paths(
+                {"label": src_label, "id": src_id}, {"label": dst_label, "id": dst_id},
+                max_depth=depth, k=K), repeats)
+            cypher = f"{'timeout':>12}{'-':>6}" if cy_n is None else f"{cy_ms:>12.1f}{cy_n:>6}"
+            shortest = result["paths"][0]["length"] if result["paths"] else "-"
+            print(f"{name:<24}{depth:>6}{cypher}{bfs_ms:>10.1f}{len(result['paths']):>7}{shortest:>5}"
+                  f"{result['stats']['levels']:>8}")
+        if result["paths"]:
+            print(f"    {result['paths'][0]['text']}")
+
+
+async def main() -> None:
+    repeats = int(sys.argv[sys.argv.index("--repeats") + 1]) if "--repeats" in sys.argv else 5
+    scale = int(sys.argv[sys.argv.index("--scale") + 1]) if "--scale" in sys.argv else 10
+    timeout_ms = int(sys.argv[sys.argv.index("--timeout-ms") + 1]) if "--timeout-ms" in sys.argv else 60_000
+    helper = await PGAgeHelper.create(DSN, BENCH_GRAPH)
+    try:
+        async with helper._conn.cursor() as cur:
+            await cur.execute("SELECT 1 FROM ag_catalog.ag_graph WHERE name = %s;", (BENCH_GRAPH,))
+            exists = await cur.fetchone() is not None
+        if "--rebuild" in sys.argv or not exists:
+            await build_graph(helper, scale)
+        customer = await pick_customer(helper)
+        other = "cust_001" if customer != "cust_001" else "cust_002"
+        await bench_pairs(helper, customer, other, repeats, timeout_ms)
+    finally:
+        await helper.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,72 @@
+# bench_publish.py
+"""
+SSE bus publishing benchmark: Redis round trips and commands per conversation, with every
+event published on its own (SSE_BATCH_WINDOW_MS=0) against the micro-batcher in sse_bus.py.
+
+Run:  python bench_publish.py [--conversations N] [--tool-calls N] [--infos N] [--window-ms N]
+
+A conversation is simulated as the MCP client produces it: each tool call sends --infos
+ctx.info lines (resolve_entity_ids sends 10+), and every line becomes three bus events, one
+mcplog from logging_callback plus an assistant and an mcplog from _on_incoming, followed by
+progress updates. Conversations run concurrently, one session each. Counts come from Redis
+INFO commandstats (commands run inside the publish script are counted individually).
+"""
+
+import sys, time, asyncio, uuid
+
+import sse_bus
+from sse_bus import SESSIONS, _get_redis, publish_mcplog, publish_message, publish_progress
+
+COMMANDS = ("evalsha", "eval", "xadd", "publish", "expire")
+
+
+async def _commandstats() -> dict[str, int]:
+    stats = await (await _get_redis()).info("commandstats")
+    return {cmd: int(stats.get(f"cmdstat_{cmd}", {}).get("calls", 0)) for cmd in COMMANDS}
+
+
+async def conversation(tool_calls: int, infos: int) -> None:
+    session_id = f"bench-{uuid.uuid4().hex[:8]}"
+    for call in range(tool_calls):
+        for i in range(infos):
+            text = f"[tool {call}] resolve step {i}: matched 3 candidates"
+            await publish_mcplog(session_id, text)
+            await publish_message(session_id, text)
+            await publish_mcplog(session_id, text)
+            await asyncio.sleep(0.0005)  # tool work between log lines
+        await publish_progress(session_id, f"tool-{call}", (call + 1) / tool_calls)
+    await SESSIONS.flush(session_id)
+
+
+async def run(label: str, window_ms: float, conversations: int, tool_calls: int, infos: int) -> None:
+    sse_bus.SSE_BATCH_WINDOW_MS = window_ms
+    before = await _commandstats()
+    started = time.perf_counter()
+    await asyncio.gather(*(conversation(tool_calls, infos) for _ in range(conversations)))
+    elapsed = time.perf_counter() - started
+    after = await _commandstats()
+    delta = {cmd: after[cmd] - before[cmd] for cmd in COMMANDS}
+    events = conversations * tool_calls * (3 * infos + 1)
+    trips = delta["evalsha"] + delta["eval"]
+    print(f"{label:<18}{events / conversations:>10.0f}{trips / conversations:>12.1f}"
+          f"{delta['publish'] / conversations:>10.1f}{delta['xadd'] / conversations:>8.1f}"
+          f"{sum(delta.values()) / conversations:>12.1f}{elapsed * 1000:>10.0f}")
+
+
+async def main() -> None:
+    conversations = int(sys.argv[sys.argv.index("--conversations") + 1]) if "--conversations" in sys.argv else 20
+    tool_calls = int(sys.argv[sys.argv.index("--tool-calls") + 1]) if "--tool-calls" in sys.argv else 4
+    infos = int(sys.argv[sys.argv.index("--infos") + 1]) if "--infos" in sys.argv else 12
+    window_ms = float(sys.argv[sys.argv.index("--window-ms") + 1]) if "--window-ms" in sys.argv else sse_bus.SSE_BATCH_WINDOW_MS
+    print(f"{conversations} concurrent conversations, {tool_calls} tool calls x {infos} ctx.info lines; "
+          f"per conversation (batch max {sse_bus.SSE_BATCH_MAX})")
+    print(f"{'mode':<18}{'events':>10}{'round trips':>12}{'PUBLISH':>10}{'XADD':>8}{'commands':>12}{'total ms':>10}")
+    try:
+        await run("unbatched", 0, conversations, tool_calls, infos)
+        await run(f"batched {window_ms:g} ms", window_ms, conversations, tool_calls, infos)
+    finally:
+        await SESSIONS.close_all()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+# bench_skeleton.py
+"""
+Skeleton vs full viewer responses: response bytes, query time and serialization time of
+/graph/{graph}/nodes pages with and without `skeleton=true`, and the cost of fetching the full
+records of a few inspected nodes through get_elements (POST /graph/{graph}/elements).
+
+Run:  python bench_skeleton.py [--graph NAME] [--labels N] [--limit N] [--repeats N] [--rebuild]
+
+Defaults to the `crm_bench` graph built by bench_traverse.py (built here if it does not exist);
+pass --graph for a graph with large text payloads such as meeting descriptions. The N largest
+labels are benchmarked. "ser ms" is the body encoding done by _render_viewer: compact JSON, and
+columnar JSON (gzip'd, as for clients sending Accept-Encoding: gzip).
+"""
+
+import sys, json, time, asyncio, statistics
+
+from pg_age_helper import DSN, PGAgeHelper
+from bench_traverse import BENCH_GRAPH, build_graph
+import graph_wire
+
+INSPECTED = 10
+
+
+def _json_body(rows: list[dict]) -> bytes:
+    return json.dumps(rows, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def _median_ms(fn, repeats: int) -> tuple[float, object]:
+    samples, result = [], None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+
+async def _query_ms(fn, repeats: int) -> tuple[float, list[dict]]:
+    rows = await fn()  # warm-up
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        rows = await fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), rows
+
+
+async def bench_label(helper: PGAgeHelper, label: str, limit: int, repeats: int) -> None:
+    results = {}
+    for mode, skeleton in (("full", False), ("skeleton", True)):
+        query_ms, rows = await _query_ms(lambda: helper.get_nodes_by_label(label, limit, None, skeleton), repeats)
+        json_ms, body = _median_ms(lambda: _json_body(rows), repeats)
+        col_ms, (col_body, _) = _median_ms(
+            lambda: graph_wire.encode(rows, graph_wire.COLUMNAR_JSON, "gzip"), repeats)
+        results[mode] = (rows, query_ms, len(body), json_ms, len(col_body), col_ms)
+        print(f"{label[:24]:<24}{mode:>10}{len(rows):>7}{query_ms:>10.1f}{len(body):>12}{json_ms:>9.2f}"
+              f"{len(col_body):>12}{col_ms:>9.2f}")
+    full, skel = results["full"], results["skeleton"]
+    print(f"{'':<24}{'ratio':>10}{'':>7}{skel[1] / max(full[1], 1e-9):>10.2f}{skel[2] / max(full[2], 1):>12.2f}"
+          f"{skel[3] / max(full[3], 1e-9):>9.2f}{skel[4] / max(full[4], 1):>12.2f}{skel[5] / max(full[5], 1e-9):>9.2f}")
+
+    ids = [r["id"] for r in skel[0] if r["kind"] == "node"][:INSPECTED]
+    if ids:
+        elements_ms, rows = await _query_ms(lambda: helper.get_elements(ids), repeats)
+        print(f"{'':<24}{'elements':>10}{len(rows):>7}{elements_ms:>10.1f}{len(_json_body(rows)):>12}")
+
+
+async def main() -> None:
+    graph = sys.argv[sys.argv.index("--graph") + 1] if "--graph" in sys.argv else BENCH_GRAPH
+    n_labels = int(sys.argv[sys.argv.index("--labels") + 1]) if "--labels" in sys.argv else 5
+    limit = int(sys.argv[sys.argv.index("--limit") + 1]) if "--limit" in sys.argv else 500
+    repeats = int(sys.argv[sys.argv.index("--repeats") + 1]) if "--repeats" in sys.argv else 5
+    helper = await PGAgeHelper.create(DSN, graph)
+    try:
+        async with helper._conn.cursor() as cur:
+            await cur.execute("SELECT 1 FROM ag_catalog.ag_graph WHERE name = %s;", (graph,))
+            exists = await cur.fetchone() is not None
+        if graph == BENCH_GRAPH and ("--rebuild" in sys.argv or not exists):
+            await build_graph(helper, 10)
+        labels = sorted((r for r in await helper._label_sizes() if r["kind"] == "v"),
+                        key=lambda r: r["reltuples"], reverse=True)[:n_labels]
+        print(f"{graph}: page of {limit} nodes per label; ser = compact JSON, col = columnar JSON + gzip; "
+              f"elements = full records of {INSPECTED} inspected nodes")
+        print(f"{'label':<24}{'mode':>10}{'rows':>7}{'query ms':>10}{'json bytes':>12}{'ser ms':>9}"
+              f"{'col bytes':>12}{'col ms':>9}")
+        for r in labels:
+            await bench_label(helper, r["name"], limit, repeats)
+    finally:
+        await helper.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+# bench_sse.py
+"""
+SSE bus benchmark: many concurrent SSE sessions on one process, all fed by the process-wide
+Redis subscriber in sse_bus.py.
+
+Run:  python bench_sse.py [--clients 1000,5000,10000] [--messages N] [--url http://host:port]
+
+Without --url the sessions are registered in this process (SESSIONS.get_or_create, as /events
+does) and drained by one task each. With --url each client is a real GET /events stream
+against a running backend (httpx); messages are still published from here through Redis.
+
+Reported per client count: time to register all clients, Redis connected_clients before and
+with the clients attached (the previous per-session SUBSCRIBE needed one connection per tab),
+publish throughput, and publish-to-delivery latency percentiles. A second table times the
+Last-Event-ID replay of a reconnecting session by number of missed events (capped at
+SSE_REPLAY_MAX; the stream itself at ~SSE_STREAM_MAXLEN entries).
+"""
+
+import sys, json, time, asyncio, statistics, uuid
+
+import httpx
+
+from sse_bus import SESSIONS, SSE_REPLAY_MAX, SSE_STREAM_MAXLEN, _get_redis, sse_event
+
+CLIENTS = (1_000, 5_000, 10_000)
+MISSED = (10, 100, 500, 1_000, 5_000)
+
+
+async def _connected_clients() -> int:
+    info = await (await _get_redis()).info("clients")
+    return int(info["connected_clients"])
+
+
+def _percentile(values: list[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else float("nan")
+
+
+async def _local_client(session_id: str, expected: int, latencies: list[float]) -> None:
+    session = await SESSIONS.get_or_create(session_id)
+    try:
+        received = 0
+        while received < expected:
+            event_id, msg = await session.q.get()
+            if not event_id:
+                continue  # "N events dropped" marker: this client fell behind
+            data = json.loads(msg.split("data: ", 1)[1])
+            latencies.append((time.time() - data["sent"]) * 1000)
+            received += 1
+    finally:
+        await SESSIONS.release(session)
+
+
+async def _http_client(client: httpx.AsyncClient, url: str, session_id: str, expected: int,
+                       latencies: list[float], opened: asyncio.Event, counter: list[int], total: int) -> None:
+    received = 0
+    async with client.stream("GET", f"{url}/events", params={"sid": session_id}) as response:
+        async for line in response.aiter_lines():
+            if line.startswith("event: open"):
+                counter[0] += 1
+                if counter[0] == total:
+                    opened.set()
+            elif line.startswith("data: ") and '"sent"' in line:
+                latencies.append((time.time() - json.loads(line[6:])["sent"]) * 1000)
+                received += 1
+                if received >= expected:
+                    return
+
+
+async def run(n: int, messages: int, url: str | None) -> None:
+    session_ids = [f"bench-{uuid.uuid4().hex[:8]}-{i}" for i in range(n)]
+    per_client = max(1, messages // n)
+    latencies: list[float] = []
+    before = await _connected_clients()
+
+    started = time.perf_counter()
+    if url:
+        opened, counter = asyncio.Event(), [0]
+        client = httpx.AsyncClient(timeout=None, limits=httpx.Limits(max_connections=n + 10))
+        tasks = [asyncio.create_task(_http_client(client, url, sid, per_client, latencies, opened, counter, n))
+                 for sid in session_ids]
+        await opened.wait()
+    else:
+        client = None
+        tasks = [asyncio.create_task(_local_client(sid, per_client, latencies)) for sid in session_ids]
+        while len(SESSIONS._sessions) < n:
+            await asyncio.sleep(0.01)
+    register_ms = (time.perf_counter() - started) * 1000
+    during = await _connected_clients()
+
+    started = time.perf_counter()
+    for _ in range(per_client):
+        for sid in session_ids:
+            await SESSIONS.publish(sid, sse_event({"sent": time.time()}, event="progress"))
+    publish_s = time.perf_counter() - started
+    await asyncio.wait_for(asyncio.gather(*tasks), timeout=120)
+    if client is not None:
+        await client.aclose()
+
+    print(f"{n:>8}{register_ms:>13.0f}{before:>10}{during:>10}{per_client * n / publish_s:>12.0f}"
+          f"{statistics.median(latencies):>9.2f}{_percentile(latencies, 0.99):>9.2f}{max(latencies):>9.2f}")
+
+
+async def bench_replay(repeats: int = 5) -> None:
+    print(f"\nLast-Event-ID replay (SSE_REPLAY_MAX={SSE_REPLAY_MAX}, SSE_STREAM_MAXLEN~{SSE_STREAM_MAXLEN})")
+    print(f"{'missed':>8}{'replayed':>10}{'complete':>10}{'ms':>9}")
+    for missed in MISSED:
+        sid = f"bench-replay-{uuid.uuid4().hex[:8]}"
+        last = await SESSIONS.publish(sid, sse_event({"n": 0}, event="progress"))
+        for i in range(missed):
+            await SESSIONS.publish(sid, sse_event({"n": i + 1, "text": "x" * 200}, event="mcplog"))
+        samples = []
+        for _ in range(repeats):
+            started = time.perf_counter()
+            entries, complete = await SESSIONS.replay(sid, last)
+            samples.append((time.perf_counter() - started) * 1000)
+        print(f"{missed:>8}{len(entries):>10}{str(complete):>10}{statistics.median(samples):>9.2f}")
+
+
+async def main() -> None:
+    clients = (tuple(int(c) for c in sys.argv[sys.argv.index("--clients") + 1].split(","))
+               if "--clients" in sys.argv else CLIENTS)
+    messages = int(sys.argv[sys.argv.index("--messages") + 1]) if "--messages" in sys.argv else 20_000
+    url = sys.argv[sys.argv.index("--url") + 1].rstrip("/") if "--url" in sys.argv else None
+    print(f"SSE bus, {'HTTP /events at ' + url if url else 'in-process sessions'}, ~{messages} messages per run")
+    print(f"{'clients':>8}{'register ms':>13}{'redis cx':>10}{'with cx':>10}{'publish/s':>12}"
+          f"{'p50 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    try:
+        for n in clients:
+            await run(n, messages, url)
+        await bench_replay()
+    finally:
+        await SESSIONS.close_all()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,195 @@
+# bench_traverse.py
+"""
+query_by_types benchmark on the CRM (customer) graph at 10x the default generator scale.
+
+Run:  python bench_traverse.py [--rebuild] [--repeats N] [--scale N]
+
+Generates the graph with postgresql_age/load_data/customer_graph/gen_customer_graph_bulk.py
+(default scale 10: 1,000 customers, 20,000 opportunities, 10,000 communications, 15,000
+support cases, 12 telemetry months per customer), loads it into `crm_bench` through
+insert_nodes_batch / create_edges_batch and adds the id / start_id / end_id indexes.
+
+"cypher" is the previous query_by_types: MATCH (s:Src), (t:Dst) MATCH (s)-[e:Rel]->(t), which
+plans a cartesian product of the two labels; "sql" is the current single-pattern statement.
+pages walks one edge type in TRAVERSE_PAGE-row keyset pages; the previous implementation
+could only grow LIMIT.
+"""
+
+import os, sys, json, time, random, asyncio, statistics
+from pathlib import Path
+from psycopg import sql
+
+from pg_age_helper import DSN, PGAgeHelper
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "postgresql_age" / "load_data" / "customer_graph"))
+import gen_customer_graph_bulk as gen  # noqa: E402
+
+BENCH_GRAPH = os.getenv("TRAVERSE_BENCH_GRAPH", "crm_bench")
+DEFAULTS = {"customers": 100, "opportunities": 2000, "communications": 1000, "support_cases": 1500}
+TRAVERSE_PAGE = 100
+PAGE_DEPTHS = (0, 10, 50)
+
+# (name, query_by_types options); "{customer}" is replaced with a mid-sized customer's payload.id
+QUERIES = [
+    ("customer opps", dict(direction="out", src_label="Customer", edge_label="HAS_OPPORTUNITY",
+                           dst_label="Opportunity", src_id="{customer}", return_edges=True)),
+    ("customer cases both", dict(direction="both", src_label="Customer", edge_label="RAISED_CASE",
+                                 dst_label="SupportCase", src_id="{customer}")),
+    ("opps for product", dict(direction="in", src_label="Product", edge_label="FOR_PRODUCT",
+                              dst_label="Opportunity", src_id="prod_core", limit=100)),
+    ("telemetry any", dict(direction="out", src_label="Customer", edge_label="HAS_TELEMETRY",
+                           dst_label="TelemetryMonth", limit=100)),
+]
+
+
+def generate(scale: int) -> tuple[list[dict], list[dict]]:
+    r = random.Random(7)
+    customers = gen.gen_customers(r, DEFAULTS["customers"] * scale)
+    contracts = gen.gen_contracts(r, customers)
+    cases = gen.gen_support_cases(r, customers, DEFAULTS["support_cases"] * scale)
+    comms = gen.gen_comms(r, customers, DEFAULTS["communications"] * scale)
+    opps = gen.gen_opportunities(r, customers, DEFAULTS["opportunities"] * scale)
+    telemetry = gen.gen_telemetry(r, customers, months=12)
+    qbrs = gen.gen_qbr_artifacts(r, customers)
+    return gen.make_nodes_and_edges(customers, contracts, cases, comms, opps, telemetry, qbrs)
+
+
+async def build_graph(helper: PGAgeHelper, scale: int) -> None:
+    started = time.perf_counter()
+    nodes, edges = generate(scale)
+    await helper.recreate_graph()
+    labels = {n["id"]: n["label"] for n in nodes}
+    node_items = [{"label": n["label"], "payload": {"id": n["id"], **json.loads(n["properties"]), "label": n["label"]}}
+                  for n in nodes]
+    edge_items = [{"label": e["label"], "src_label": labels[e["src"]], "dst_label": labels[e["dst"]],
+                   "src": e["src"], "dst": e["dst"], "payload": json.loads(e["properties"])}
+                  for e in edges if e["src"] in labels and e["dst"] in labels]
+    failed = [r for r in await helper.insert_nodes_batch(node_items, chunk_size=5_000) if not r["ok"]]
+    failed += [r for r in await helper.create_edges_batch(edge_items, chunk_size=5_000) if not r["ok"]]
+    if failed:
+        print(f"{len(failed)} items failed to load, e.g. {failed[0]}")
+
+    async with helper._conn.cursor() as cur:
+        await cur.execute("""
+            SELECT l.name, l.kind FROM ag_catalog.ag_label l JOIN ag_catalog.ag_graph g ON l.graph = g.graphid
+            WHERE g.name = %s AND l.name NOT LIKE '\\_ag\\_label%%';
+        """, (BENCH_GRAPH,))
+        tables = await cur.fetchall()
+        for t in tables:
+            table = sql.Identifier(BENCH_GRAPH, t["name"])
+            await cur.execute(sql.SQL("CREATE INDEX ON {} (id);").format(table))
+            if t["kind"] == "e":
+                await cur.execute(sql.SQL("CREATE INDEX ON {} (start_id);").format(table))
+                await cur.execute(sql.SQL("CREATE INDEX ON {} (end_id);").format(table))
+            await cur.execute(sql.SQL("ANALYZE {};").format(table))
+    await helper._conn.commit()
+    print(f"Built {BENCH_GRAPH} ({len(node_items)} nodes, {len(edge_items)} edges) "
+          f"in {time.perf_counter() - started:.1f}s")
+
+
+async def cypher_query_by_types(helper: PGAgeHelper, *, direction: str = "out", src_label=None, edge_label=None,
+                                dst_label=None, src_id=None, dst_id=None, return_edges=False, limit=None) -> int:
+    """The previous query_by_types, kept here as the baseline."""
+    rel_dir = {"out": "->", "in": "<-", "both": "-"}[direction]
+    src = f":{src_label}" if src_label else ""
+    dst = f":{dst_label}" if dst_label else ""
+    rel = f":{edge_label}" if edge_label else ""
+    where = ["TRUE"]
+    if src_id is not None:
+        where.append("s.payload.id = $src_id")
+    if dst_id is not None:
+        where.append("t.payload.id = $dst_id")
+    select_alias = "t ag_catalog.agtype, e ag_catalog.agtype" if return_edges else "t ag_catalog.agtype"
+    return_clause = "RETURN t, e" if return_edges else "RETURN t"
+    limit_clause = f"LIMIT {int(limit)}" if limit else ""
+    cypher_text = f"""
+        MATCH (s{src}), (t{dst})
+        MATCH (s)-[e{rel}]{rel_dir}(t)
+        WHERE {" AND ".join(where)}
+        {return_clause}
+        {limit_clause}
+    """
+    q = sql.SQL("""
+        SELECT * FROM ag_catalog.cypher({}::name, $cypher$
+        {cypher}
+        $cypher$, %s::ag_catalog.agtype) AS ({select_alias});
+    """.replace("{cypher}", cypher_text).replace("{select_alias}", select_alias)).format(sql.Literal(helper.graph))
+    async with helper._conn.cursor() as cur:
+        await cur.execute(q, (json.dumps({"src_id": src_id, "dst_id": dst_id}),))
+        return len(await cur.fetchall())
+
+
+async def sql_query_by_types(helper: PGAgeHelper, **options) -> int:
+    return len((await helper.query_by_types(**options))["rows"])
+
+
+async def _time(fn, repeats: int) -> tuple[float, int]:
+    size = await fn()  # warm-up (plan cache, label map, payload.id cache)
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), size
+
+
+async def pick_customer(helper: PGAgeHelper) -> str:
+    """payload.id of the customer with the median number of opportunities."""
+    async with helper._conn.cursor() as cur:
+        await cur.execute(sql.SQL("""
+            SELECT (c.properties::text)::jsonb -> 'payload' ->> 'id' AS pid, count(*) AS n
+            FROM {edge} e JOIN {customer} c ON c.id = e.start_id
+            GROUP BY 1 ORDER BY 2, 1;
+        """).format(edge=sql.Identifier(BENCH_GRAPH, "HAS_OPPORTUNITY"),
+                    customer=sql.Identifier(BENCH_GRAPH, "Customer")))
+        rows = await cur.fetchall()
+    return rows[len(rows) // 2]["pid"]
+
+
+async def bench_queries(helper: PGAgeHelper, customer: str, repeats: int) -> None:
+    print(f"\nquery_by_types (customer {customer})")
+    print(f"{'query':<22}{'cypher ms':>12}{'rows':>8}{'sql ms':>10}{'rows':>8}{'speedup':>10}")
+    for name, options in QUERIES:
+        options = {k: (customer if v == "{customer}" else v) for k, v in options.items()}
+        legacy_ms, legacy_n = await _time(lambda: cypher_query_by_types(helper, **options), repeats)
+        new_ms, new_n = await _time(lambda: sql_query_by_types(helper, **options), repeats)
+        print(f"{name:<22}{legacy_ms:>12.1f}{legacy_n:>8}{new_ms:>10.1f}{new_n:>8}{legacy_ms / new_ms:>9.1f}x")
+
+
+async def bench_pages(helper: PGAgeHelper, repeats: int) -> None:
+    options = dict(direction="out", src_label="Customer", edge_label="HAS_TELEMETRY", dst_label="TelemetryMonth",
+                   fields=["month", "dau"])
+    print(f"\npages (Customer-HAS_TELEMETRY->TelemetryMonth, {TRAVERSE_PAGE} rows per page, fields month,dau)")
+    print(f"{'page':<12}{'grow ms':>12}{'rows':>8}{'keyset ms':>12}{'rows':>8}")
+    after, page = None, 0
+    for depth in PAGE_DEPTHS:
+        while page < depth:
+            after = (await helper.query_by_types(**options, limit=TRAVERSE_PAGE, after=after))["next_after"]
+            page += 1
+        grow_ms, grow_n = await _time(
+            lambda: cypher_query_by_types(helper, **{k: v for k, v in options.items() if k != "fields"},
+                                          limit=(depth + 1) * TRAVERSE_PAGE), repeats)
+        keyset_ms, keyset_n = await _time(
+            lambda: sql_query_by_types(helper, **options, limit=TRAVERSE_PAGE, after=after), repeats)
+        print(f"{depth:<12}{grow_ms:>12.1f}{grow_n:>8}{keyset_ms:>12.1f}{keyset_n:>8}")
+
+
+async def main() -> None:
+    repeats = int(sys.argv[sys.argv.index("--repeats") + 1]) if "--repeats" in sys.argv else 5
+    scale = int(sys.argv[sys.argv.index("--scale") + 1]) if "--scale" in sys.argv else 10
+    helper = await PGAgeHelper.create(DSN, BENCH_GRAPH)
+    try:
+        async with helper._conn.cursor() as cur:
+            await cur.execute("SELECT 1 FROM ag_catalog.ag_graph WHERE name = %s;", (BENCH_GRAPH,))
+            exists = await cur.fetchone() is not None
+        if "--rebuild" in sys.argv or not exists:
+            await build_graph(helper, scale)
+        customer = await pick_customer(helper)
+        await bench_queries(helper, customer, repeats)
+        await bench_pages(helper, repeats)
+    finally:
+        await helper.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
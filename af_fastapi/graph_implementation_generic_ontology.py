@@ -1,6 +1,8 @@
 # magentic_implementation.py
 import asyncio
 from agent_framework import (
+    AgentMiddleware,
+    AgentRunContext,
     ChatAgent,
     ChatContext,
     ChatMessage,
@@ -17,6 +19,8 @@ from agent_framework import (
 from agent_framework.azure import AzureOpenAIChatClient, AzureOpenAIResponsesClient
 from azure.identity.aio import DefaultAzureCredential
 from mcp_client import LoggingMCPStreamableHTTPTool
+from metrics import LLM_LATENCY, WORKFLOW_LATENCY, WORKFLOW_ROUNDS
+from tracing import current_span, stage_breakdown, start_span
 import json
 from enum import Enum
 from dataclasses import dataclass, asdict, is_dataclass
@@ -185,6 +189,8 @@ class ResponseMessage:
     delta: str | None = None
     message: str | None = None
     result: str | None = None
+    # Per-stage latency breakdown; only set on the final "done" message
+    timings: dict | None = None
 
 
 class LoggingChatMiddleware(ChatMiddleware):
@@ -207,6 +213,39 @@ class LoggingChatMiddleware(ChatMiddleware):
         # Post-processing: Log after AI response
         print("[Chat Class] AI response received")
 
+
+class TelemetryChatMiddleware(ChatMiddleware):
+    """Chat middleware that records LLM call latency (metric and `llm` span) for one agent."""
+
+    def __init__(self, agent_name: str):
+        self.agent_name = agent_name
+
+    async def process(
+        self,
+        context: ChatContext,
+        next: Callable[[ChatContext], Awaitable[None]],
+    ) -> None:
+        started = time.perf_counter()
+        try:
+            with start_span("llm.chat", kind="client", stage="llm", agent=self.agent_name, messages=len(context.messages)):
+                await next(context)
+        finally:
+            LLM_LATENCY.labels(self.agent_name).observe(time.perf_counter() - started)
+
+
+class TracingAgentMiddleware(AgentMiddleware):
+    """Agent middleware that wraps each agent run (one workflow round) in a span, so the
+    LLM and MCP tool spans of that round nest under it."""
+
+    async def process(
+        self,
+        context: AgentRunContext,
+        next: Callable[[AgentRunContext], Awaitable[None]],
+    ) -> None:
+        agent_name = getattr(context.agent, "name", None) or "agent"
+        with start_span(f"agent.round {agent_name}", agent=agent_name):
+            await next(context)
+
 class GraphWorkflow():
     def __init__(self, graph_name: str | None = None, model_name: str | None = None, session_id: str | None = None):
         # stream state
@@ -281,6 +320,7 @@ class GraphWorkflow():
                 description="Graph query generator agent that can answer questions about the graph using a graph query tool.",
                 instructions=graph_query_generator_instructions,
                 chat_client=AzureOpenAIChatClient(**self._chat_client_kwargs(token)),
+                middleware=[TracingAgentMiddleware(), TelemetryChatMiddleware("graph_query_generator_agent")],
                 #chat_message_store_factory=self._create_message_store,
                 tools=graph_age_mcp_server
             )
@@ -293,6 +333,7 @@ class GraphWorkflow():
                 description="Graph query validator agent that can validate and refine graph queries using a graph query tool.",
                 instructions=graph_query_validator_instructions,
                 chat_client=AzureOpenAIChatClient(**self._chat_client_kwargs(token)),
+                middleware=[TracingAgentMiddleware(), TelemetryChatMiddleware("graph_query_validator")],
                 #chat_message_store_factory=self._create_message_store,
                 tools=graph_age_mcp_server
             )
@@ -306,7 +347,7 @@ class GraphWorkflow():
                 Do not modify the generated queries. Send them as-is to the tool.
                 """,
                 chat_client=AzureOpenAIChatClient(**self._chat_client_kwargs(token, temperature=0.0)),
-                middleware=[LoggingChatMiddleware()],
+                middleware=[LoggingChatMiddleware(), TracingAgentMiddleware(), TelemetryChatMiddleware("graph_query_executor_agent")],
                 #chat_message_store_factory=self._create_message_store,
                 tools=graph_age_mcp_server
             )
@@ -352,8 +393,35 @@ class GraphWorkflow():
             )
             logger.info("Workflow built successfully")
 
+    def _timings(self, started: float, rounds: int) -> dict:
+        """Per-stage latency for this turn: llm, mcp (includes elicitation and db), elicitation, db."""
+        span = current_span()
+        stages = stage_breakdown(span.trace_id if span else None)
+        total_ms = round((time.perf_counter() - started) * 1000, 1)
+        llm_ms, mcp_ms = stages.get("llm", 0.0), stages.get("mcp", 0.0)
+        return {
+            "trace_id": span.trace_id if span else None,
+            "total_ms": total_ms,
+            "agent_rounds": rounds,
+            "llm_ms": llm_ms,
+            "mcp_ms": mcp_ms,
+            "elicitation_ms": stages.get("elicitation", 0.0),
+            "db_ms": stages.get("db", 0.0),
+            # orchestrator LLM calls, workflow overhead and streaming
+            "other_ms": round(max(0.0, total_ms - llm_ms - mcp_ms), 1),
+        }
+
     async def run_workflow(self, chat_history: List[ChatMessage]):
+        """Stream the workflow as NDJSON inside a `workflow.run` span (child of the request span, if any)."""
+        with start_span("workflow.run", workflow="graph", graph=self._graph_name, session_id=self._session_id):
+            async for chunk in self._run_workflow(chat_history):
+                yield chunk
+
+    async def _run_workflow(self, chat_history: List[ChatMessage]):
         output = None
+        rounds = 0
+        outcome = "ok"
+        started = time.perf_counter()
         try:
             await self._ensure_clients()
             logger.info(f"Running workflow with question: {chat_history[-1].text}")
@@ -383,6 +451,7 @@ class GraphWorkflow():
                     if event.text:
                         yield _ndjson({"response_message": ResponseMessage(type="MagenticAgentDeltaEvent", delta=event.text)})
                 elif isinstance(event, MagenticAgentMessageEvent):
+                    rounds += 1
                     if self._stream_line_open:
                         self._stream_line_open = False
                         yield _ndjson({"response_message": ResponseMessage(type="MagenticAgentMessageEvent", delta=" (final)\n")})
@@ -408,7 +477,7 @@ class GraphWorkflow():
                                 self._output = forced_answer
                                 output = forced_answer
                                 yield _ndjson({"response_message": ResponseMessage(type="WorkflowOutputEvent", delta=f"Workflow output event: {forced_answer}")})
-                                yield _ndjson({"response_message": ResponseMessage(type="done", result=forced_answer)})
+                                yield _ndjson({"response_message": ResponseMessage(type="done", result=forced_answer, timings=self._timings(started, rounds))})
                                 return
                             else:
                                 _generator_prose_count = 0  # Reset if it returns SQL
@@ -430,15 +499,20 @@ class GraphWorkflow():
                 self._stream_line_open = False
 
             final_output = self._output if self._output is not None else output
-            yield _ndjson({"response_message": ResponseMessage(type="done", result=final_output)})
+            yield _ndjson({"response_message": ResponseMessage(type="done", result=final_output, timings=self._timings(started, rounds))})
         except asyncio.CancelledError:
+            outcome = "cancelled"
             logger.warning("Workflow stream cancelled (client disconnected).")
             return
         except BaseException as e:
+            outcome = "error"
             logger.exception("Workflow execution failed")
             error_message = f"Workflow execution failed: {e}"
             yield _ndjson({"response_message": ResponseMessage(type="error", message=error_message)})
-            yield _ndjson({"response_message": ResponseMessage(type="done", result=self._output if self._output is not None else output)})
+            yield _ndjson({"response_message": ResponseMessage(type="done", result=self._output if self._output is not None else output, timings=self._timings(started, rounds))})
+        finally:
+            WORKFLOW_ROUNDS.labels("graph").observe(rounds)
+            WORKFLOW_LATENCY.labels("graph", outcome).observe(time.perf_counter() - started)
 
 
 
@@ -0,0 +1,213 @@
+# graph_layout.py
+"""
+Server-side force-directed layouts for the graph viewer (Fruchterman-Reingold, vectorized NumPy).
+
+Repulsion is computed between all pairs up to LAYOUT_EXACT_MAX_NODES nodes, in row blocks so
+memory stays bounded. Larger graphs use the grid variant from the original paper: nodes are
+bucketed into square cells and only pairs in the same or adjacent cells repel (pairs farther
+apart than the cell side are ignored), which makes an iteration O(n + m) once the layout has
+spread out. The paper's cells are 2k wide; cells of side k cut the pair count about 4x with
+similar edge lengths and node spacing. Without a far field, attraction alone folds large
+graphs into a dense ball (slow and unreadable), so the grid method also adds one Barnes-Hut
+level: each node feels the other cells of a 32x32 grid as point masses at their centroids.
+Attraction along edges is exact in both cases.
+
+Coordinates are cached per (graph, label, limit, page, graph version), so the JSON and columnar
+representations of a page, and its revalidations, share one computation. A write bumps the
+version and the next request lays the page out again.
+"""
+
+import os, asyncio, time
+from collections import OrderedDict
+from typing import Any, Iterator
+
+import numpy as np
+
+from metrics import LAYOUT_CACHE, LAYOUT_LATENCY
+
+# Node count above which repulsion uses the grid approximation instead of all pairs
+LAYOUT_EXACT_MAX_NODES = int(os.getenv("GRAPH_LAYOUT_EXACT_MAX_NODES", "1000"))
+LAYOUT_ITERATIONS = int(os.getenv("GRAPH_LAYOUT_ITERATIONS", "60"))
+# Ideal edge length (k) in viewer units; a layout of n nodes spans about k * sqrt(n)
+LAYOUT_SPACING = float(os.getenv("GRAPH_LAYOUT_SPACING", "30"))
+LAYOUT_CACHE_ENTRIES = int(os.getenv("GRAPH_LAYOUT_CACHE_ENTRIES", "64"))
+
+_BLOCK_ROWS = 512              # rows per all-pairs block: 512 x n x 2 float64
+_PAIR_CHUNK = 2_000_000        # candidate pairs per grid chunk (dense cells early in the layout)
+_CUTOFF = 1.0                  # grid repulsion radius and cell side, in units of k
+_FAR_GRID = 32                 # coarse cells per side for the grid method's far-field term
+_HALF_NEIGHBORS = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+
+def _sum_by(index: np.ndarray, vectors: np.ndarray, n: int) -> np.ndarray:
+    """Row sums of `vectors` grouped by `index` (a vectorized scatter-add for 2-D forces)."""
+    return np.stack([np.bincount(index, vectors[:, 0], n), np.bincount(index, vectors[:, 1], n)], axis=1)
+
+
+def _repulse_exact(pos: np.ndarray, k: float) -> np.ndarray:
+    k2 = k * k
+    x, y = pos[:, 0], pos[:, 1]
+    disp = np.empty_like(pos)
+    for start in range(0, len(pos), _BLOCK_ROWS):
+        dx = x[start:start + _BLOCK_ROWS, None] - x[None, :]
+        dy = y[start:start + _BLOCK_ROWS, None] - y[None, :]
+        w = k2 / np.maximum(dx * dx + dy * dy, 1e-9)  # the self pair has delta 0, so no force
+        disp[start:start + _BLOCK_ROWS, 0] = (dx * w).sum(axis=1)
+        disp[start:start + _BLOCK_ROWS, 1] = (dy * w).sum(axis=1)
+    return disp
+
+
+def _grid_pairs(cells: np.ndarray, counts: np.ndarray, starts: np.ndarray, gy: int,
+                dx: int, dy: int) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    """(i, j) index pairs, in cell-sorted order, of nodes in a cell and the cell at (+dx, +dy)."""
+    nx, ny = cells[:, 0] + dx, cells[:, 1] + dy
+    valid = (nx < counts.size // gy) & (ny >= 0) & (ny < gy)
+    nodes = np.flatnonzero(valid)
+    nbr = nx[valid] * gy + ny[valid]
+    reps = counts[nbr]
+    bounds = np.cumsum(reps)
+    lo = 0
+    while lo < len(nodes):
+        hi = max(lo + 1, int(np.searchsorted(bounds, bounds[lo] - reps[lo] + _PAIR_CHUNK, side="right")))
+        rep = reps[lo:hi]
+        i = np.repeat(nodes[lo:hi], rep)
+        offsets = np.arange(len(i)) - np.repeat(np.cumsum(rep) - rep, rep)
+        j = np.repeat(starts[nbr[lo:hi]], rep) + offsets
+        if dx == 0 and dy == 0:
+            keep = j > i
+            i, j = i[keep], j[keep]
+        yield i, j
+        lo = hi
+
+
+def _repulse_grid(pos: np.ndarray, k: float) -> np.ndarray:
+    n, k2 = len(pos), k * k
+    cells = ((pos - pos.min(axis=0)) // (_CUTOFF * k)).astype(np.int64)
+    gx, gy = int(cells[:, 0].max()) + 1, int(cells[:, 1].max()) + 1
+    cell_id = cells[:, 0] * gy + cells[:, 1]
+    order = np.argsort(cell_id, kind="stable")
+    counts = np.bincount(cell_id, minlength=gx * gy)
+    starts = np.cumsum(counts) - counts
+    p, c = pos[order], cells[order]
+
+    disp = np.zeros_like(p)
+    for dx, dy in _HALF_NEIGHBORS:
+        for i, j in _grid_pairs(c, counts, starts, gy, dx, dy):
+            delta = p[i] - p[j]
+            d2 = (delta ** 2).sum(axis=1)
+            near = (d2 < (_CUTOFF * k) ** 2) & (d2 > 0)
+            i, j, delta = i[near], j[near], delta[near]
+            force = delta * (k2 / d2[near])[:, None]
+            disp += _sum_by(i, force, n) - _sum_by(j, force, n)
+    out = np.empty_like(disp)
+    out[order] = disp
+    return out + _repulse_far(pos, k)
+
+
+def _repulse_far(pos: np.ndarray, k: float) -> np.ndarray:
+    """Far-field repulsion: every node gets the force its coarse cell's centroid feels from the
+    other occupied cells' centroids, weighted by their node counts (one Barnes-Hut level)."""
+    g, k2 = _FAR_GRID, k * k
+    lo, extent = pos.min(axis=0), max(float(np.ptp(pos, axis=0).max()), 1e-9)
+    cells = np.minimum(((pos - lo) / extent * g).astype(np.int64), g - 1)
+    cell_id = cells[:, 0] * g + cells[:, 1]
+    mass = np.bincount(cell_id, minlength=g * g)
+    occupied = np.flatnonzero(mass)
+    m = mass[occupied].astype(float)
+    cx = np.bincount(cell_id, pos[:, 0], g * g)[occupied] / m
+    cy = np.bincount(cell_id, pos[:, 1], g * g)[occupied] / m
+    dx, dy = cx[:, None] - cx[None, :], cy[:, None] - cy[None, :]
+    d2 = dx * dx + dy * dy
+    np.fill_diagonal(d2, np.inf)
+    w = k2 * m[None, :] / d2
+    force = np.zeros((g * g, 2))
+    force[occupied, 0] = (dx * w).sum(axis=1)
+    force[occupied, 1] = (dy * w).sum(axis=1)
+    return force[cell_id]
+
+
+def fruchterman_reingold(
+    n: int,
+    src: np.ndarray,
+    dst: np.ndarray,
+    *,
+    iterations: int = LAYOUT_ITERATIONS,
+    k: float = LAYOUT_SPACING,
+    exact_max_nodes: int = LAYOUT_EXACT_MAX_NODES,
+    seed: int = 0,
+) -> np.ndarray:
+    """(n, 2) positions centred on the origin for nodes 0..n-1 with edges src[i] -> dst[i]."""
+    if n == 0:
+        return np.zeros((0, 2))
+    side = k * np.sqrt(n)
+    pos = np.random.default_rng(seed).uniform(-side / 2, side / 2, size=(n, 2))
+    src, dst = np.asarray(src, dtype=np.intp), np.asarray(dst, dtype=np.intp)
+    loops = src == dst
+    src, dst = src[~loops], dst[~loops]
+    repulse = _repulse_exact if n <= exact_max_nodes else _repulse_grid
+
+    start_temp = side / 10
+    for it in range(iterations):
+        disp = repulse(pos, k)
+        delta = pos[src] - pos[dst]
+        pull = delta * (np.hypot(delta[:, 0], delta[:, 1]) / k)[:, None]  # |f| = d^2 / k
+        disp += _sum_by(dst, pull, n) - _sum_by(src, pull, n)
+        length = np.maximum(np.hypot(disp[:, 0], disp[:, 1]), 1e-9)
+        temp = start_temp * (1 - it / iterations)
+        pos += disp * (np.minimum(length, temp) / length)[:, None]
+    # All-pairs repulsion spreads the layout well past the k * sqrt(n) frame; scale both methods back to it
+    pos -= pos.mean(axis=0)
+    extent = np.ptp(pos, axis=0).max()
+    return pos * (side / extent) if extent > 0 else pos
+
+
+def layout_records(records: list[dict], **options: Any) -> dict[str, tuple[float, float]]:
+    """{node id: (x, y)} for the node records, laid out along the edge records between them."""
+    ids = [r["id"] for r in records if r.get("kind") == "node"]
+    index = {nid: i for i, nid in enumerate(ids)}
+    pairs = [(index[r["src"]], index[r["dst"]]) for r in records
+             if r.get("kind") == "edge" and r.get("src") in index and r.get("dst") in index]
+    edges = np.array(pairs, dtype=np.intp).reshape(-1, 2)
+    pos = fruchterman_reingold(len(ids), edges[:, 0], edges[:, 1], **options)
+    return {nid: (round(float(x), 1), round(float(y), 1)) for nid, (x, y) in zip(ids, pos)}
+
+
+class LayoutCache:
+    def __init__(self, max_entries: int = LAYOUT_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[tuple, dict[str, tuple[float, float]]] = OrderedDict()
+
+    async def coordinates(self, key: tuple | None, records: list[dict]) -> dict[str, tuple[float, float]]:
+        """Cached layout for `key` (graph, label, limit, after, version), computed off the event loop on a
+        miss. key None (graph versions unavailable) always computes and stores nothing."""
+        coords = self._entries.get(key) if key is not None else None
+        if coords is not None:
+            self._entries.move_to_end(key)
+            LAYOUT_CACHE.labels("hit").inc()
+            return coords
+        LAYOUT_CACHE.labels("miss" if key is not None else "bypass").inc()
+        n = sum(1 for r in records if r.get("kind") == "node")
+        started = time.perf_counter()
+        coords = await asyncio.to_thread(layout_records, records)
+        LAYOUT_LATENCY.labels("exact" if n <= LAYOUT_EXACT_MAX_NODES else "grid").observe(time.perf_counter() - started)
+        if key is None:
+            return coords
+        self._entries[key] = coords
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return coords
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+def apply(records: list[dict], coords: dict[str, tuple[float, float]]) -> list[dict]:
+    """Set x / y on the node records that have coordinates."""
+    for r in records:
+        xy = coords.get(r["id"]) if r.get("kind") == "node" else None
+        if xy is not None:
+            r["x"], r["y"] = xy
+    return records
+
+
+CACHE = LayoutCache()
@@ -0,0 +1,262 @@
+# graph_paths.py
+"""
+Path engine shared by the FastAPI backend and the MCP server: bidirectional BFS over the AGE
+edge tables, replacing hand-written variable-length Cypher such as
+
+    MATCH p = (a:Customer)-[*1..4]-(b:Feature) WHERE a.payload.id = ... RETURN p
+
+which AGE evaluates by enumerating every walk up to the bound (exponential in the depth).
+
+- Each BFS level is one statement: the whole frontier goes in as a graphid array and the
+  matching edges come back from `"graph"._ag_label_edge` (optionally restricted to edge types).
+- The side with the smaller frontier is expanded next, so the search meets in the middle and
+  touches roughly the square root of what a one-sided search would.
+- Hub guard: a node with more than `hub_degree` matching edges is not expanded through (it can
+  still be an endpoint or the meeting node of a path); such nodes are listed in stats.hubs.
+- Up to `k` paths are returned, shortest first: the shortest paths through each meeting node,
+  with levels expanded further while fewer than `k` have been found and `max_depth` allows.
+
+Results are compact: paths are node / edge id lists plus a one-line text rendering, and node
+names and labels are given once in a dictionary.
+"""
+
+import os, json, time
+from typing import Any
+
+from psycopg import sql
+
+# Upper bounds for the caller-supplied max_depth / k
+PATH_MAX_DEPTH = int(os.getenv("GRAPH_PATH_MAX_DEPTH", "6"))
+PATH_MAX_K = int(os.getenv("GRAPH_PATH_MAX_K", "10"))
+# Nodes with more matching edges than this are not expanded through (frontier explosion guard)
+PATH_HUB_DEGREE = int(os.getenv("GRAPH_PATH_HUB_DEGREE", "500"))
+# Edges read per BFS level; a level that hits the cap marks the result truncated
+PATH_MAX_LEVEL_EDGES = int(os.getenv("GRAPH_PATH_MAX_LEVEL_EDGES", "50000"))
+# Vertices an endpoint spec may resolve to
+PATH_MAX_ENDPOINTS = 50
+
+_REVERSE = {"out": "in", "in": "out", "both": "both"}
+
+
+def _graphid_array(ids) -> str:
+    return "{" + ",".join(ids) + "}"
+
+
+async def _labels(cur, graph: str) -> dict[str, dict]:
+    """{"by_oid": {oid: name}, "vertex": {name: oid}, "edge": {name: oid}} for the graph."""
+    await cur.execute("""
+        SELECT l.relation::oid AS oid, l.name, l.kind
+        FROM ag_catalog.ag_label l
+        JOIN ag_catalog.ag_graph g ON l.graph = g.graphid
+        WHERE g.name = %s;
+    """, (graph,))
+    rows = await cur.fetchall()
+    if not rows:
+        raise ValueError(f"Unknown graph: {graph}")
+    return {
+        "by_oid": {r["oid"]: r["name"] for r in rows},
+        "vertex": {r["name"]: r["oid"] for r in rows if r["kind"] == "v"},
+        "edge": {r["name"]: r["oid"] for r in rows if r["kind"] == "e"},
+    }
+
+
+async def resolve_endpoint(cur, graph: str, spec: dict, labels: dict) -> list[str]:
+    """
+    Graphids for an endpoint spec: {"graphid": "844424930131969"} or {"id": <payload.id>,
+    "label": "Customer"} (label optional; without it every vertex label is searched).
+    """
+    if spec.get("graphid") not in (None, ""):
+        return [str(int(spec["graphid"]))]
+    if spec.get("id") in (None, ""):
+        raise ValueError("endpoint needs 'graphid' or 'id'")
+    label = spec.get("label") or "_ag_label_vertex"
+    if label != "_ag_label_vertex" and label not in labels["vertex"]:
+        raise ValueError(f"Unknown node label: {label}")
+    pid = spec["id"] if isinstance(spec["id"], str) else json.dumps(spec["id"])
+    await cur.execute(sql.SQL("""
+        SELECT v.id::text AS id FROM {table} v
+        WHERE (v.properties::text)::jsonb -> 'payload' ->> 'id' = %s
+        ORDER BY v.id LIMIT %s;
+    """).format(table=sql.Identifier(graph, label)), (pid, PATH_MAX_ENDPOINTS))
+    return [r["id"] for r in await cur.fetchall()]
+
+
+def _level_sql(graph: str, direction: str, edge_filter: bool) -> sql.Composed:
+    """One BFS level: up to hub_cap edges per frontier node and direction, level_cap in total."""
+    edge = sql.Identifier(graph, "_ag_label_edge")
+    etype = sql.SQL("AND e.tableoid = ANY(%(edge_oids)s::oid[])" if edge_filter else "")
+    outgoing = sql.SQL("""
+                (SELECT e.id, e.end_id AS nbr, e.start_id AS src, e.end_id AS dst, e.tableoid::oid AS label_oid
+                 FROM {edge} e WHERE e.start_id = f.node {etype} LIMIT %(hub_cap)s)""").format(edge=edge, etype=etype)
+    incoming = sql.SQL("""
+                (SELECT e.id, e.start_id, e.start_id, e.end_id, e.tableoid::oid
+                 FROM {edge} e WHERE e.end_id = f.node {etype} LIMIT %(hub_cap)s)""").format(edge=edge, etype=etype)
+    hop_edges = {
+        "out": outgoing, "in": incoming, "both": outgoing + sql.SQL("\n                UNION ALL") + incoming,
+    }[direction]
+    return sql.SQL("""
+        SELECT f.node::text AS node, x.id::text AS id, x.nbr::text AS nbr,
+               x.src::text AS src, x.dst::text AS dst, x.label_oid
+        FROM unnest(%(frontier)s::ag_catalog.graphid[]) AS f(node)
+        CROSS JOIN LATERAL ({hop_edges}
+        ) x
+        LIMIT %(level_cap)s;
+    """).format(hop_edges=hop_edges)
+
+
+class _Side:
+    """One direction of the search: BFS depth and shortest-path parents of every reached node."""
+
+    def __init__(self, roots: list[str], direction: str):
+        self.direction = direction
+        self.depth: dict[str, int] = {r: 0 for r in roots}
+        self.parents: dict[str, list[tuple[str, str]]] = {r: [] for r in roots}
+        self.frontier = list(self.depth)
+        self.level = 0
+
+    def walks(self, node: str, cap: int) -> list[tuple[list[str], list[str]]]:
+        """Up to `cap` shortest (nodes, edges) walks from `node` back to a root."""
+        out: list[tuple[list[str], list[str]]] = []
+        stack = [(node, [node], [])]
+        while stack and len(out) < cap:
+            n, nodes, edges = stack.pop()
+            if not self.parents[n]:
+                out.append((nodes, edges))
+                continue
+            for prev, eid in self.parents[n]:
+                stack.append((prev, nodes + [prev], edges + [eid]))
+        return out
+
+
+async def find_paths(
+    cur,
+    graph: str,
+    source: dict,
+    target: dict,
+    *,
+    max_depth: int = 4,
+    k: int = 1,
+    direction: str = "both",
+    edge_types: list[str] | None = None,
+    hub_degree: int = PATH_HUB_DEGREE,
+    max_level_edges: int = PATH_MAX_LEVEL_EDGES,
+) -> dict[str, Any]:
+    """
+    Up to `k` shortest paths of at most `max_depth` edges from `source` to `target` (endpoint
+    specs, see resolve_endpoint). direction "out" follows edges source -> target, "in" the
+    reverse, "both" ignores edge direction. `cur` is a dict_row cursor; nothing is written.
+
+    Returns {"paths": [{"length", "nodes", "edges", "text"}], "nodes": {graphid: {"label",
+    "name"}}, "edges": {id: {"label", "src", "dst"}}, "stats": {...}}.
+    """
+    if direction not in ("out", "in", "both"):
+        raise ValueError("direction must be 'out', 'in', or 'both'")
+    started = time.perf_counter()
+    max_depth = max(1, min(int(max_depth), PATH_MAX_DEPTH))
+    k = max(1, min(int(k), PATH_MAX_K))
+    hub_degree = max(1, int(hub_degree))
+
+    labels = await _labels(cur, graph)
+    edge_oids = None
+    if edge_types:
+        unknown = [t for t in edge_types if t not in labels["edge"]]
+        if unknown:
+            raise ValueError(f"Unknown edge label(s): {', '.join(unknown)}")
+        edge_oids = [labels["edge"][t] for t in edge_types]
+    sources = await resolve_endpoint(cur, graph, source, labels)
+    targets = await resolve_endpoint(cur, graph, target, labels)
+    if not sources or not targets:
+        raise LookupError(f"No node matches the {'source' if not sources else 'target'} endpoint")
+
+    fwd, bwd = _Side(sources, direction), _Side(targets, _REVERSE[direction])
+    q = {d: _level_sql(graph, d, edge_oids is not None) for d in {fwd.direction, bwd.direction}}
+    edges: dict[str, tuple[str, str, int]] = {}
+    hubs: set[str] = set()
+    found: dict[tuple, tuple[list[str], list[str]]] = {}
+    truncated = False
+
+    def collect(meets) -> None:
+        for m in meets:
+            for s_nodes, s_edges in fwd.walks(m, k):
+                for t_nodes, t_edges in bwd.walks(m, k):
+                    nodes = s_nodes[::-1] + t_nodes[1:]
+                    if len(set(nodes)) == len(nodes):
+                        found.setdefault(tuple(s_edges[::-1] + t_edges), (nodes, s_edges[::-1] + t_edges))
+
+    collect(set(sources) & set(targets))
+    while len(found) < k and fwd.level + bwd.level < max_depth and (fwd.frontier or bwd.frontier):
+        # A side whose frontier emptied (dead end, or only hubs) stops; the other can still reach it
+        if fwd.frontier and (not bwd.frontier or len(fwd.frontier) <= len(bwd.frontier)):
+            side, other = fwd, bwd
+        else:
+            side, other = bwd, fwd
+        await cur.execute(q[side.direction], {
+            "frontier": _graphid_array(side.frontier), "edge_oids": edge_oids,
+            "hub_cap": hub_degree + 1, "level_cap": max_level_edges,
+        })
+        rows = await cur.fetchall()
+        truncated = truncated or len(rows) >= max_level_edges
+
+        degree: dict[str, int] = {}
+        for r in rows:
+            degree[r["node"]] = degree.get(r["node"], 0) + 1
+        level_hubs = {n for n, d in degree.items() if d > hub_degree}
+        hubs |= level_hubs
+
+        side.level += 1
+        reached: list[str] = []
+        for r in rows:
+            node, nbr = r["node"], r["nbr"]
+            if node in level_hubs:
+                continue
+            depth = side.depth.get(nbr)
+            if depth is None:
+                side.depth[nbr] = side.level
+                side.parents[nbr] = [(node, r["id"])]
+                reached.append(nbr)
+            elif depth == side.level and len(side.parents[nbr]) < k:
+                side.parents[nbr].append((node, r["id"]))
+            else:
+                continue
+            edges[r["id"]] = (r["src"], r["dst"], r["label_oid"])
+        side.frontier = reached
+        collect(n for n in reached if n in other.depth)
+
+    ranked = sorted(found.values(), key=lambda p: len(p[1]))[:k]
+    node_ids = list(dict.fromkeys(n for nodes, _ in ranked for n in nodes))
+    names: dict[str, dict] = {}
+    if node_ids:
+        await cur.execute(sql.SQL("""
+            SELECT v.id::text AS id, v.tableoid::oid AS label_oid,
+                   COALESCE(p ->> 'name', p ->> 'title', p ->> 'subject', p ->> 'id') AS name
+            FROM {vertex} v, LATERAL (SELECT (v.properties::text)::jsonb -> 'payload' AS p) j
+            WHERE v.id = ANY(%s::ag_catalog.graphid[]);
+        """).format(vertex=sql.Identifier(graph, "_ag_label_vertex")), (_graphid_array(node_ids),))
+        names = {r["id"]: {"label": labels["by_oid"].get(r["label_oid"], ""), "name": r["name"]}
+                 for r in await cur.fetchall()}
+
+    def node_text(n: str) -> str:
+        info = names.get(n, {})
+        return f"{info.get('name') or n} ({info.get('label', '')})"
+
+    paths = []
+    used_edges: dict[str, dict] = {}
+    for nodes, path_edges in ranked:
+        text = node_text(nodes[0])
+        for prev, eid, nxt in zip(nodes, path_edges, nodes[1:]):
+            src, dst, label_oid = edges[eid]
+            label = labels["by_oid"].get(label_oid, "")
+            used_edges[eid] = {"label": label, "src": src, "dst": dst}
+            text += (f" -[{label}]-> " if src == prev else f" <-[{label}]- ") + node_text(nxt)
+        paths.append({"length": len(path_edges), "nodes": nodes, "edges": path_edges, "text": text})
+
+    return {
+        "paths": paths,
+        "nodes": names,
+        "edges": used_edges,
+        "stats": {
+            "levels": fwd.level + bwd.level,
+            "visited": len(fwd.depth) + len(bwd.depth), "hubs": sorted(hubs)[:20],
+            "truncated": truncated, "ms": round((time.perf_counter() - started) * 1000, 1),
+        },
+    }
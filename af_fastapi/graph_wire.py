@@ -0,0 +1,143 @@
+# graph_wire.py
+"""
+Compact columnar wire format for graph viewer responses, selected by content negotiation.
+
+The default viewer response is a JSON array of {"id","label","properties","kind","src","dst"}
+records. With `Accept: application/vnd.age-graph.columnar+json` (or `+msgpack`) the same
+records are sent as:
+
+    {"v": 1,
+     "labels": ["Customer", "OWNS", ...],              # label dictionary
+     "props":  [{...}, {...}, ...],                     # distinct property objects
+     "nodes":  {"id": [...], "label": [0, ...], "props": [0, ...]},
+     "edges":  {"id": [...], "label": [1, ...], "src": [...], "dst": [...], "props": [1, ...]},
+     ...response metadata (e.g. hops / truncated for /expand)}
+
+Labels and properties are integer-coded (props -1 = none); the element kind is given by the
+section, and src/dst exist only for edges. Per-node extras such as "hop" or "truncated" go in
+nodes["extra"] = {"<index>": {...}}; server-side layout coordinates, when present, are the
+columns nodes["x"] / nodes["y"]. Ids stay strings: graphids can exceed 2^53. Bodies of
+GZIP_MIN_BYTES or more are gzip'd when the client sends Accept-Encoding: gzip.
+"""
+
+import os, gzip, json
+from typing import Any, Iterable
+
+import msgpack
+
+COLUMNAR_JSON = "application/vnd.age-graph.columnar+json"
+COLUMNAR_MSGPACK = "application/vnd.age-graph.columnar+msgpack"
+GZIP_MIN_BYTES = int(os.getenv("GRAPH_WIRE_GZIP_MIN_BYTES", "1024"))
+
+_RECORD_KEYS = {"id", "label", "properties", "kind", "src", "dst", "x", "y"}
+
+
+def negotiate(accept: str) -> str | None:
+    """The columnar media type the client asked for, or None for the default JSON records."""
+    accept = accept or ""
+    if COLUMNAR_MSGPACK in accept:
+        return COLUMNAR_MSGPACK
+    if COLUMNAR_JSON in accept:
+        return COLUMNAR_JSON
+    return None
+
+
+def _label_name(raw: Any) -> str:
+    """'["Customer"]' -> Customer, '"OWNS"' -> OWNS (the agtype-shaped labels of viewer records)."""
+    if raw is None:
+        return ""
+    try:
+        parsed = json.loads(raw) if isinstance(raw, str) else raw
+    except ValueError:
+        return str(raw)
+    if isinstance(parsed, list):
+        return str(parsed[0]) if parsed else ""
+    return str(parsed)
+
+
+def to_columnar(records: Iterable[dict], **meta: Any) -> dict:
+    labels: dict[str, int] = {}
+    props: dict[str, int] = {}
+    prop_values: list[Any] = []
+    nodes: dict[str, Any] = {"id": [], "label": [], "props": []}
+    edges: dict[str, Any] = {"id": [], "label": [], "src": [], "dst": [], "props": []}
+    node_extra: dict[str, dict] = {}
+    xs: list[float | None] = []
+    ys: list[float | None] = []
+
+    for rec in records:
+        name = _label_name(rec.get("label"))
+        label_code = labels.setdefault(name, len(labels))
+        raw_props = rec.get("properties")
+        if raw_props is None:
+            prop_code = -1
+        else:
+            key = raw_props if isinstance(raw_props, str) else json.dumps(raw_props, sort_keys=True)
+            prop_code = props.get(key)
+            if prop_code is None:
+                prop_code = props[key] = len(prop_values)
+                prop_values.append(json.loads(raw_props) if isinstance(raw_props, str) else raw_props)
+
+        if rec.get("kind") == "edge":
+            edges["id"].append(rec["id"])
+            edges["label"].append(label_code)
+            edges["src"].append(rec["src"])
+            edges["dst"].append(rec["dst"])
+            edges["props"].append(prop_code)
+        else:
+            extra = {k: v for k, v in rec.items() if k not in _RECORD_KEYS}
+            if extra:
+                node_extra[str(len(nodes["id"]))] = extra
+            nodes["id"].append(rec["id"])
+            nodes["label"].append(label_code)
+            nodes["props"].append(prop_code)
+            xs.append(rec.get("x"))
+            ys.append(rec.get("y"))
+
+    if node_extra:
+        nodes["extra"] = node_extra
+    if any(x is not None for x in xs):
+        nodes["x"], nodes["y"] = xs, ys
+    return {"v": 1, "labels": list(labels), "props": prop_values, "nodes": nodes, "edges": edges, **meta}
+
+
+def encode(records: Iterable[dict], media_type: str, accept_encoding: str = "", **meta: Any) -> tuple[bytes, dict[str, str]]:
+    """Serialize records in `media_type`; returns (body, extra response headers)."""
+    payload = to_columnar(records, **meta)
+    if media_type == COLUMNAR_MSGPACK:
+        body = msgpack.packb(payload, use_bin_type=True)
+    else:
+        body = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if "gzip" in (accept_encoding or "") and len(body) >= GZIP_MIN_BYTES:
+        body = gzip.compress(body, compresslevel=5)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+
+def from_columnar(payload: dict) -> list[dict]:
+    """Inverse of to_columnar (viewer records with agtype-shaped labels); used by the benchmark."""
+    labels, props = payload["labels"], payload["props"]
+
+    def prop(code: int) -> str | None:
+        return None if code < 0 else json.dumps(props[code])
+
+    out: list[dict] = []
+    nodes, edges = payload["nodes"], payload["edges"]
+    extra = nodes.get("extra", {})
+    xs, ys = nodes.get("x"), nodes.get("y")
+    for i, nid in enumerate(nodes["id"]):
+        name = labels[nodes["label"][i]]
+        rec = {
+            "id": nid, "label": json.dumps([name] if name else []), "properties": prop(nodes["props"][i]),
+            "kind": "node", "src": None, "dst": None, **extra.get(str(i), {}),
+        }
+        if xs is not None and xs[i] is not None:
+            rec["x"], rec["y"] = xs[i], ys[i]
+        out.append(rec)
+    for i, eid in enumerate(edges["id"]):
+        out.append({
+            "id": eid, "label": json.dumps(labels[edges["label"][i]]), "properties": prop(edges["props"][i]),
+            "kind": "edge", "src": edges["src"][i], "dst": edges["dst"][i],
+        })
+    return out
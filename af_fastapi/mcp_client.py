@@ -200,6 +200,40 @@ from agent_framework import MCPStreamableHTTPTool
 import mcp.types as _mcp_types
 from mcp import ClientSession as _ClientSession
 from datetime import timedelta as _timedelta
+from tracing import Span, inject, record_stage, start_span
+
+
+class _TracingClientSession(_ClientSession):
+    """ClientSession that wraps each tools/call in a client span and sends the trace
+    context to the server as `traceparent` in the request `_meta`. DB time reported back by
+    the server in the result `_meta.timings` is added to the trace's stage breakdown."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Span of the tools/call in flight — server-initiated requests (elicitation) attach to it
+        self.active_call_span: Span | None = None
+
+    async def send_request(self, request, result_type, *args, **kwargs):
+        root = getattr(request, "root", None)
+        if not isinstance(root, _mcp_types.CallToolRequest):
+            return await super().send_request(request, result_type, *args, **kwargs)
+
+        tool = root.params.name
+        with start_span(f"mcp.call_tool {tool}", kind="client", stage="mcp", tool=tool) as span:
+            meta = root.params.meta.model_dump() if root.params.meta else {}
+            root.params.meta = _mcp_types.RequestParams.Meta(**inject(meta, span))
+            previous, self.active_call_span = self.active_call_span, span
+            try:
+                result = await super().send_request(request, result_type, *args, **kwargs)
+            finally:
+                self.active_call_span = previous
+            timings = (getattr(result, "meta", None) or {}).get("timings") or {}
+            if timings.get("db_ms"):
+                record_stage(span.trace_id, "db", float(timings["db_ms"]))
+                span.set_attribute("db_ms", timings["db_ms"])
+            if getattr(result, "isError", False):
+                span.status = "error"
+            return result
 
 
 class LoggingMCPStreamableHTTPTool(MCPStreamableHTTPTool):
@@ -244,13 +278,19 @@ class LoggingMCPStreamableHTTPTool(MCPStreamableHTTPTool):
                 f"[elicitation] Waiting for user to confirm graph: {message}",
                 "info",
             )
-            chosen = await publish_elicitation(
-                session_id=self._broadcast_session_id,
+            with start_span(
+                "elicitation.wait",
+                stage="elicitation",
+                parent=getattr(self.session, "active_call_span", None),
                 elicitation_id=elicitation_id,
-                message=message,
-                options=options,
-                provided=_provided_name,
-            )
+            ):
+                chosen = await publish_elicitation(
+                    session_id=self._broadcast_session_id,
+                    elicitation_id=elicitation_id,
+                    message=message,
+                    options=options,
+                    provided=_provided_name,
+                )
             if chosen is not None:
                 await publish_mcplog(
                     self._broadcast_session_id,
@@ -293,7 +333,7 @@ class LoggingMCPStreamableHTTPTool(MCPStreamableHTTPTool):
                 raise ToolException(error_msg, inner_exception=ex) from ex
             try:
                 session = await self._exit_stack.enter_async_context(
-                    _ClientSession(
+                    _TracingClientSession(
                         read_stream=transport[0],
                         write_stream=transport[1],
                         read_timeout_seconds=_timedelta(seconds=self.request_timeout) if self.request_timeout else None,
@@ -0,0 +1,83 @@
+# metrics.py
+"""
+Prometheus metrics for the FastAPI backend, served on GET /metrics.
+
+Updates are plain prometheus_client counter/histogram/gauge operations; SSE session and
+queue gauges are computed at scrape time instead of on every message.
+"""
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+_FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+HTTP_LATENCY = Histogram(
+    "http_request_latency_seconds", "HTTP request latency (time to response headers)", ["route", "method", "status"],
+    buckets=_LATENCY_BUCKETS,
+)
+
+SSE_SESSIONS = Gauge("sse_sessions", "Local SSE sessions (served by the process-wide Redis subscriber)")
+SSE_QUEUE_DEPTH = Gauge(
+    "sse_queue_depth", "Messages waiting in local SSE session queues (total, max, full_sessions)", ["stat"],
+)
+SSE_QUEUE_EVENTS = Counter(
+    "sse_queue_overflow_total", "SSE events coalesced or dropped by bounded session queues", ["event", "result"],
+)
+SSE_SLOW_DISCONNECTS = Counter(
+    "sse_slow_consumer_disconnects_total", "SSE sessions disconnected after staying full past the deadline",
+)
+SSE_MESSAGES = Counter("sse_messages_total", "Messages published to the SSE bus", ["event"])
+SSE_RECEIVED = Counter(
+    "sse_received_total", "SSE bus messages received by this process's subscriber", ["result"],
+)
+SSE_REPLAYED = Counter("sse_replayed_total", "SSE events replayed from Redis Streams after a reconnect")
+SSE_REPLAY_LATENCY = Histogram(
+    "sse_replay_latency_seconds", "Redis Stream read time of a Last-Event-ID replay", buckets=_FAST_BUCKETS,
+)
+REDIS_PUBLISH_LATENCY = Histogram(
+    "redis_publish_latency_seconds", "SSE bus publish (XADD + PUBLISH script) round-trip latency", buckets=_FAST_BUCKETS,
+)
+SSE_PUBLISH_BATCH = Histogram(
+    "sse_publish_batch_events", "Events per SSE bus publish round trip (micro-batching)",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+
+WORKFLOW_ROUNDS = Histogram(
+    "workflow_rounds", "Agent rounds per conversation turn", ["workflow"],
+    buckets=(1, 2, 3, 4, 5, 6, 8, 10, 15, 20),
+)
+WORKFLOW_LATENCY = Histogram(
+    "workflow_latency_seconds", "Conversation turn latency (first to last NDJSON message)", ["workflow", "outcome"],
+    buckets=_LATENCY_BUCKETS,
+)
+LLM_LATENCY = Histogram(
+    "llm_call_latency_seconds", "Chat completion latency per agent", ["agent"], buckets=_LATENCY_BUCKETS,
+)
+
+DB_CONNECTIONS = Gauge("age_db_connections", "Open PGAgeHelper connections (one per graph)")
+DB_QUERY_LATENCY = Histogram(
+    "age_db_query_latency_seconds", "Graph viewer query latency", ["operation"], buckets=_LATENCY_BUCKETS,
+)
+DB_ROWS_RETURNED = Histogram(
+    "age_db_rows_returned", "Rows returned per graph viewer query", ["operation"],
+    buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000),
+)
+
+RESPONSE_CACHE = Counter(
+    "graph_response_cache_total", "Graph viewer response cache lookups", ["endpoint", "result"],
+)
+RESPONSE_CACHE_BYTES_SAVED = Counter(
+    "graph_response_cache_bytes_saved_total",
+    "Response bytes not sent (304) or not re-rendered (cache hit)", ["endpoint", "kind"],
+)
+RESPONSE_CACHE_SIZE = Gauge("graph_response_cache_size", "Graph viewer response cache size", ["stat"])
+LAYOUT_LATENCY = Histogram(
+    "graph_layout_latency_seconds", "Server-side viewer layout computation time", ["method"],
+    buckets=_LATENCY_BUCKETS,
+)
+LAYOUT_CACHE = Counter("graph_layout_cache_total", "Viewer layout cache lookups", ["result"])
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Return (body, content_type) for the /metrics endpoint."""
+    return generate_latest(), CONTENT_TYPE_LATEST
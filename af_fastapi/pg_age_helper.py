@@ -1,10 +1,17 @@
-import os, asyncio, json, re
+import os, asyncio, base64, itertools, json, logging, re
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 import psycopg
 from psycopg import sql
 from dotenv import load_dotenv
 from psycopg.rows import dict_row
 
+import graph_paths
+
 load_dotenv()
+logger = logging.getLogger("uvicorn.error")
+
 DSN = dict(
     host=os.getenv("PGHOST", "localhost"),
     port=int(os.getenv("PGPORT", "5432")),
@@ -22,39 +29,322 @@ def _validate_label(lbl: str):
         raise ValueError(f"Invalid label: {lbl!r}")
 
 
+# Graph viewer neighborhood: max edges returned per direction (hub nodes are marked "truncated")
+NEIGHBORHOOD_FANOUT = int(os.getenv("GRAPH_NEIGHBORHOOD_FANOUT", "200"))
+# Same-label nodes shown when the clicked node has no edges
+NEIGHBORHOOD_SIBLINGS = 50
+
+
+# k-hop expansion (/graph/{graph}/expand) limits
+EXPAND_MAX_HOPS = int(os.getenv("GRAPH_EXPAND_MAX_HOPS", "6"))
+EXPAND_PER_HOP_LIMIT = int(os.getenv("GRAPH_EXPAND_PER_HOP_LIMIT", "200"))
+EXPAND_MAX_NODES = int(os.getenv("GRAPH_EXPAND_MAX_NODES", "1000"))
+# Edges scanned from the frontier per hop and direction; bounds the cost of hub nodes
+EXPAND_MAX_EDGES_PER_HOP = int(os.getenv("GRAPH_EXPAND_MAX_EDGES_PER_HOP", "20000"))
+
+
+# Rows fetched per round trip when streaming viewer results off a server-side cursor
+STREAM_BATCH_ROWS = int(os.getenv("GRAPH_STREAM_BATCH_ROWS", "500"))
+_STREAM_IDS = itertools.count(1)
+# Streams read on their own connections (the shared one commits under them); idle ones kept per
+# graph, and ms a stream's read transaction may sit waiting on a slow client before Postgres ends it
+STREAM_MAX_IDLE_CONNS = int(os.getenv("GRAPH_STREAM_MAX_IDLE_CONNS", "2"))
+STREAM_IDLE_TIMEOUT_MS = int(os.getenv("GRAPH_STREAM_IDLE_TIMEOUT_MS", "30000"))
+
+
+# Bulk writes (/graph/{graph}/nodes:batch, edges:batch): rows per INSERT statement and
+# transaction, and the most items accepted per request
+BATCH_CHUNK_ROWS = int(os.getenv("GRAPH_BATCH_CHUNK_ROWS", "1000"))
+BATCH_MAX_ITEMS = int(os.getenv("GRAPH_BATCH_MAX_ITEMS", "100000"))
+# (label, payload.id) -> graphid entries kept in process for edge endpoint resolution
+PAYLOAD_ID_CACHE_SIZE = int(os.getenv("GRAPH_PAYLOAD_ID_CACHE_SIZE", "100000"))
+
+# Largest page query_by_types / /graph/{graph}/traverse returns
+TRAVERSE_MAX_LIMIT = int(os.getenv("GRAPH_TRAVERSE_MAX_LIMIT", "1000"))
+
+# Label summary graph (/graph/{graph}/summary): super-nodes beyond this many are grouped by
+# label prefix and then into "Other"; only the largest super-edges are kept
+SUMMARY_MAX_GROUPS = int(os.getenv("GRAPH_SUMMARY_MAX_GROUPS", "60"))
+SUMMARY_MAX_EDGES = int(os.getenv("GRAPH_SUMMARY_MAX_EDGES", "300"))
+# Edge rows read from a label table that has no planner statistics (ANALYZE failed)
+SUMMARY_PROBE_ROWS = 1000
+# Sampled overview (/graph/{graph}/nodes?sample=system|bernoulli): TABLESAMPLE reads this many
+# times a label's quota in expectation, so a sample rarely comes up short
+SAMPLE_OVERSAMPLE = float(os.getenv("GRAPH_SAMPLE_OVERSAMPLE", "3"))
+# Skeleton viewer records (?skeleton=true): edges counted per direction for a node's degree
+# (hubs report at most this per direction), and the most ids one /elements request may ask for
+SKELETON_DEGREE_CAP = int(os.getenv("GRAPH_SKELETON_DEGREE_CAP", "1000"))
+ELEMENTS_MAX_IDS = int(os.getenv("GRAPH_ELEMENTS_MAX_IDS", "500"))
+
+
+# Per-graph data version, bumped in the same transaction as every write (and by the loaders);
+# the viewer response cache and ETags are keyed on it
+GRAPH_VERSIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS public.graph_versions (
+        graph      name PRIMARY KEY,
+        version    bigint NOT NULL DEFAULT 0,
+        updated_at timestamptz NOT NULL DEFAULT now()
+    );
+"""
+BUMP_GRAPH_VERSION = """
+    INSERT INTO public.graph_versions AS gv (graph, version) VALUES (%s, 1)
+    ON CONFLICT (graph) DO UPDATE SET version = gv.version + 1, updated_at = now();
+"""
+
+# payload.id -> graphid lookup table, written in the same statement/transaction as the vertex.
+# Keyed by the ag_graph oid, so rows of a dropped and recreated graph are never matched.
+PAYLOAD_IDS_DDL = """
+    CREATE TABLE IF NOT EXISTS public.graph_payload_ids (
+        graph      oid NOT NULL,
+        label      name NOT NULL,
+        payload_id text NOT NULL,
+        id         ag_catalog.graphid NOT NULL,
+        PRIMARY KEY (graph, label, payload_id, id)
+    );
+"""
+
+
+def _payload_key(value) -> str:
+    """payload.id as text, the way (properties::text)::jsonb->'payload'->>'id' renders it."""
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def _graphid_array(ids: list[str]) -> str:
+    """Array literal for a %s::ag_catalog.graphid[] parameter (ids are graphid digit strings)."""
+    return "{" + ",".join(ids) + "}"
+
+
+def encode_cursor(label: str, after: str) -> str:
+    """Opaque page cursor for the viewer node listings: the last graphid of a page and its label filter."""
+    raw = json.dumps({"label": label, "after": after}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, label: str) -> str:
+    """Return the graphid to page after; ValueError if the cursor is malformed or for another label."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        after = str(int(data["after"]))
+    except (ValueError, KeyError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if data.get("label", "") != label:
+        raise ValueError("Cursor belongs to a different label listing")
+    return after
+
+
+def _parse_graphids(text: str | None) -> list[int]:
+    """'{844424930131969,...}' (an anyarray column of pg_stats as text) -> graphids."""
+    if not text:
+        return []
+    return [int(v) for v in text.strip("{}").split(",") if v]
+
+
+def _label_shares(stats: dict | None) -> dict[int, float]:
+    """Fraction of a start_id / end_id column's values per vertex label id (the top 16 bits of
+    a graphid), from its pg_stats row: most-common values first, the rest spread evenly over
+    the histogram buckets (a bucket spanning two labels is split between them)."""
+    shares: dict[int, float] = {}
+    if not stats:
+        return shares
+    mcv, mcf = _parse_graphids(stats["mcv"]), stats["mcf"] or []
+    for value, freq in zip(mcv, mcf):
+        shares[value >> 48] = shares.get(value >> 48, 0.0) + freq
+    hist = _parse_graphids(stats["hist"])
+    rest = max(0.0, 1.0 - sum(mcf) - (stats["null_frac"] or 0.0))
+    if len(hist) >= 2 and rest:
+        per_bucket = rest / (len(hist) - 1)
+        for lo, hi in zip(hist, hist[1:]):
+            for label_id in {lo >> 48, hi >> 48}:
+                shares[label_id] = shares.get(label_id, 0.0) + per_bucket / len({lo >> 48, hi >> 48})
+    total = sum(shares.values())
+    return {k: v / total for k, v in shares.items()} if total else {}
+
+
+def _label_prefix(name: str) -> str:
+    """Grouping key of a label: the part before the first '_' (Budget_Item_2024 -> Budget)."""
+    return name.split("_", 1)[0] or name
+
+
+def _sample_quotas(sizes: dict[str, float], limit: int, strategy: str) -> dict[str, int]:
+    """Nodes to draw per label for a stratified sample of `limit` nodes. "proportional": each
+    label's share of the vertex count (largest remainder, so quotas sum to `limit`); "capped":
+    an equal share per label, with what small labels cannot fill passed on to larger ones.
+    Labels whose quota rounds to 0 are left out."""
+    sizes = {name: n for name, n in sizes.items() if n > 0}
+    total = sum(sizes.values())
+    if not total or limit <= 0:
+        return {}
+    quotas: dict[str, int] = {}
+    if strategy == "proportional":
+        exact = {name: limit * n / total for name, n in sizes.items()}
+        quotas = {name: int(q) for name, q in exact.items()}
+        by_remainder = sorted(exact, key=lambda name: exact[name] - quotas[name], reverse=True)
+        for name in by_remainder[:max(0, limit - sum(quotas.values()))]:
+            quotas[name] += 1
+    else:
+        remaining = limit
+        ascending = sorted(sizes, key=sizes.get)
+        for i, name in enumerate(ascending):
+            quotas[name] = min(int(sizes[name]), remaining // (len(ascending) - i))
+            remaining -= quotas[name]
+    return {name: min(q, int(max(sizes[name], 1))) for name, q in quotas.items() if q > 0}
+
+
+def _node_record(row: dict, labels: dict[int, str]) -> dict:
+    name = labels.get(row["label_oid"], "")
+    # Vertices stored in the default label table have no label, like labels(n) = []
+    label = [] if not name or name.startswith("_ag_label") else [name]
+    return {
+        "id": row["id"], "label": json.dumps(label), "properties": row["properties"],
+        "kind": "node", "src": None, "dst": None,
+    }
+
+
+def _edge_record(row: dict, labels: dict[int, str]) -> dict:
+    return {
+        "id": row["id"], "label": json.dumps(labels.get(row["label_oid"], "")),
+        "properties": row["properties"], "kind": "edge", "src": row["src"], "dst": row["dst"],
+    }
+
+
+async def _connect(dsn: dict) -> psycopg.AsyncConnection:
+    """A connection with AGE loaded and ag_catalog on the search_path."""
+    conn = await psycopg.AsyncConnection.connect(**dsn, row_factory=dict_row)
+    async with conn.cursor() as cur:
+        await cur.execute("SELECT 1 FROM pg_extension WHERE extname='age';")
+        if not await cur.fetchone():
+            await conn.close()
+            raise RuntimeError(
+                "AGE extension is not installed in this database. "
+                "Run as superuser: CREATE EXTENSION age;"
+            )
+        try:
+            await cur.execute("LOAD 'age';")
+        except psycopg.errors.InsufficientPrivilege:
+            await conn.rollback()
+        await cur.execute('SET search_path = ag_catalog, "$user", public;')
+    await conn.commit()
+    return conn
+
+
 class PGAgeHelper:
-    def __init__(self, conn: psycopg.AsyncConnection, graph: str):
+    def __init__(self, conn: psycopg.AsyncConnection, graph: str, dsn: dict | None = None):
         self._conn = conn
         self.graph = graph
+        self._dsn = dsn if dsn is not None else DSN
+        # Every request for this graph shares self._conn; write transactions hold this lock so
+        # one request's commit or rollback can't end another's. See _transaction().
+        self._write_lock = asyncio.Lock()
+        # Idle connections for stream_nodes (see _stream_conn)
+        self._stream_conns: list[psycopg.AsyncConnection] = []
+        # label-table oid -> label name, see _label_names()
+        self._labels: dict[int, str] = {}
+        self._vertex_labels: set[str] = set()
+        # Set once _label_sizes has logged that some label tables were never analyzed
+        self._warned_unanalyzed = False
+        # False when public.graph_versions could not be created (responses are then not cached)
+        self._versioned = False
+        # False when public.graph_payload_ids could not be created (resolution then probes
+        # the payload.id expression index only)
+        self._payload_id_table = False
+        # (label, payload.id) -> graphids, LRU; valid for the graph oid in _id_cache_graph
+        self._id_cache: OrderedDict[tuple[str, str], tuple[str, ...]] = OrderedDict()
+        self._id_cache_graph: int | None = None
 
     @classmethod
     async def create(cls, dsn: dict, graph: str) -> "PGAgeHelper":
-        conn = await psycopg.AsyncConnection.connect(**dsn, row_factory=dict_row)
-        async with conn.cursor() as cur:
-            await cur.execute("SELECT 1 FROM pg_extension WHERE extname='age';")
-            if not await cur.fetchone():
-                await conn.close()
-                raise RuntimeError(
-                    "AGE extension is not installed in this database. "
-                    "Run as superuser: CREATE EXTENSION age;"
-                )
-            try:
-                await cur.execute("LOAD 'age';")
-            except psycopg.errors.InsufficientPrivilege:
-                await conn.rollback()
-            await cur.execute('SET search_path = ag_catalog, "$user", public;')
-        return cls(conn, graph)
+        conn = await _connect(dsn)
+        helper = cls(conn, graph, dsn)
+        try:
+            async with conn.cursor() as cur:
+                await cur.execute(GRAPH_VERSIONS_DDL)
+            await conn.commit()
+            helper._versioned = True
+        except psycopg.Error as e:
+            await conn.rollback()
+            print(f"graph_versions unavailable for {graph}; viewer responses will not be cached: {e}")
+        try:
+            async with conn.cursor() as cur:
+                await cur.execute(PAYLOAD_IDS_DDL)
+            await conn.commit()
+            helper._payload_id_table = True
+        except psycopg.Error as e:
+            await conn.rollback()
+            print(f"graph_payload_ids unavailable for {graph}; payload ids resolve via the label tables: {e}")
+        return helper
 
     async def close(self):
+        while self._stream_conns:
+            await self._stream_conns.pop().close()
         await self._conn.close()
 
+    @asynccontextmanager
+    async def _stream_conn(self) -> AsyncIterator[psycopg.AsyncConnection]:
+        """A connection of its own for one stream: a server-side cursor lives in a transaction,
+        and any commit or rollback on the shared self._conn (writes, ANALYZE, error recovery)
+        would close it mid-stream. The read transaction is rolled back afterwards; a client that
+        stops reading for STREAM_IDLE_TIMEOUT_MS gets its session ended by Postgres instead of
+        holding the snapshot open. Up to STREAM_MAX_IDLE_CONNS connections are reused."""
+        conn = self._stream_conns.pop() if self._stream_conns else None
+        if conn is None or conn.closed:
+            conn = await _connect(self._dsn)
+            async with conn.cursor() as cur:
+                await cur.execute(sql.SQL("SET idle_in_transaction_session_timeout = {}").format(
+                    sql.Literal(STREAM_IDLE_TIMEOUT_MS)))
+            await conn.commit()
+        try:
+            yield conn
+        finally:
+            try:
+                await conn.rollback()
+            except psycopg.Error:
+                pass
+            if conn.closed or conn.broken or len(self._stream_conns) >= STREAM_MAX_IDLE_CONNS:
+                await conn.close()
+            else:
+                self._stream_conns.append(conn)
+
+    @asynccontextmanager
+    async def _transaction(self) -> AsyncIterator[None]:
+        """One write transaction on the shared connection: commits on exit, rolls back if the
+        body raises. Writes from concurrent requests run one at a time, so a failed chunk's
+        rollback can't discard another request's rows and a commit can't publish another
+        request's half-written chunk."""
+        async with self._write_lock:
+            try:
+                yield
+            except BaseException:
+                await self._conn.rollback()
+                raise
+            await self._conn.commit()
+
     async def recreate_graph(self):
+        async with self._transaction():
+            async with self._conn.cursor() as cur:
+                await cur.execute("SELECT 1 FROM ag_catalog.ag_graph WHERE name=%s;", (self.graph,))
+                if await cur.fetchone():
+                    await cur.execute("SELECT ag_catalog.drop_graph(%s, true);", (self.graph,))
+                await cur.execute("SELECT ag_catalog.create_graph(%s::name);", (self.graph,))
+                if self._payload_id_table:
+                    await cur.execute(
+                        "DELETE FROM public.graph_payload_ids WHERE graph NOT IN (SELECT graphid FROM ag_catalog.ag_graph);")
+            await self._bump_version()
+        self._id_cache.clear()
+
+    async def graph_version(self) -> int | None:
+        """Data version of this graph (0 before the first write); None when versioning is unavailable."""
+        if not self._versioned:
+            return None
         async with self._conn.cursor() as cur:
-            await cur.execute("SELECT 1 FROM ag_catalog.ag_graph WHERE name=%s;", (self.graph,))
-            if await cur.fetchone():
-                await cur.execute("SELECT ag_catalog.drop_graph(%s, true);", (self.graph,))
-            await cur.execute("SELECT ag_catalog.create_graph(%s::name);", (self.graph,))
-        await self._conn.commit()
+            await cur.execute("SELECT version FROM public.graph_versions WHERE graph = %s;", (self.graph,))
+            row = await cur.fetchone()
+        return row["version"] if row else 0
+
+    async def _bump_version(self) -> None:
+        """Increment the graph version inside the caller's write transaction (commits with it)."""
+        if self._versioned:
+            async with self._conn.cursor() as cur:
+                await cur.execute(BUMP_GRAPH_VERSION, (self.graph,))
 
     async def insert_node(self, payload_any: dict, node_label: str = "TestNode"):
         _validate_label(node_label)
@@ -74,11 +364,19 @@ class PGAgeHelper:
 
         params_obj = {"payload": payload_any}
 
-        async with self._conn.cursor() as cur:
-            await cur.execute(q, (json.dumps(params_obj),))
-            row = await cur.fetchone()
-        await self._conn.commit()
-        return {"id": row[0], "label": row[1], "properties": row[2]}
+        async with self._transaction():
+            async with self._conn.cursor() as cur:
+                await cur.execute(q, (json.dumps(params_obj),))
+                row = await cur.fetchone()
+                pid = payload_any.get("id") if isinstance(payload_any, dict) else None
+                if self._payload_id_table and pid is not None:
+                    await cur.execute("""
+                        INSERT INTO public.graph_payload_ids (graph, label, payload_id, id)
+                        SELECT g.graphid, %s, %s, %s::ag_catalog.graphid FROM ag_catalog.ag_graph g WHERE g.name = %s
+                        ON CONFLICT DO NOTHING;
+                    """, (node_label, _payload_key(pid), str(row["id"]), self.graph))
+            await self._bump_version()
+        return {"id": row["id"], "label": row["label"], "properties": row["properties"]}
 
 
     async def create_edge_by_ids(
@@ -92,40 +390,303 @@ class PGAgeHelper:
     ):
         """
         Create (s)-[e:edge_label]->(t) where s.payload.id = src_id and t.payload.id = dst_id.
-        Returns the created edge as ag_catalog.agtype (text form).
+        Returns the created edge as {"id", "label", "properties"} (agtype text forms).
+
+        Endpoints are resolved through _resolve_payload_ids (in-process LRU, then the
+        graph_payload_ids lookup table) and the edge is inserted straight into its label table,
+        so the cost does not grow with the size of the vertex labels. Like the Cypher MATCH it
+        replaces, an id carried by several vertices creates an edge for every pair.
         """
         _validate_label(src_label)
         _validate_label(dst_label)
         _validate_label(edge_label)
 
-        cypher_text = f"""
-            MATCH (s:{src_label}), (t:{dst_label})
-            WHERE s.payload.id = $src_id AND t.payload.id = $dst_id
-            CREATE (s)-[e:{edge_label}]->(t)
-            SET e.payload = $payload
-            RETURN id(e) AS id, type(e) AS label, e.payload AS properties
-        """
-
+        src_key, dst_key = _payload_key(src_id), _payload_key(dst_id)
+        sources = (await self._resolve_payload_ids(src_label, {src_key})).get(src_key, [])
+        targets = (await self._resolve_payload_ids(dst_label, {dst_key})).get(dst_key, [])
+        if not sources or not targets:
+            raise LookupError(
+                f"No edge created. Check that nodes with payload.id={src_id!r} and {dst_id!r} exist."
+            )
+        # Creates the edge label table if it does not exist yet
+        await self._label_row(edge_label, "e")
+        properties = json.dumps({"payload": edge_payload or {}})
         q = sql.SQL("""
-            SELECT *
-            FROM ag_catalog.cypher({}::name, $cypher$
-            {cypher}
-            $cypher$, %s::ag_catalog.agtype) AS (id ag_catalog.agtype, label ag_catalog.agtype, properties ag_catalog.agtype);
-        """.replace("{cypher}", cypher_text)).format(sql.Literal(self.graph))
+            INSERT INTO {table} (start_id, end_id, properties)
+            SELECT s::ag_catalog.graphid, t::ag_catalog.graphid, %s::ag_catalog.agtype
+            FROM unnest(%s::text[]) AS s, unnest(%s::text[]) AS t
+            RETURNING id::text AS id;
+        """).format(table=sql.Identifier(self.graph, edge_label))
+        async with self._transaction():
+            async with self._conn.cursor() as cur:
+                await cur.execute(q, (properties, sources, targets))
+                row = await cur.fetchone()
+            await self._bump_version()
+        return {"id": row["id"], "label": json.dumps(edge_label), "properties": json.dumps(edge_payload or {})}
+
+
+    # ---------- Bulk writes (direct INSERT into the label tables) ----------
+    async def _label_row(self, label: str, kind: str) -> dict:
+        """ag_label row (id, seq_name) for `label`, creating the label table if it does not exist."""
+        async with self._transaction(), self._conn.cursor(row_factory=dict_row) as cur:
+            for attempt in range(2):
+                await cur.execute("""
+                    SELECT l.id, l.seq_name, l.kind FROM ag_catalog.ag_label l
+                    JOIN ag_catalog.ag_graph g ON l.graph = g.graphid
+                    WHERE g.name = %s AND l.name = %s;
+                """, (self.graph, label))
+                row = await cur.fetchone()
+                if row:
+                    if row["kind"] != kind:
+                        raise ValueError(f"{label!r} is already {'a node' if row['kind'] == 'v' else 'an edge'} label")
+                    return row
+                create = "create_vlabel" if kind == "v" else "create_elabel"
+                await cur.execute(sql.SQL("SELECT ag_catalog.{}({}, {});").format(
+                    sql.Identifier(create), sql.Literal(self.graph), sql.Literal(label)))
+                if kind == "v":
+                    # The table is empty, so the build is instant; existing labels get theirs from the loaders
+                    await cur.execute(self._payload_index_sql(label))
+                await self._load_labels()
+            raise RuntimeError(f"Could not create label {label!r}")
+
+    def _payload_index_sql(self, label: str) -> sql.Composed:
+        """Expression index on payload.id (same name/definition as the loaders'
+        create_index_on_payload_id), so edge endpoints resolve with an index probe."""
+        return sql.SQL("""
+            CREATE INDEX IF NOT EXISTS {idx}
+            ON {table} (((properties::text)::jsonb->'payload'->>'id'));
+        """).format(idx=sql.Identifier(f"idx_{self.graph}_{label}_payload_id"),
+                    table=sql.Identifier(self.graph, label))
+
+    def _seq_name(self, seq_name: str) -> str:
+        return '"{}"."{}"'.format(self.graph.replace('"', '""'), seq_name.replace('"', '""'))
+
+    async def _insert_chunk(self, q: sql.Composed, params: dict, indexes: list[int],
+                            results: list[dict | None]) -> None:
+        """Run one chunk INSERT in its own transaction; rows come back as (ord, id) in input order."""
+        try:
+            async with self._transaction():
+                async with self._conn.cursor(row_factory=dict_row) as cur:
+                    await cur.execute(q, params)
+                    rows = await cur.fetchall()
+                await self._bump_version()
+        except psycopg.Error as e:
+            for i in indexes:
+                results[i] = {"index": i, "ok": False, "error": str(e).strip()}
+            return
+        for r in rows:
+            i = indexes[r["ord"] - 1]
+            results[i] = {"index": i, "ok": True, "id": r["id"]}
+
+    async def insert_nodes_batch(self, items: list, chunk_size: int = BATCH_CHUNK_ROWS) -> list[dict]:
+        """
+        Bulk insert_node: items are {"label": str, "payload": {...}}. Rows go straight into the
+        vertex label tables with one multi-row INSERT (unnest of a text[] parameter) and one
+        commit per chunk of `chunk_size`. Returns one result per item, in order:
+        {"index", "ok": True, "id": graphid} or {"index", "ok": False, "error"}.
+        """
+        results: list[dict | None] = [None] * len(items)
+        by_label: dict[str, list[int]] = {}
+        for i, item in enumerate(items):
+            if not isinstance(item, dict) or not isinstance(item.get("payload", {}), dict):
+                results[i] = {"index": i, "ok": False, "error": "item must be an object with a 'payload' object"}
+                continue
+            label = item.get("label") or "TestNode"
+            try:
+                _validate_label(label)
+            except ValueError as e:
+                results[i] = {"index": i, "ok": False, "error": str(e)}
+                continue
+            by_label.setdefault(label, []).append(i)
 
-        params_obj = {"src_id": src_id, "dst_id": dst_id, "payload": edge_payload or {}}
+        for label, indexes in by_label.items():
+            try:
+                info = await self._label_row(label, "v")
+            except (ValueError, psycopg.Error) as e:
+                for i in indexes:
+                    results[i] = {"index": i, "ok": False, "error": str(e).strip()}
+                continue
+            # ids are drawn in the CTE (referenced twice, so evaluated once) to map rows back to items
+            lookup = sql.SQL("""
+                , ids AS (
+                    INSERT INTO public.graph_payload_ids (graph, label, payload_id, id)
+                    SELECT g.graphid, %(label)s, src.props::jsonb->'payload'->>'id', src.id
+                    FROM src, ag_catalog.ag_graph g
+                    WHERE g.name = %(graph)s AND src.props::jsonb->'payload'->>'id' IS NOT NULL
+                    ON CONFLICT DO NOTHING
+                )""") if self._payload_id_table else sql.SQL("")
+            q = sql.SQL("""
+                WITH src AS (
+                    SELECT u.ord, u.props,
+                           ag_catalog._graphid(%(label_id)s, nextval(%(seq)s::regclass)) AS id
+                    FROM unnest(%(props)s::text[]) WITH ORDINALITY AS u(props, ord)
+                ), ins AS (
+                    INSERT INTO {table} (id, properties)
+                    SELECT id, props::ag_catalog.agtype FROM src
+                ){lookup}
+                SELECT ord, id::text AS id FROM src ORDER BY ord;
+            """).format(table=sql.Identifier(self.graph, label), lookup=lookup)
+            for start in range(0, len(indexes), chunk_size):
+                chunk = indexes[start:start + chunk_size]
+                params = {
+                    "label_id": info["id"], "seq": self._seq_name(info["seq_name"]),
+                    "props": [json.dumps({"payload": items[i].get("payload") or {}}) for i in chunk],
+                    "label": label, "graph": self.graph,
+                }
+                await self._insert_chunk(q, params, chunk, results)
+        return results
 
+    async def _graph_oid(self) -> int | None:
+        """ag_graph oid of this graph. A dropped and recreated graph gets a new oid and reuses
+        graphids, so a change empties the payload.id cache."""
         async with self._conn.cursor() as cur:
-            await cur.execute(q, (json.dumps(params_obj),))
+            await cur.execute("SELECT graphid FROM ag_catalog.ag_graph WHERE name = %s;", (self.graph,))
             row = await cur.fetchone()
+        oid = row["graphid"] if row else None
+        if oid != self._id_cache_graph:
+            self._id_cache.clear()
+            self._id_cache_graph = oid
+        return oid
 
-        await self._conn.commit()
-        if not row:
-            raise LookupError(
-                f"No edge created. Check that nodes with payload.id={src_id!r} and {dst_id!r} exist."
-            )
-        return {"id": row[0], "label": row[1], "properties": row[2]}
-
+    async def _resolve_payload_ids(self, label: str, payload_ids: set[str]) -> dict[str, list[str]]:
+        """
+        payload.id -> graphids of `label` vertices carrying it. Looked up in the in-process LRU,
+        then public.graph_payload_ids (primary-key probe), then the payload.id expression index
+        of the label table for ids the lookup table does not have yet (e.g. rows written by
+        Cypher); those mappings are added to the table. Misses are not cached.
+        """
+        graph_oid = await self._graph_oid()
+        out: dict[str, list[str]] = {}
+        missing: list[str] = []
+        for pid in payload_ids:
+            hit = self._id_cache.get((label, pid))
+            if hit is None:
+                missing.append(pid)
+            else:
+                self._id_cache.move_to_end((label, pid))
+                out[pid] = list(hit)
+        if not missing or graph_oid is None:
+            return out
+        if label not in self._vertex_labels:
+            await self._load_labels()
+        if label not in self._vertex_labels:
+            return out
+
+        found: dict[str, list[str]] = {}
+        if self._payload_id_table:
+            async with self._conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute("""
+                    SELECT payload_id AS pid, id::text AS id FROM public.graph_payload_ids
+                    WHERE graph = %s AND label = %s AND payload_id = ANY(%s::text[])
+                    ORDER BY id;
+                """, (graph_oid, label, missing))
+                for r in await cur.fetchall():
+                    found.setdefault(r["pid"], []).append(r["id"])
+
+        unresolved = [pid for pid in missing if pid not in found]
+        if unresolved:
+            # Probes the loaders' payload.id index; never built here, a build would block the label's writes
+            q = sql.SQL("""
+                SELECT (properties::text)::jsonb->'payload'->>'id' AS pid, id::text AS id
+                FROM {table}
+                WHERE ((properties::text)::jsonb->'payload'->>'id') = ANY(%s::text[])
+                ORDER BY id;
+            """).format(table=sql.Identifier(self.graph, label))
+            backfill: list[tuple[str, str]] = []
+            async with self._transaction(), self._conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(q, (unresolved,))
+                for r in await cur.fetchall():
+                    found.setdefault(r["pid"], []).append(r["id"])
+                    backfill.append((r["pid"], r["id"]))
+                if backfill and self._payload_id_table:
+                    await cur.execute("""
+                        INSERT INTO public.graph_payload_ids (graph, label, payload_id, id)
+                        SELECT %s, %s, u.pid, u.id::ag_catalog.graphid
+                        FROM unnest(%s::text[], %s::text[]) AS u(pid, id)
+                        ON CONFLICT DO NOTHING;
+                    """, (graph_oid, label, [p for p, _ in backfill], [i for _, i in backfill]))
+
+        for pid, ids in found.items():
+            self._id_cache[(label, pid)] = tuple(ids)
+            out[pid] = ids
+        while len(self._id_cache) > PAYLOAD_ID_CACHE_SIZE:
+            self._id_cache.popitem(last=False)
+        return out
+
+    async def create_edges_batch(self, items: list, chunk_size: int = BATCH_CHUNK_ROWS) -> list[dict]:
+        """
+        Bulk create_edge_by_ids: items are {"label", "src_label", "dst_label", "src", "dst",
+        "payload"?} where src / dst are payload.id values. Endpoints are resolved per vertex label
+        for the whole request (_resolve_payload_ids), then edges are inserted into the
+        edge label tables like insert_nodes_batch. An id matching no vertex, or several, fails
+        that item only.
+        """
+        results: list[dict | None] = [None] * len(items)
+        wanted: dict[str, set[str]] = {}
+        valid: list[int] = []
+        for i, item in enumerate(items):
+            try:
+                if not isinstance(item, dict):
+                    raise ValueError("item must be an object")
+                for key in ("label", "src_label", "dst_label"):
+                    _validate_label(item.get(key))
+                if item.get("src") is None or item.get("dst") is None:
+                    raise ValueError("'src' and 'dst' (payload ids) are required")
+                if not isinstance(item.get("payload", {}), dict):
+                    raise ValueError("'payload' must be an object")
+            except ValueError as e:
+                results[i] = {"index": i, "ok": False, "error": str(e)}
+                continue
+            wanted.setdefault(item["src_label"], set()).add(_payload_key(item["src"]))
+            wanted.setdefault(item["dst_label"], set()).add(_payload_key(item["dst"]))
+            valid.append(i)
+
+        resolved = {label: await self._resolve_payload_ids(label, ids) for label, ids in wanted.items()}
+
+        by_label: dict[str, list[tuple[int, str, str]]] = {}
+        for i in valid:
+            item = items[i]
+            ends = []
+            for side in ("src", "dst"):
+                matches = resolved[item[f"{side}_label"]].get(_payload_key(item[side]), [])
+                if len(matches) != 1:
+                    problem = "no" if not matches else f"{len(matches)}"
+                    results[i] = {"index": i, "ok": False,
+                                  "error": f"{problem} {item[f'{side}_label']} vertices with payload.id={item[side]!r}"}
+                    break
+                ends.append(matches[0])
+            else:
+                by_label.setdefault(item["label"], []).append((i, ends[0], ends[1]))
+
+        for label, rows in by_label.items():
+            indexes = [i for i, _, _ in rows]
+            try:
+                info = await self._label_row(label, "e")
+            except (ValueError, psycopg.Error) as e:
+                for i in indexes:
+                    results[i] = {"index": i, "ok": False, "error": str(e).strip()}
+                continue
+            q = sql.SQL("""
+                WITH src AS (
+                    SELECT u.ord, u.s, u.d, u.props,
+                           ag_catalog._graphid(%(label_id)s, nextval(%(seq)s::regclass)) AS id
+                    FROM unnest(%(starts)s::text[], %(ends)s::text[], %(props)s::text[])
+                         WITH ORDINALITY AS u(s, d, props, ord)
+                ), ins AS (
+                    INSERT INTO {table} (id, start_id, end_id, properties)
+                    SELECT id, s::ag_catalog.graphid, d::ag_catalog.graphid, props::ag_catalog.agtype FROM src
+                )
+                SELECT ord, id::text AS id FROM src ORDER BY ord;
+            """).format(table=sql.Identifier(self.graph, label))
+            for start in range(0, len(rows), chunk_size):
+                chunk = rows[start:start + chunk_size]
+                params = {
+                    "label_id": info["id"], "seq": self._seq_name(info["seq_name"]),
+                    "starts": [s for _, s, _ in chunk], "ends": [d for _, _, d in chunk],
+                    "props": [json.dumps({"payload": items[i].get("payload") or {}}) for i, _, _ in chunk],
+                }
+                await self._insert_chunk(q, params, [i for i, _, _ in chunk], results)
+        return results
 
 
 
@@ -188,7 +749,7 @@ class PGAgeHelper:
             await cur.execute(q, (json.dumps(params_obj),))
             row = await cur.fetchone()
         if row:
-            return {"id": row[0], "label": row[1], "properties": row[2]}
+            return {"id": row["id"], "label": row["label"], "properties": row["properties"]}
         else:
             return {"id": node_id, "label": [], "properties": {} , "message": "Node not found"}
 
@@ -226,130 +787,132 @@ class PGAgeHelper:
 
 
 
-    async def get_node_neighborhood(self, node_id: int | str) -> list[dict]:
-        """Return the clicked node + all its direct neighbors (both directions) and connecting edges.
-        If the node has no edges, return other nodes sharing the same label instead."""
-        results: list[dict] = []
-        node_label_raw: str | None = None
-
-        # 1) Fetch the clicked node itself
-        node_cypher = """
-            MATCH (n) WHERE id(n) = toInteger($node_id)
-            RETURN id(n) AS id, labels(n) AS label, n.payload AS properties
-        """
-        node_q = (
-            sql.SQL("SELECT * FROM ag_catalog.cypher(")
-            + sql.Literal(self.graph)
-            + sql.SQL("::name, $cypher$\n") + sql.SQL(node_cypher)
-            + sql.SQL("\n$cypher$, %s::ag_catalog.agtype)\n")
-            + sql.SQL("AS (id ag_catalog.agtype, label ag_catalog.agtype, properties ag_catalog.agtype);")
-        )
-        params = json.dumps({"node_id": int(node_id)})
-        async with self._conn.cursor(row_factory=dict_row) as cur:
-            await cur.execute(node_q, (params,))
-            for r in await cur.fetchall():
-                results.append({
-                    "id": r["id"], "label": r["label"], "properties": r["properties"],
-                    "kind": "node", "src": None, "dst": None,
-                })
-                node_label_raw = r["label"]
-
-        if not results:
-            return results
-
-        # 2) Fetch outgoing neighbors + edges
-        out_cypher = """
-            MATCH (n)-[e]->(t) WHERE id(n) = toInteger($node_id)
-            RETURN id(t) AS tid, labels(t) AS tlabel, t.payload AS tprops,
-                   id(e) AS eid, type(e) AS elabel, properties(e) AS eprops,
-                   id(n) AS src, id(t) AS dst
-        """
-        out_q = (
-            sql.SQL("SELECT * FROM ag_catalog.cypher(")
-            + sql.Literal(self.graph)
-            + sql.SQL("::name, $cypher$\n") + sql.SQL(out_cypher)
-            + sql.SQL("\n$cypher$, %s::ag_catalog.agtype)\n")
-            + sql.SQL("AS (tid ag_catalog.agtype, tlabel ag_catalog.agtype, tprops ag_catalog.agtype, eid ag_catalog.agtype, elabel ag_catalog.agtype, eprops ag_catalog.agtype, src ag_catalog.agtype, dst ag_catalog.agtype);")
-        )
-        seen_nodes: set[str] = {str(node_id)}
+    async def _load_labels(self) -> None:
         async with self._conn.cursor(row_factory=dict_row) as cur:
-            await cur.execute(out_q, (params,))
-            for r in await cur.fetchall():
-                nid = str(r["tid"]).strip('"')
-                if nid not in seen_nodes:
-                    seen_nodes.add(nid)
-                    results.append({
-                        "id": r["tid"], "label": r["tlabel"], "properties": r["tprops"],
-                        "kind": "node", "src": None, "dst": None,
-                    })
-                results.append({
-                    "id": r["eid"], "label": r["elabel"], "properties": r["eprops"],
-                    "kind": "edge", "src": r["src"], "dst": r["dst"],
-                })
-
-        # 3) Fetch incoming neighbors + edges
-        in_cypher = """
-            MATCH (n)<-[e]-(s) WHERE id(n) = toInteger($node_id)
-            RETURN id(s) AS sid, labels(s) AS slabel, s.payload AS sprops,
-                   id(e) AS eid, type(e) AS elabel, properties(e) AS eprops,
-                   id(s) AS src, id(n) AS dst
-        """
-        in_q = (
-            sql.SQL("SELECT * FROM ag_catalog.cypher(")
-            + sql.Literal(self.graph)
-            + sql.SQL("::name, $cypher$\n") + sql.SQL(in_cypher)
-            + sql.SQL("\n$cypher$, %s::ag_catalog.agtype)\n")
-            + sql.SQL("AS (sid ag_catalog.agtype, slabel ag_catalog.agtype, sprops ag_catalog.agtype, eid ag_catalog.agtype, elabel ag_catalog.agtype, eprops ag_catalog.agtype, src ag_catalog.agtype, dst ag_catalog.agtype);")
+            await cur.execute("""
+                SELECT l.relation::oid AS oid, l.name, l.kind
+                FROM ag_catalog.ag_label l
+                JOIN ag_catalog.ag_graph g ON l.graph = g.graphid
+                WHERE g.name = %s;
+            """, (self.graph,))
+            rows = await cur.fetchall()
+        self._labels = {r["oid"]: r["name"] for r in rows}
+        self._vertex_labels = {r["name"] for r in rows if r["kind"] == "v"}
+
+    async def _label_names(self, oids) -> dict[int, str]:
+        """Map label-table oids (the tableoid of a vertex/edge row) to label names.
+        ag_label is read once per helper and again only when an unknown label shows up."""
+        if not self._labels or any(o not in self._labels for o in oids):
+            await self._load_labels()
+        return self._labels
+
+    async def _vertex_table(self, label: str) -> sql.Composable | None:
+        """The table holding vertices of `label`, or None if the graph has no such vertex label."""
+        if label not in self._vertex_labels:
+            await self._load_labels()
+        return sql.Identifier(self.graph, label) if label in self._vertex_labels else None
+
+    async def _record(self, row: dict) -> dict:
+        if row["label_oid"] not in self._labels:
+            await self._load_labels()
+        return _node_record(row, self._labels) if row["kind"] == "node" else _edge_record(row, self._labels)
+
+    async def _records(self, rows: list[dict]) -> list[dict]:
+        """Turn label-table rows (kind, id, label_oid, properties, src, dst) into viewer records
+        shaped like the Cypher results: node label '["Label"]', edge label '"TYPE"', ids as text."""
+        labels = await self._label_names({r["label_oid"] for r in rows})
+        return [_node_record(r, labels) if r["kind"] == "node" else _edge_record(r, labels) for r in rows]
+
+    async def get_node_neighborhood(self, node_id: int | str, fanout: int = NEIGHBORHOOD_FANOUT) -> list[dict]:
+        """Return the clicked node + its direct neighbors (both directions) and connecting edges.
+        If the node has no edges, return other nodes sharing the same label instead.
+
+        One SQL statement over the label tables: edges come from the start_id / end_id indexes,
+        at most `fanout` per direction, and the center node record carries
+        "truncated": {"out": bool, "in": bool} so the viewer can mark hub nodes."""
+        fanout = max(1, int(fanout))
+        q = sql.SQL("""
+            WITH center AS (
+                SELECT v.id FROM {vertex} v WHERE v.id = %(node_id)s::ag_catalog.graphid
+            ),
+            out_e AS MATERIALIZED (
+                SELECT e.id, e.tableoid, e.start_id, e.end_id, e.properties
+                FROM {edge} e WHERE e.start_id = %(node_id)s::ag_catalog.graphid
+                LIMIT %(probe)s
+            ),
+            in_e AS MATERIALIZED (
+                SELECT e.id, e.tableoid, e.start_id, e.end_id, e.properties
+                FROM {edge} e WHERE e.end_id = %(node_id)s::ag_catalog.graphid
+                LIMIT %(probe)s
+            ),
+            edges AS (
+                (SELECT * FROM out_e LIMIT %(fanout)s)
+                UNION ALL
+                (SELECT * FROM in_e LIMIT %(fanout)s)
+            ),
+            siblings AS (
+                -- Isolated node: same-label vertices, i.e. graphids sharing the 16-bit label prefix
+                SELECT v.id, v.tableoid, v.properties
+                FROM center c
+                JOIN {vertex} v
+                  ON v.id > ((((c.id::text::bigint) >> 48) << 48)::text)::ag_catalog.graphid
+                 AND v.id < (((((c.id::text::bigint) >> 48) + 1) << 48)::text)::ag_catalog.graphid
+                 AND v.id <> c.id
+                WHERE NOT EXISTS (SELECT 1 FROM out_e) AND NOT EXISTS (SELECT 1 FROM in_e)
+                LIMIT %(siblings)s
+            )
+            SELECT 'node' AS kind, v.id::text AS id, v.tableoid::oid AS label_oid,
+                   ((v.properties::text)::jsonb -> 'payload')::text AS properties,
+                   NULL::text AS src, NULL::text AS dst, NULL::bigint AS n_out, NULL::bigint AS n_in
+            FROM {vertex} v
+            WHERE v.id = ANY(ARRAY(
+                SELECT id FROM center
+                UNION SELECT end_id FROM edges
+                UNION SELECT start_id FROM edges
+            ))
+            UNION ALL
+            SELECT 'node', s.id::text, s.tableoid::oid, ((s.properties::text)::jsonb -> 'payload')::text,
+                   NULL, NULL, NULL, NULL
+            FROM siblings s
+            UNION ALL
+            SELECT 'edge', e.id::text, e.tableoid::oid, e.properties::text,
+                   e.start_id::text, e.end_id::text, NULL, NULL
+            FROM edges e
+            UNION ALL
+            SELECT 'meta', NULL, NULL, NULL, NULL, NULL,
+                   (SELECT count(*) FROM out_e), (SELECT count(*) FROM in_e);
+        """).format(
+            vertex=sql.Identifier(self.graph, "_ag_label_vertex"),
+            edge=sql.Identifier(self.graph, "_ag_label_edge"),
         )
+        params = {
+            "node_id": str(int(node_id)), "fanout": fanout, "probe": fanout + 1,
+            "siblings": NEIGHBORHOOD_SIBLINGS,
+        }
         async with self._conn.cursor(row_factory=dict_row) as cur:
-            await cur.execute(in_q, (params,))
-            for r in await cur.fetchall():
-                nid = str(r["sid"]).strip('"')
-                if nid not in seen_nodes:
-                    seen_nodes.add(nid)
-                    results.append({
-                        "id": r["sid"], "label": r["slabel"], "properties": r["sprops"],
-                        "kind": "node", "src": None, "dst": None,
-                    })
-                results.append({
-                    "id": r["eid"], "label": r["elabel"], "properties": r["eprops"],
-                    "kind": "edge", "src": r["src"], "dst": r["dst"],
-                })
-
-        # 4) Fallback: if no edges found, show other nodes with the same label
-        has_neighbors = len(results) > 1
-        if not has_neighbors and node_label_raw:
-            # Parse the label (AGE returns '["LabelName"]')
-            lbl = str(node_label_raw).strip('"')
-            try:
-                parsed = json.loads(lbl)
-                if isinstance(parsed, list) and parsed:
-                    lbl = str(parsed[0])
-            except (json.JSONDecodeError, TypeError):
-                lbl = re.sub(r'^[\["]+|[\]"]+$', '', lbl)
-
-            if re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', lbl):
-                sibling_cypher = f"""
-                    MATCH (m:{lbl})
-                    WHERE id(m) <> toInteger($node_id)
-                    RETURN id(m) AS id, labels(m) AS label, m.payload AS properties
-                    LIMIT 50
-                """
-                sib_q = (
-                    sql.SQL("SELECT * FROM ag_catalog.cypher(")
-                    + sql.Literal(self.graph)
-                    + sql.SQL("::name, $cypher$\n") + sql.SQL(sibling_cypher)
-                    + sql.SQL("\n$cypher$, %s::ag_catalog.agtype)\n")
-                    + sql.SQL("AS (id ag_catalog.agtype, label ag_catalog.agtype, properties ag_catalog.agtype);")
-                )
-                async with self._conn.cursor(row_factory=dict_row) as cur:
-                    await cur.execute(sib_q, (params,))
-                    for r in await cur.fetchall():
-                        results.append({
-                            "id": r["id"], "label": r["label"], "properties": r["properties"],
-                            "kind": "node", "src": None, "dst": None,
-                        })
+            await cur.execute(q, params)
+            rows = await cur.fetchall()
 
+        meta = next(r for r in rows if r["kind"] == "meta")
+        center = str(int(node_id))
+        seen_edges: set[str] = set()
+        kept: list[dict] = []
+        for r in rows:
+            if r["kind"] == "edge":
+                # A self-loop comes back once per direction
+                if r["id"] in seen_edges:
+                    continue
+                seen_edges.add(r["id"])
+            if r["kind"] != "meta":
+                kept.append(r)
+        rows = kept
+        if not any(r["kind"] == "node" and r["id"] == center for r in rows):
+            return []
+
+        # Center node first, as the viewer expects
+        rows.sort(key=lambda r: (r["kind"] != "node", r["id"] != center))
+        results = await self._records(rows)
+        results[0]["truncated"] = {"out": meta["n_out"] > fanout, "in": meta["n_in"] > fanout}
         return results
 
 
@@ -370,148 +933,488 @@ class PGAgeHelper:
             rows = await cur.fetchall()
         return rows
 
-    async def get_nodes_by_label(self, label: str, limit: int = 50) -> list[dict]:
-        """Return nodes of a specific label + edges between them."""
+    def _induced_subgraph_sql(self, vertex_table: sql.Composable, limit: int, after: str | None,
+                              skeleton: bool = False) -> tuple[sql.Composed, dict]:
+        """The first `limit` vertices of `vertex_table` (by graphid, after the `after` graphid when
+        paging) plus every edge between them (_with_induced_edges). Paging is keyset
+        (id > after), so deep pages cost the same as the first."""
+        nodes = sql.SQL("""
+                SELECT v.id, v.tableoid, v.properties
+                FROM {vertex} v
+                {keyset}
+                ORDER BY v.id
+                LIMIT %(limit)s
+        """).format(
+            vertex=vertex_table,
+            # Separate statement shapes so a prepared generic plan keeps id > $after as an index bound
+            keyset=sql.SQL("WHERE v.id > %(after)s::ag_catalog.graphid" if after else ""),
+        )
+        return self._with_induced_edges(nodes, skeleton), {"limit": max(0, int(limit)), "after": str(int(after)) if after else None}
+
+    def _with_induced_edges(self, nodes: sql.Composable, skeleton: bool = False) -> sql.Composed:
+        """Viewer rows for the vertices selected by `nodes` (id, tableoid, properties) plus every
+        edge between them. One statement: the selected ids are collected into an array and the
+        edge tables are probed with start_id = ANY(ids) AND end_id = ANY(ids), so both edge
+        indexes apply.
+
+        `skeleton` replaces node payloads with {"id", "name", "degree", "skeleton": true} and
+        drops edge properties; the full ones are fetched per element with get_elements. degree
+        is out + in edges, each direction counted up to SKELETON_DEGREE_CAP off the edge indexes."""
+        edge = sql.Identifier(self.graph, "_ag_label_edge")
+        if skeleton:
+            node_props = sql.SQL("""json_build_object(
+                       'id', p ->> 'id',
+                       'name', COALESCE(p ->> 'name', p ->> 'title', p ->> 'subject', p ->> 'id'),
+                       'degree', (SELECT count(*) FROM (SELECT 1 FROM {edge} x WHERE x.start_id = n.id LIMIT {cap}) o)
+                               + (SELECT count(*) FROM (SELECT 1 FROM {edge} x WHERE x.end_id = n.id LIMIT {cap}) i),
+                       'skeleton', true)::text""").format(edge=edge, cap=sql.Literal(SKELETON_DEGREE_CAP))
+            node_from = sql.SQL("nodes n, LATERAL (SELECT (n.properties::text)::jsonb -> 'payload' AS p) pl")
+            edge_props = sql.SQL("NULL::text")
+        else:
+            node_props = sql.SQL("((n.properties::text)::jsonb -> 'payload')::text")
+            node_from = sql.SQL("nodes n")
+            edge_props = sql.SQL("e.properties::text")
+        return sql.SQL("""
+            WITH nodes AS MATERIALIZED (
+                {nodes}
+            )
+            SELECT 'node' AS kind, n.id::text AS id, n.tableoid::oid AS label_oid,
+                   {node_props} AS properties,
+                   NULL::text AS src, NULL::text AS dst
+            FROM {node_from}
+            UNION ALL
+            SELECT 'edge', e.id::text, e.tableoid::oid, {edge_props},
+                   e.start_id::text, e.end_id::text
+            FROM {edge} e
+            WHERE e.start_id = ANY(ARRAY(SELECT id FROM nodes))
+              AND e.end_id = ANY(ARRAY(SELECT id FROM nodes));
+        """).format(nodes=nodes, edge=edge, node_props=node_props, node_from=node_from, edge_props=edge_props)
+
+    async def _label_sizes(self) -> list[dict]:
+        """Label tables (label_id, name, kind, relation, analyzed) with their row estimate in
+        `reltuples`: pg_class.reltuples, or for tables never analyzed (reltuples -1) the
+        statistics collector's live-tuple count. Read-only; the loaders ANALYZE the label tables."""
+        async with self._conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute("""
+                SELECT l.id AS label_id, l.name, l.kind, l.relation::oid AS relation,
+                       c.reltuples >= 0 AS analyzed,
+                       CASE WHEN c.reltuples >= 0 THEN c.reltuples
+                            ELSE pg_catalog.pg_stat_get_live_tuples(c.oid)::real END AS reltuples
+                FROM ag_catalog.ag_label l
+                JOIN ag_catalog.ag_graph g ON l.graph = g.graphid
+                JOIN pg_catalog.pg_class c ON c.oid = l.relation
+                WHERE g.name = %s AND l.name NOT LIKE '\\_ag\\_label%%';
+            """, (self.graph,))
+            labels = await cur.fetchall()
+        unanalyzed = sum(not r["analyzed"] for r in labels)
+        if unanalyzed and not self._warned_unanalyzed:
+            self._warned_unanalyzed = True
+            logger.warning(f"{unanalyzed} label tables in {self.graph} were never analyzed; "
+                           f"their sizes are live-tuple estimates (run the loader or ANALYZE them)")
+        return labels
+
+    async def _summary_stats(self) -> tuple[list[dict], dict[tuple[str, str], dict]]:
+        """_label_sizes() and the pg_stats rows of the edge tables' start_id / end_id columns
+        (edge tables without them fall back to _probe_endpoints)."""
+        labels = await self._label_sizes()
+        async with self._conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute("""
+                SELECT tablename, attname, null_frac, most_common_vals::text AS mcv,
+                       most_common_freqs AS mcf, histogram_bounds::text AS hist
+                FROM pg_catalog.pg_stats
+                WHERE schemaname = %s AND attname IN ('start_id', 'end_id');
+            """, (self.graph,))
+            stats = {(r["tablename"], r["attname"]): r for r in await cur.fetchall()}
+        return labels, stats
+
+    async def _probe_endpoints(self, edge_label: str) -> dict[tuple[int, int], float]:
+        """(src label id, dst label id) shares from the first SUMMARY_PROBE_ROWS rows of an edge table."""
+        async with self._conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(sql.SQL("""
+                SELECT e.start_id::text AS src, e.end_id::text AS dst FROM {edge} e LIMIT %s;
+            """).format(edge=sql.Identifier(self.graph, edge_label)), (SUMMARY_PROBE_ROWS,))
+            rows = await cur.fetchall()
+        pairs: dict[tuple[int, int], float] = {}
+        for r in rows:
+            key = (int(r["src"]) >> 48, int(r["dst"]) >> 48)
+            pairs[key] = pairs.get(key, 0.0) + 1.0 / len(rows)
+        return pairs
+
+    async def summary_graph(self, group_by: str = "auto", prefix: str = "",
+                            max_groups: int = SUMMARY_MAX_GROUPS, max_edges: int = SUMMARY_MAX_EDGES) -> list[dict]:
+        """Label-level summary as viewer records: one super-node per label (or label group) with
+        its vertex count, one super-edge per (src group, edge type, dst group) with an estimated
+        edge count and average out / in degree.
+
+        Everything comes from the catalogs: vertex and edge counts are _label_sizes() estimates, and an
+        edge type's split over source / destination labels comes from the pg_stats of its
+        start_id / end_id columns (a graphid's top 16 bits are its label id), assuming the two
+        ends independent. No label table is scanned.
+
+        group_by "label" keeps every label; "prefix" groups labels by the text before the first
+        '_'; "auto" (default) groups only when there are more than `max_groups` labels. With
+        `prefix`, labels starting with it are shown individually and all others by prefix, which
+        is how a group is drilled into. Groups beyond `max_groups` are merged into "Other".
+        Each record's properties carry "drill": the viewer request that lists its real elements."""
+        if group_by not in ("auto", "label", "prefix"):
+            raise ValueError("group_by must be 'auto', 'label', or 'prefix'")
+        labels, stats = await self._summary_stats()
+        vertices = [r for r in labels if r["kind"] == "v" and r["reltuples"] > 0]
+        edge_types = [r for r in labels if r["kind"] == "e" and r["reltuples"] > 0]
+
+        grouped = group_by == "prefix" or (group_by == "auto" and len(vertices) > max_groups)
+        def group_of(name: str) -> str:
+            if prefix:
+                return name if name.startswith(prefix) else _label_prefix(name)
+            return _label_prefix(name) if grouped else name
+
+        groups: dict[str, dict] = {}
+        for r in vertices:
+            g = groups.setdefault(group_of(r["name"]), {"count": 0, "labels": []})
+            g["count"] += int(r["reltuples"])
+            g["labels"].append(r["name"])
+        ranked = sorted(groups, key=lambda g: groups[g]["count"], reverse=True)
+        if len(ranked) > max_groups:
+            other = {"count": 0, "labels": []}
+            for g in ranked[max_groups - 1:]:
+                other["count"] += groups[g]["count"]
+                other["labels"] += groups.pop(g)["labels"]
+            groups["Other"] = other
+        group_by_label_id = {r["label_id"]: g for g, info in groups.items()
+                             for r in vertices if r["name"] in info["labels"]}
+
+        super_edges: dict[tuple[str, str, str], dict] = {}
+        for r in edge_types:
+            name, count = r["name"], float(r["reltuples"])
+            src_stats, dst_stats = stats.get((name, "start_id")), stats.get((name, "end_id"))
+            if src_stats and dst_stats:
+                src_shares, dst_shares = _label_shares(src_stats), _label_shares(dst_stats)
+                pairs = {(a, b): sa * sb for a, sa in src_shares.items() for b, sb in dst_shares.items()}
+            else:
+                pairs = await self._probe_endpoints(name)
+            for (a, b), share in pairs.items():
+                src, dst = group_by_label_id.get(a), group_by_label_id.get(b)
+                if src is None or dst is None or count * share < 0.5:
+                    continue
+                e = super_edges.setdefault((src, name, dst), {"count": 0.0})
+                e["count"] += count * share
+
+        top_edges = sorted(super_edges.items(), key=lambda kv: kv[1]["count"], reverse=True)[:max_edges]
+        node_ids = {g: f"summary:{g}" for g in groups}
+        records: list[dict] = []
+        for g, info in sorted(groups.items(), key=lambda kv: kv[1]["count"], reverse=True):
+            single = len(info["labels"]) == 1 and info["labels"][0] == g
+            drill = ({"endpoint": "nodes", "params": {"label": g}} if single
+                     else {"endpoint": "summary", "params": {"prefix": g, "group_by": "label"}})
+            props = {"name": g, "count": info["count"], "labels": info["labels"][:50],
+                     "label_count": len(info["labels"]), "drill": drill}
+            records.append({"id": node_ids[g], "label": json.dumps([g]), "properties": json.dumps(props),
+                            "kind": "node", "src": None, "dst": None})
+        for (src, edge_type, dst), info in top_edges:
+            count = round(info["count"])
+            drill = {"endpoint": "traverse", "params": {
+                "edge_label": edge_type,
+                **({"src_label": src} if groups[src]["labels"] == [src] else {}),
+                **({"dst_label": dst} if groups[dst]["labels"] == [dst] else {}),
+            }}
+            props = {"count": count, "estimated": True,
+                     "avg_out_degree": round(info["count"] / max(groups[src]["count"], 1), 3),
+                     "avg_in_degree": round(info["count"] / max(groups[dst]["count"], 1), 3),
+                     "drill": drill}
+            records.append({"id": f"summary:{src}-{edge_type}->{dst}", "label": json.dumps(edge_type),
+                            "properties": json.dumps(props), "kind": "edge",
+                            "src": node_ids[src], "dst": node_ids[dst]})
+        return records
+
+    async def _induced_subgraph(self, vertex_table: sql.Composable, limit: int, after: str | None = None,
+                                skeleton: bool = False) -> list[dict]:
+        q, params = self._induced_subgraph_sql(vertex_table, limit, after, skeleton)
+        async with self._conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(q, params)
+            rows = await cur.fetchall()
+        return await self._records(rows)
+
+    async def get_nodes_by_label(self, label: str, limit: int = 50, after: str | None = None,
+                                 skeleton: bool = False) -> list[dict]:
+        """Return nodes of a specific label (after graphid `after`) + the edges between them."""
         # Validate label to prevent injection
         if not re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', label):
             return []
-
-        # 1) Nodes
-        node_cypher = f"""
-            MATCH (n:{label})
-            RETURN id(n) AS id, labels(n) AS label, n.payload AS properties
-            ORDER BY id(n)
-            LIMIT toInteger($lim)
-        """
-        node_q = (
-            sql.SQL("SELECT * FROM ag_catalog.cypher(")
-            + sql.Literal(self.graph)
-            + sql.SQL("::name, $cypher$\n") + sql.SQL(node_cypher)
-            + sql.SQL("\n$cypher$, %s::ag_catalog.agtype)\n")
-            + sql.SQL("AS (id ag_catalog.agtype, label ag_catalog.agtype, properties ag_catalog.agtype);")
-        )
-        results: list[dict] = []
+        table = await self._vertex_table(label)
+        if table is None:
+            return []
+        return await self._induced_subgraph(table, limit, after, skeleton)
+
+    async def get_graph_overview(self, node_limit: int = 100, after: str | None = None,
+                                 skeleton: bool = False) -> list[dict]:
+        """Return the first `node_limit` nodes (any label, after graphid `after`) + the edges between them."""
+        return await self._induced_subgraph(sql.Identifier(self.graph, "_ag_label_vertex"), node_limit, after, skeleton)
+
+    async def sample_overview(self, node_limit: int = 100, label: str = "", method: str = "system",
+                              strategy: str = "proportional", seed: int = 0, skeleton: bool = False) -> list[dict]:
+        """A stratified random sample of about `node_limit` nodes + the edges between them.
+
+        Quotas per label (_sample_quotas, "proportional" or "capped") come from pg_class.reltuples,
+        and each label table is read with TABLESAMPLE SYSTEM (random pages) or BERNOULLI (random
+        rows, reads every page) at the percentage that yields SAMPLE_OVERSAMPLE x its quota,
+        REPEATABLE (seed): the same seed returns the same sample until the table changes. With
+        SYSTEM the cost depends on the sample size, not the graph size. `label` samples that
+        label only. A label's sample can come up short of its quota; the rest is not refilled."""
+        if method not in ("system", "bernoulli"):
+            raise ValueError("sample must be 'system' or 'bernoulli'")
+        if strategy not in ("proportional", "capped"):
+            raise ValueError("strategy must be 'proportional' or 'capped'")
+        if label:
+            _validate_label(label)
+        sizes = {r["name"]: r for r in await self._label_sizes()
+                 if r["kind"] == "v" and (not label or r["name"] == label)}
+        quotas = _sample_quotas({name: r["reltuples"] for name, r in sizes.items()}, node_limit, strategy)
+        if not quotas:
+            return []
+        parts, params = [], []
+        for name, quota in quotas.items():
+            rows = sizes[name]["reltuples"]
+            percent = 100.0 if rows <= 0 else min(100.0, 100.0 * quota * SAMPLE_OVERSAMPLE / rows)
+            parts.append(sql.SQL("""
+                (SELECT v.id, v.tableoid, v.properties
+                 FROM {vertex} v TABLESAMPLE {method} (%s::real) REPEATABLE (%s::float8)
+                 LIMIT %s)
+            """).format(vertex=sql.Identifier(self.graph, name), method=sql.SQL(method.upper())))
+            params += [percent, seed, quota]
+        q = self._with_induced_edges(sql.SQL(" UNION ALL ").join(parts), skeleton)
         async with self._conn.cursor(row_factory=dict_row) as cur:
-            await cur.execute(node_q, (json.dumps({"lim": int(limit)}),))
-            node_rows = await cur.fetchall()
-        node_ids = []
-        for r in node_rows:
-            results.append({
-                "id": r["id"], "label": r["label"], "properties": r["properties"],
-                "kind": "node", "src": None, "dst": None,
-            })
-            node_ids.append(r["id"])
-
-        # 2) Edges between these nodes
-        if node_ids:
-            edge_cypher = f"""
-                MATCH (n:{label})-[e]->(t:{label})
-                RETURN id(e) AS id, type(e) AS label, properties(e) AS properties,
-                       id(n) AS src, id(t) AS dst
-                LIMIT toInteger($lim)
-            """
-            edge_q = (
-                sql.SQL("SELECT * FROM ag_catalog.cypher(")
-                + sql.Literal(self.graph)
-                + sql.SQL("::name, $cypher$\n") + sql.SQL(edge_cypher)
-                + sql.SQL("\n$cypher$, %s::ag_catalog.agtype)\n")
-                + sql.SQL("AS (id ag_catalog.agtype, label ag_catalog.agtype, properties ag_catalog.agtype, src ag_catalog.agtype, dst ag_catalog.agtype);")
-            )
-            node_id_set = set(str(nid).strip('"') for nid in node_ids)
-            async with self._conn.cursor(row_factory=dict_row) as cur:
-                await cur.execute(edge_q, (json.dumps({"lim": int(limit) * 3}),))
-                for r in await cur.fetchall():
-                    s = str(r["src"]).strip('"')
-                    d = str(r["dst"]).strip('"')
-                    if s in node_id_set and d in node_id_set:
-                        results.append({
-                            "id": r["id"], "label": r["label"], "properties": r["properties"],
-                            "kind": "edge", "src": r["src"], "dst": r["dst"],
-                        })
-
-        return results
-
-
-    async def get_graph_overview(self, node_limit: int = 100) -> list[dict]:
-        """Return nodes + their connecting edges using two simple queries (AGE-safe)."""
-        # 1) Fetch nodes
-        node_cypher = """
-            MATCH (n)
-            RETURN id(n) AS id, labels(n) AS label, n.payload AS properties
-            ORDER BY id(n)
-            LIMIT toInteger($lim)
-        """
-        node_q = (
-            sql.SQL("SELECT * FROM ag_catalog.cypher(")
-            + sql.Literal(self.graph)
-            + sql.SQL("::name, $cypher$\n")
-            + sql.SQL(node_cypher)
-            + sql.SQL("\n$cypher$, %s::ag_catalog.agtype)\n")
-            + sql.SQL("AS (id ag_catalog.agtype, label ag_catalog.agtype, properties ag_catalog.agtype);")
+            await cur.execute(q, params)
+            rows = await cur.fetchall()
+        return await self._records(rows)
+
+    async def stream_nodes(self, label: str = "", limit: int = 100, after: str | None = None,
+                           skeleton: bool = False) -> AsyncIterator[dict]:
+        """Streaming get_nodes_by_label / get_graph_overview: records are yielded as rows come off
+        a server-side cursor (STREAM_BATCH_ROWS per round trip), nodes before the edges between them.
+        The cursor is read on a connection of its own (_stream_conn), so other calls on this helper
+        can run while the client reads."""
+        if label:
+            if not re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', label):
+                return
+            table = await self._vertex_table(label)
+            if table is None:
+                return
+        else:
+            table = sql.Identifier(self.graph, "_ag_label_vertex")
+        q, params = self._induced_subgraph_sql(table, limit, after, skeleton)
+        async with self._stream_conn() as conn:
+            async with conn.cursor(name=f"viewer_stream_{next(_STREAM_IDS)}", row_factory=dict_row) as cur:
+                cur.itersize = STREAM_BATCH_ROWS
+                await cur.execute(q, params)
+                async for r in cur:
+                    yield await self._record(r)
+
+    async def get_elements(self, ids: list[str | int]) -> list[dict]:
+        """Full viewer records (nodes, then edges) for the given vertex / edge graphids, in the
+        order asked; unknown ids are skipped. The property half of skeleton responses."""
+        if len(ids) > ELEMENTS_MAX_IDS:
+            raise ValueError(f"At most {ELEMENTS_MAX_IDS} ids per request")
+        try:
+            wanted = [str(int(i)) for i in ids]
+        except (TypeError, ValueError):
+            raise ValueError("ids must be graphids (integers)")
+        if not wanted:
+            return []
+        q = sql.SQL("""
+            SELECT 'node' AS kind, v.id::text AS id, v.tableoid::oid AS label_oid,
+                   ((v.properties::text)::jsonb -> 'payload')::text AS properties,
+                   NULL::text AS src, NULL::text AS dst
+            FROM {vertex} v
+            WHERE v.id = ANY(%(ids)s::ag_catalog.graphid[])
+            UNION ALL
+            SELECT 'edge', e.id::text, e.tableoid::oid, e.properties::text,
+                   e.start_id::text, e.end_id::text
+            FROM {edge} e
+            WHERE e.id = ANY(%(ids)s::ag_catalog.graphid[]);
+        """).format(
+            vertex=sql.Identifier(self.graph, "_ag_label_vertex"),
+            edge=sql.Identifier(self.graph, "_ag_label_edge"),
         )
         async with self._conn.cursor(row_factory=dict_row) as cur:
-            await cur.execute(node_q, (json.dumps({"lim": int(node_limit)}),))
-            node_rows = await cur.fetchall()
-
-        # Collect node IDs for edge filtering
-        node_ids = [r["id"] for r in node_rows]
-        results: list[dict] = []
-        for r in node_rows:
-            results.append({
-                "id": r["id"], "label": r["label"], "properties": r["properties"],
-                "kind": "node", "src": None, "dst": None,
-            })
-
-        if not node_ids:
-            return results
+            await cur.execute(q, {"ids": _graphid_array(wanted)})
+            rows = await cur.fetchall()
+        order = {gid: i for i, gid in enumerate(wanted)}
+        rows.sort(key=lambda r: (r["kind"] != "node", order.get(r["id"], 0)))
+        return await self._records(rows)
+
+
+    async def _label_oids(self, names: list[str] | None, kind: str) -> list[int] | None:
+        """oids of the vertex (kind 'v') or edge ('e') label tables named in `names`; None = no filter."""
+        if not names:
+            return None
+        for name in names:
+            _validate_label(name)
+        if not self._labels or any(n not in self._labels.values() for n in names):
+            await self._load_labels()
+        oids = {name: oid for oid, name in self._labels.items()}
+        unknown = [n for n in names if n not in oids or (kind == "v") != (n in self._vertex_labels)]
+        if unknown:
+            raise ValueError(f"Unknown {'node' if kind == 'v' else 'edge'} label(s): {', '.join(unknown)}")
+        return [oids[n] for n in names]
+
+    def _expand_hop_sql(self, direction: str, edge_filter: bool, label_filter: bool) -> sql.Composed:
+        vertex = sql.Identifier(self.graph, "_ag_label_vertex")
+        edge = sql.Identifier(self.graph, "_ag_label_edge")
+        etype = sql.SQL("AND e.tableoid = ANY(%(edge_oids)s::oid[])" if edge_filter else "")
+        vlabel = sql.SQL("AND v.tableoid = ANY(%(label_oids)s::oid[])" if label_filter else "")
+        outgoing = sql.SQL("""
+            (SELECT 'out' AS dir, e.end_id AS nbr FROM {edge} e
+             WHERE e.start_id = ANY(%(frontier)s::ag_catalog.graphid[]) {etype}
+             LIMIT %(edge_cap)s)""").format(edge=edge, etype=etype)
+        incoming = sql.SQL("""
+            (SELECT 'in' AS dir, e.start_id AS nbr FROM {edge} e
+             WHERE e.end_id = ANY(%(frontier)s::ag_catalog.graphid[]) {etype}
+             LIMIT %(edge_cap)s)""").format(edge=edge, etype=etype)
+        hop_edges = {
+            "out": outgoing, "in": incoming, "both": outgoing + sql.SQL("\n            UNION ALL") + incoming,
+        }[direction]
+        return sql.SQL("""
+            WITH hop_e AS MATERIALIZED ({hop_edges}
+            ),
+            -- Unseen neighbors passing the label filter; one past the budget tells truncation apart
+            cand AS MATERIALIZED (
+                SELECT v.id, v.tableoid, v.properties
+                FROM {vertex} v
+                WHERE v.id = ANY(ARRAY(SELECT DISTINCT nbr FROM hop_e))
+                  AND NOT (v.id = ANY(%(exclude)s::ag_catalog.graphid[]))
+                  {vlabel}
+                ORDER BY v.id
+                LIMIT %(budget)s + 1
+            ),
+            new_v AS MATERIALIZED (
+                SELECT id, tableoid, properties FROM cand ORDER BY id LIMIT %(budget)s
+            ),
+            fresh AS MATERIALIZED (
+                SELECT id, tableoid, properties FROM new_v
+                UNION ALL
+                SELECT v.id, v.tableoid, v.properties
+                FROM {vertex} v WHERE v.id = ANY(%(pending)s::ag_catalog.graphid[])
+            ),
+            known AS (
+                SELECT ARRAY(SELECT id FROM fresh) || %(visited)s::ag_catalog.graphid[] AS ids
+            )
+            SELECT 'node' AS kind, f.id::text AS id, f.tableoid::oid AS label_oid,
+                   ((f.properties::text)::jsonb -> 'payload')::text AS properties,
+                   NULL::text AS src, NULL::text AS dst, NULL::bigint AS n_edges, NULL::bigint AS n_candidates
+            FROM fresh f
+            UNION ALL
+            SELECT 'edge', e.id::text, e.tableoid::oid, e.properties::text,
+                   e.start_id::text, e.end_id::text, NULL, NULL
+            FROM {edge} e
+            WHERE ((e.start_id = ANY(ARRAY(SELECT id FROM fresh)) AND e.end_id = ANY((SELECT ids FROM known)))
+                OR (e.end_id = ANY(ARRAY(SELECT id FROM fresh)) AND e.start_id = ANY((SELECT ids FROM known))))
+              {etype}
+            UNION ALL
+            SELECT 'meta', NULL, NULL, NULL, NULL, NULL,
+                   (SELECT max(c) FROM (SELECT count(*) AS c FROM hop_e GROUP BY dir) d),
+                   (SELECT count(*) FROM cand);
+        """).format(hop_edges=hop_edges, vertex=vertex, edge=edge, etype=etype, vlabel=vlabel)
 
-        # 2) Fetch edges between the selected nodes
-        edge_cypher = """
-            MATCH (n)-[e]->(t)
-            WHERE id(n) = ANY($ids) AND id(t) = ANY($ids)
-            RETURN id(e) AS id, type(e) AS label, properties(e) AS properties,
-                   id(n) AS src, id(t) AS dst
-        """
-        # AGE doesn't support ANY() on an array param directly; use a simpler approach
-        # Fetch all edges from the limited nodes and filter in Python
-        edge_cypher2 = """
-            MATCH (n)-[e]->(t)
-            WHERE id(n) >= toInteger($min_id) AND id(n) <= toInteger($max_id)
-            RETURN id(e) AS id, type(e) AS label, properties(e) AS properties,
-                   id(n) AS src, id(t) AS dst
-        """
-        # Even simpler: just get edges from our node set
-        edge_cypher3 = """
-            MATCH (n)-[e]->(t)
-            RETURN id(e) AS id, type(e) AS label, properties(e) AS properties,
-                   id(n) AS src, id(t) AS dst
-            LIMIT toInteger($lim)
+    async def iter_expand(
+        self,
+        seeds: list[int | str],
+        *,
+        hops: int = 1,
+        direction: str = "both",
+        edge_types: list[str] | None = None,
+        labels: list[str] | None = None,
+        per_hop_limit: int = EXPAND_PER_HOP_LIMIT,
+        max_nodes: int = EXPAND_MAX_NODES,
+    ) -> AsyncIterator[dict]:
+        """Breadth-first k-hop expansion from `seeds`, one SQL statement per hop.
+
+        Each hop takes the whole frontier as a graphid array, admits at most `per_hop_limit`
+        unseen neighbors (optionally only of `labels`, reached over `edge_types`) while the total
+        stays within `max_nodes`, and returns the induced edges between the admitted nodes and
+        everything already returned. Stops early when the frontier is empty or the budget is spent.
+
+        Yields each hop's viewer records as soon as its statement returns (nodes carry "hop" and
+        come before the edges that reference them), then one {"kind": "meta", "hops": hops run,
+        "queries": statements run, "truncated": whether a budget or EXPAND_MAX_EDGES_PER_HOP cut
+        the expansion short}.
         """
-        edge_q = (
-            sql.SQL("SELECT * FROM ag_catalog.cypher(")
-            + sql.Literal(self.graph)
-            + sql.SQL("::name, $cypher$\n")
-            + sql.SQL(edge_cypher3)
-            + sql.SQL("\n$cypher$, %s::ag_catalog.agtype)\n")
-            + sql.SQL("AS (id ag_catalog.agtype, label ag_catalog.agtype, properties ag_catalog.agtype, src ag_catalog.agtype, dst ag_catalog.agtype);")
-        )
-        edge_limit = node_limit * 3
+        if direction not in ("out", "in", "both"):
+            raise ValueError("direction must be 'out', 'in', or 'both'")
+        seed_ids = list(dict.fromkeys(str(int(s)) for s in seeds))
+        hops = max(0, min(int(hops), EXPAND_MAX_HOPS))
+        max_nodes = max(1, int(max_nodes))
+        per_hop_limit = max(1, int(per_hop_limit))
+        edge_oids = await self._label_oids(edge_types, "e")
+        label_oids = await self._label_oids(labels, "v")
+        q = self._expand_hop_sql(direction, edge_oids is not None, label_oids is not None)
+
+        node_hop: dict[str, int] = {}
+        # The first statement returns the seeds (hop 0) and admits hop 1 in the same round trip
+        frontier = pending = seed_ids[:max_nodes]
+        truncated = len(seed_ids) > max_nodes
+        queries = hop = 0
+        while pending or (frontier and hop < hops):
+            expanding = bool(frontier) and hop < hops
+            budget = min(per_hop_limit, max_nodes - len(node_hop) - len(pending)) if expanding else 0
+            if expanding and budget <= 0 and not pending:
+                truncated = True
+                break
+            params = {
+                "frontier": _graphid_array(frontier if expanding else []),
+                "exclude": _graphid_array(list(node_hop) + pending),
+                "visited": _graphid_array(list(node_hop)),
+                "pending": _graphid_array(pending),
+                "budget": max(0, budget),
+                "edge_cap": EXPAND_MAX_EDGES_PER_HOP,
+                "edge_oids": edge_oids,
+                "label_oids": label_oids,
+            }
+            async with self._conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(q, params)
+                result = await cur.fetchall()
+            queries += 1
+
+            pending_set = set(pending)
+            admitted: list[str] = []
+            meta: dict = {}
+            for r in result:
+                if r["kind"] == "meta":
+                    meta = r
+                    continue
+                rec = await self._record(r)
+                if r["kind"] == "node":
+                    if r["id"] in pending_set:
+                        rec["hop"] = node_hop[r["id"]] = 0
+                    else:
+                        rec["hop"] = node_hop[r["id"]] = hop + 1
+                        admitted.append(r["id"])
+                yield rec
+            if expanding:
+                hop += 1
+                edge_capped = (meta["n_edges"] or 0) >= EXPAND_MAX_EDGES_PER_HOP
+                # n_candidates counts label-filtered candidates, at most budget + 1
+                budget_capped = (meta["n_candidates"] or 0) > budget
+                truncated = truncated or edge_capped or budget_capped
+            frontier, pending = admitted, []
+
+        yield {"kind": "meta", "hops": hop, "queries": queries, "truncated": truncated}
+
+    async def expand(self, seeds: list[int | str], **options) -> dict:
+        """iter_expand collected into {"elements", "hops", "queries", "truncated"}."""
+        elements: list[dict] = []
+        summary: dict = {}
+        async for rec in self.iter_expand(seeds, **options):
+            if rec["kind"] == "meta":
+                summary = {k: v for k, v in rec.items() if k != "kind"}
+            else:
+                elements.append(rec)
+        return {"elements": elements, **summary}
+
+    async def find_paths(self, source: dict, target: dict, **options) -> dict:
+        """Up to k shortest paths between two endpoints by bidirectional BFS over the edge
+        tables (see graph_paths.find_paths for the options and the result shape)."""
         async with self._conn.cursor(row_factory=dict_row) as cur:
-            await cur.execute(edge_q, (json.dumps({"lim": edge_limit}),))
-            edge_rows = await cur.fetchall()
-
-        # Filter to edges where both endpoints are in our node set
-        node_id_set = set(str(nid).strip('"') for nid in node_ids)
-        for r in edge_rows:
-            s = str(r["src"]).strip('"')
-            d = str(r["dst"]).strip('"')
-            if s in node_id_set and d in node_id_set:
-                results.append({
-                    "id": r["id"], "label": r["label"], "properties": r["properties"],
-                    "kind": "edge", "src": r["src"], "dst": r["dst"],
-                })
-
-        return results
+            return await graph_paths.find_paths(cur, self.graph, source, target, **options)
 
 
     async def get_all_nodes_and_edges(self, limit: int | None) -> list[dict]:
@@ -640,6 +1543,37 @@ class PGAgeHelper:
 
         
 
+    def _traverse_branch(self, dir_code: int, tables: dict, filters: dict, after_op: str | None) -> sql.Composed:
+        """One direction of query_by_types: edges of `edge` joined to their focal (s) and other (t)
+        vertex, read in edge-id order so LIMIT stops the scan early."""
+        focal_col, other_col = ("start_id", "end_id") if dir_code == 0 else ("end_id", "start_id")
+        where = [sql.SQL("TRUE")]
+        if "src_ids" in filters:
+            where.append(sql.SQL("e.{} = ANY(%(src_ids)s::ag_catalog.graphid[])").format(sql.Identifier(focal_col)))
+        elif "src_pid" in filters:
+            where.append(sql.SQL("((s.properties::text)::jsonb->'payload'->>'id') = %(src_pid)s"))
+        if "dst_ids" in filters:
+            where.append(sql.SQL("e.{} = ANY(%(dst_ids)s::ag_catalog.graphid[])").format(sql.Identifier(other_col)))
+        elif "dst_pid" in filters:
+            where.append(sql.SQL("((t.properties::text)::jsonb->'payload'->>'id') = %(dst_pid)s"))
+        if after_op:
+            where.append(sql.SQL("e.id " + after_op + " %(after)s::ag_catalog.graphid"))
+        return sql.SQL("""
+            (SELECT e.id AS eid, {dir} AS dir, e.tableoid AS e_oid, e.properties AS e_props,
+                    e.start_id, e.end_id,
+                    s.id AS sid, s.tableoid AS s_oid, s.properties AS s_props,
+                    t.id AS tid, t.tableoid AS t_oid, t.properties AS t_props
+             FROM {edge} e
+             JOIN {src} s ON s.id = e.{focal}
+             JOIN {dst} t ON t.id = e.{other}
+             WHERE {where}
+             ORDER BY e.id
+             LIMIT %(limit)s)""").format(
+            dir=sql.Literal(dir_code), edge=tables["edge"], src=tables["src"], dst=tables["dst"],
+            focal=sql.Identifier(focal_col), other=sql.Identifier(other_col),
+            where=sql.SQL(" AND ").join(where),
+        )
+
     async def query_by_types(
         self,
         *,
@@ -651,75 +1585,122 @@ class PGAgeHelper:
         dst_id: str | None = None,        # filter t.payload.id if provided
         return_edges: bool = False,
         limit: int | None = None,
-    ):
+        after: str | None = None,         # keyset position from a previous page's "next_after"
+        fields: list[str] | None = None,  # payload keys to return (plus "id"); None = whole payload
+    ) -> dict:
         """
-        Find related nodes by node/edge *types* (labels), optionally filtering by src/dst payload.id.
-
-        Returns rows as:
-          - [(t,)] when return_edges=False
-          - [(t, e)] when return_edges=True
-        Each value is ag_catalog.agtype (text).
+        Find related nodes by node/edge *types* (labels), optionally filtering by src/dst payload.id:
+        the pattern (s:src_label)-[e:edge_label]->(t:dst_label) ("in" reverses the arrow, "both"
+        matches either way, with s as the focal node).
+
+        One SQL statement over the label tables, driven by the edge table in edge-id order and
+        joined to s and t by graphid, so there is no cartesian product of the two vertex labels.
+        src_id / dst_id are resolved to graphids first (_resolve_payload_ids) when the label is
+        given, which turns the filter into a start_id / end_id index probe.
+
+        Returns {"rows": [{"source": {...}, "node": {...}, "edge": {...} | None}, ...],
+        "next_after": str | None} (earlier versions returned a list of (t,) or (t, e) rows);
+        node / edge dicts are viewer records and node properties hold only `fields` when given.
+        Pass next_after back as `after` for the next page.
+
+        `limit` is the page size: 1 to TRAVERSE_MAX_LIMIT (default 1000), which is also the
+        default when None. Anything outside that range raises ValueError instead of being
+        clamped; page with next_after for more rows.
         """
-        # 1) Validate identifiers
-        #_validate_label(src_label)
-        #_validate_label(edge_label)
-        #_validate_label(dst_label)
-
-        # 2) Build pattern bits
-        # direction
-        rel_dir = {"out": "->", "in": "<-", "both": "-"}.get(direction)
-        if rel_dir is None:
+        rel_dirs = {"out": (0,), "in": (1,), "both": (0, 1)}.get(direction)
+        if rel_dirs is None:
             raise ValueError("direction must be 'out', 'in', or 'both'")
-
-        # labels
-        src = f":{src_label}" if src_label else ""
-        dst = f":{dst_label}" if dst_label else ""
-        rel = f":{edge_label}" if edge_label else ""
-
-        # 3) Build WHERE filters (no braces in text)
-        where_clauses = ["TRUE"]
-        if src_id is not None:
-            where_clauses.append("s.payload.id = $src_id")
-        if dst_id is not None:
-            where_clauses.append("t.payload.id = $dst_id")
-        where_sql = " AND ".join(where_clauses)
-
-        # 4) SELECT/RETURN shape
-        if return_edges:
-            select_alias = "t ag_catalog.agtype, e ag_catalog.agtype"
-            return_clause = "RETURN t, e"
+        for lbl in (src_label, edge_label, dst_label):
+            if lbl is not None:
+                _validate_label(lbl)
+        limit = TRAVERSE_MAX_LIMIT if limit is None else int(limit)
+        if not 1 <= limit <= TRAVERSE_MAX_LIMIT:
+            raise ValueError(f"limit must be between 1 and {TRAVERSE_MAX_LIMIT}; page with the cursor for more")
+
+        # Unknown labels raise ValueError, like the other label filters
+        await self._label_oids([l for l in (src_label, dst_label) if l], "v")
+        await self._label_oids([edge_label] if edge_label else None, "e")
+        tables = {
+            "src": sql.Identifier(self.graph, src_label or "_ag_label_vertex"),
+            "dst": sql.Identifier(self.graph, dst_label or "_ag_label_vertex"),
+            "edge": sql.Identifier(self.graph, edge_label or "_ag_label_edge"),
+        }
+
+        params: dict = {"limit": limit, "fields": (["id", *fields] if fields else None)}
+        filters: dict = {}
+        for side, label, pid in (("src", src_label, src_id), ("dst", dst_label, dst_id)):
+            if pid is None:
+                continue
+            key = _payload_key(pid)
+            if label:
+                ids = (await self._resolve_payload_ids(label, {key})).get(key, [])
+                if not ids:
+                    return {"rows": [], "next_after": None}
+                filters[f"{side}_ids"] = params[f"{side}_ids"] = _graphid_array(ids)
+            else:
+                filters[f"{side}_pid"] = params[f"{side}_pid"] = key
+
+        # Keyset position: edge id and direction packed as 2 * id + dir ("both" returns an edge
+        # once per direction it matches in, like an undirected Cypher pattern)
+        after_id, after_dir = divmod(int(after), 2) if after is not None else (None, None)
+        branches = []
+        for dir_code in rel_dirs:
+            # (e.id, dir) > (after_id, after_dir), per branch where dir is a constant
+            op = None
+            if after_id is not None:
+                op = ">=" if dir_code > after_dir else ">"
+            branches.append(self._traverse_branch(dir_code, tables, filters, op))
+        if after_id is not None:
+            params["after"] = str(after_id)
+
+        if fields:
+            t_props = sql.SQL("""(SELECT jsonb_object_agg(f.key, f.value)
+                   FROM jsonb_each((p.{col}::text)::jsonb -> 'payload') f
+                   WHERE f.key = ANY(%(fields)s::text[]))::text""")
         else:
-            select_alias = "t ag_catalog.agtype"
-            return_clause = "RETURN t"
-
-        # 5) Optional LIMIT
-        limit_clause = f"LIMIT {int(limit)}" if isinstance(limit, int) and limit > 0 else ""
-
-        # 6) Cypher text (avoid {} to keep psycopg SQL.format happy)
-        cypher_text = f"""
-            MATCH (s{src}), (t{dst})
-            MATCH (s)-[e{rel}]{rel_dir}(t)
-            WHERE {where_sql}
-            {return_clause}
-            {limit_clause}
-        """
-
-        # 7) Compose SQL: graph literal, params as single agtype
+            t_props = sql.SQL("((p.{col}::text)::jsonb -> 'payload')::text")
         q = sql.SQL("""
-            SELECT *
-            FROM ag_catalog.cypher({}::name, $cypher$
-            {cypher}
-            $cypher$, %s::ag_catalog.agtype) AS ({select_alias});
-        """.replace("{cypher}", cypher_text).replace("{select_alias}", select_alias)).format(
-            sql.Literal(self.graph)
+            SELECT p.eid::text AS eid, p.dir, p.e_oid::oid AS e_oid,
+                   {e_props} AS e_props, p.start_id::text AS e_src, p.end_id::text AS e_dst,
+                   p.sid::text AS sid, p.s_oid::oid AS s_oid, {s_props} AS s_props,
+                   p.tid::text AS tid, p.t_oid::oid AS t_oid, {t_props} AS t_props
+            FROM ({branches}) p
+            ORDER BY p.eid, p.dir
+            LIMIT %(limit)s;
+        """).format(
+            branches=sql.SQL(" UNION ALL ").join(branches),
+            e_props=sql.SQL("p.e_props::text" if return_edges else "NULL::text"),
+            s_props=t_props.format(col=sql.Identifier("s_props")),
+            t_props=t_props.format(col=sql.Identifier("t_props")),
         )
-
-        params_obj = {"src_id": src_id, "dst_id": dst_id}
-
-        async with self._conn.cursor() as cur:
-            await cur.execute(q, (json.dumps(params_obj),))
-            rows = await cur.fetchall()
-        return rows
+        async with self._conn.cursor(row_factory=dict_row) as cur:
+            await cur.execute(q, params)
+            raw = await cur.fetchall()
+
+        labels = await self._label_names({r[k] for r in raw for k in ("s_oid", "t_oid", "e_oid")})
+        rows = []
+        for r in raw:
+            rows.append({
+                "source": _node_record({"id": r["sid"], "label_oid": r["s_oid"], "properties": r["s_props"]}, labels),
+                "node": _node_record({"id": r["tid"], "label_oid": r["t_oid"], "properties": r["t_props"]}, labels),
+                "edge": _edge_record({"id": r["eid"], "label_oid": r["e_oid"], "properties": r["e_props"],
+                                      "src": r["e_src"], "dst": r["e_dst"]}, labels) if return_edges else None,
+            })
+        next_after = str(int(raw[-1]["eid"]) * 2 + raw[-1]["dir"]) if len(raw) >= limit else None
+        return {"rows": rows, "next_after": next_after}
+
+    async def traverse(self, **options) -> tuple[list[dict], str | None]:
+        """query_by_types as viewer records: distinct source / target nodes, then the matched
+        edges (with return_edges). Returns (records, next_after)."""
+        result = await self.query_by_types(**options)
+        nodes: dict[str, dict] = {}
+        edges: list[dict] = []
+        for row in result["rows"]:
+            nodes.setdefault(row["source"]["id"], row["source"])
+            nodes.setdefault(row["node"]["id"], row["node"])
+            if row["edge"] is not None:
+                edges.append(row["edge"])
+        return [*nodes.values(), *edges], result["next_after"]
 
     # Convenience wrappers
     async def query_out_by_types(
@@ -731,6 +1712,8 @@ class PGAgeHelper:
         src_id: str | None = None,
         return_edges: bool = False,
         limit: int | None = None,
+        after: str | None = None,
+        fields: list[str] | None = None,
     ):
         return await self.query_by_types(
             direction="out",
@@ -741,6 +1724,8 @@ class PGAgeHelper:
             dst_id=None,
             return_edges=return_edges,
             limit=limit,
+            after=after,
+            fields=fields,
         )
 
     async def query_in_by_types(
@@ -752,6 +1737,8 @@ class PGAgeHelper:
         dst_id: str | None = None,
         return_edges: bool = False,
         limit: int | None = None,
+        after: str | None = None,
+        fields: list[str] | None = None,
     ):
         return await self.query_by_types(
             direction="in",
@@ -762,6 +1749,8 @@ class PGAgeHelper:
             dst_id=None,
             return_edges=return_edges,
             limit=limit,
+            after=after,
+            fields=fields,
         )
 
     async def query_both_by_types(
@@ -773,6 +1762,8 @@ class PGAgeHelper:
         node_id: str | None = None,
         return_edges: bool = False,
         limit: int | None = None,
+        after: str | None = None,
+        fields: list[str] | None = None,
     ):
         return await self.query_by_types(
             direction="both",
@@ -783,6 +1774,8 @@ class PGAgeHelper:
             dst_id=None,
             return_edges=return_edges,
             limit=limit,
+            after=after,
+            fields=fields,
         )
     
     async def health_check(self) -> bool:
@@ -827,7 +1820,7 @@ async def main():
         return_edges=False,
         limit=50,
     )
-    targets = [r[0] for r in rows]
+    targets = [r["node"] for r in rows["rows"]]
     print("Targets:", targets)
 
     # 2) All edges of type CONNECTS from a specific source node (identified by payload.id):
@@ -839,9 +1832,9 @@ async def main():
         return_edges=True,       # include edge
         limit=25,
     )
-    for t, e in rows:
-        print("To:", t)
-        print("Edge:", e)
+    for r in rows["rows"]:
+        print("To:", r["node"])
+        print("Edge:", r["edge"])
 
     # 3) Undirected neighbors by *types* (both directions), optional node_id:
     rows = await helper.query_both_by_types(
@@ -852,7 +1845,7 @@ async def main():
         return_edges=False,
         limit=100,
     )
-    print("Neighbors:", [r[0] for r in rows])
+    print("Neighbors:", [r["node"] for r in rows["rows"]])
 
     await helper.close()
 
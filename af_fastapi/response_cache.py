@@ -0,0 +1,131 @@
+# response_cache.py
+"""
+In-process LRU cache for graph viewer GET responses, with strong ETags.
+
+Entries are keyed by (graph, graph version, endpoint, params, representation), where the
+version comes from public.graph_versions and is bumped by every write (PGAgeHelper.insert_node /
+create_edge_by_ids and the loaders). A write therefore never needs to invalidate anything: the
+next request reads the new version and misses, and the stale entries age out of the LRU.
+
+The ETag is derived from the same key, so `If-None-Match` can be answered with 304 from the
+version alone, without running the viewer query or holding the body in the cache.
+"""
+
+import os, hashlib, json
+from collections import OrderedDict
+from typing import Any
+
+from metrics import RESPONSE_CACHE, RESPONSE_CACHE_BYTES_SAVED, RESPONSE_CACHE_SIZE
+
+# Cached viewer responses are bounded by total body bytes and by entry count
+GRAPH_CACHE_MAX_BYTES = int(os.getenv("GRAPH_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+GRAPH_CACHE_MAX_ENTRIES = int(os.getenv("GRAPH_CACHE_MAX_ENTRIES", "2000"))
+# Larger bodies are served but not cached (one huge listing would evict everything else)
+GRAPH_CACHE_MAX_ENTRY_BYTES = int(os.getenv("GRAPH_CACHE_MAX_ENTRY_BYTES", str(4 * 1024 * 1024)))
+
+
+class CachedResponse:
+    __slots__ = ("body", "media_type", "headers")
+
+    def __init__(self, body: bytes, media_type: str, headers: dict[str, str]):
+        self.body = body
+        self.media_type = media_type
+        self.headers = headers
+
+
+class ResponseCache:
+    def __init__(self, max_bytes: int = GRAPH_CACHE_MAX_BYTES, max_entries: int = GRAPH_CACHE_MAX_ENTRIES,
+                 max_entry_bytes: int = GRAPH_CACHE_MAX_ENTRY_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_entry_bytes = max_entry_bytes
+        self._entries: OrderedDict[str, CachedResponse] = OrderedDict()
+        self._bytes = 0
+
+    @staticmethod
+    def key(graph: str, version: int, endpoint: str, params: dict[str, Any], representation: str) -> str:
+        raw = json.dumps([graph, version, endpoint, params, representation], sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def etag(version: int, key: str) -> str:
+        return f'"v{version}-{key[:24]}"'
+
+    def get(self, key: str) -> CachedResponse | None:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def peek(self, key: str) -> CachedResponse | None:
+        return self._entries.get(key)
+
+    def put(self, key: str, entry: CachedResponse) -> None:
+        if len(entry.body) > self.max_entry_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= len(old.body)
+        self._entries[key] = entry
+        self._bytes += len(entry.body)
+        while self._entries and (self._bytes > self.max_bytes or len(self._entries) > self.max_entries):
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= len(evicted.body)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    @property
+    def size_bytes(self) -> int:
+        return self._bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """RFC 9110 If-None-Match: weak comparison against a list of entity tags, or "*"."""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or tag.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def record(endpoint: str, result: str, body_bytes: int = 0) -> None:
+    """Count a lookup (hit / miss / not_modified / bypass) and the response bytes it avoided."""
+    RESPONSE_CACHE.labels(endpoint, result).inc()
+    if body_bytes:
+        RESPONSE_CACHE_BYTES_SAVED.labels(endpoint, "not_sent" if result == "not_modified" else "not_rendered").inc(body_bytes)
+
+
+def stats() -> dict[str, Any]:
+    """Hit ratio and bytes saved per endpoint, summed from the Prometheus counters."""
+    per_endpoint: dict[str, dict[str, float]] = {}
+    for metric in RESPONSE_CACHE.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_total"):
+                ep = per_endpoint.setdefault(sample.labels["endpoint"], {})
+                ep[sample.labels["result"]] = sample.value
+    for metric in RESPONSE_CACHE_BYTES_SAVED.collect():
+        for sample in metric.samples:
+            if sample.name.endswith("_total"):
+                ep = per_endpoint.setdefault(sample.labels["endpoint"], {})
+                ep[f"bytes_{sample.labels['kind']}"] = sample.value
+    for ep in per_endpoint.values():
+        served = ep.get("hit", 0) + ep.get("not_modified", 0)
+        lookups = served + ep.get("miss", 0)
+        ep["hit_ratio"] = round(served / lookups, 4) if lookups else 0.0
+    return {
+        "entries": len(CACHE), "bytes": CACHE.size_bytes,
+        "max_entries": CACHE.max_entries, "max_bytes": CACHE.max_bytes,
+        "endpoints": per_endpoint,
+    }
+
+
+CACHE = ResponseCache()
+RESPONSE_CACHE_SIZE.labels("entries").set_function(lambda: len(CACHE))
+RESPONSE_CACHE_SIZE.labels("bytes").set_function(lambda: CACHE.size_bytes)
@@ -1,7 +1,13 @@
-import asyncio, json, os, logging
+import asyncio, json, os, logging, time
+from collections import deque
 from typing import Dict, Optional
 import redis.asyncio as aioredis
 
+from metrics import (
+    REDIS_PUBLISH_LATENCY, SSE_MESSAGES, SSE_QUEUE_DEPTH, SSE_QUEUE_EVENTS, SSE_RECEIVED, SSE_REPLAY_LATENCY,
+    SSE_PUBLISH_BATCH, SSE_REPLAYED, SSE_SESSIONS, SSE_SLOW_DISCONNECTS,
+)
+
 logger = logging.getLogger("uvicorn.error")
 
 JSONRPC = "2.0"
@@ -27,103 +33,443 @@ async def _get_redis() -> aioredis.Redis:
     return _redis_pool
 
 
+_CHANNEL_PREFIX = "sse:"
+# Pattern the process-wide subscriber listens on (every session channel)
+SSE_CHANNEL_PATTERN = _CHANNEL_PREFIX + "*"
+# Per-session Redis Stream kept for Last-Event-ID replay: approximate max entries, and seconds
+# it outlives the session's last event
+SSE_STREAM_MAXLEN = int(os.getenv("SSE_STREAM_MAXLEN", "1000"))
+SSE_STREAM_TTL = int(os.getenv("SSE_STREAM_TTL_SECONDS", "3600"))
+# Most events one reconnecting /events request replays
+SSE_REPLAY_MAX = int(os.getenv("SSE_REPLAY_MAX", "500"))
+# Local per-session queue bound, and seconds a session may stay full before it is disconnected
+# (its browser reconnects and catches up through the Last-Event-ID replay)
+SSE_QUEUE_MAX = int(os.getenv("SSE_QUEUE_MAX", "256"))
+SSE_QUEUE_FULL_SECONDS = float(os.getenv("SSE_QUEUE_FULL_SECONDS", "30"))
+
+# Overflow policy per event type: "coalesce" keeps the latest per progress token, "drop_oldest"
+# evicts the oldest such event (reported by a "N events dropped" mcplog), "keep" is never dropped.
+# Only elicitations are kept: assistant events come with every MCP message and would let a
+# stalled tab's queue grow until the slow-consumer disconnect
+SSE_OVERFLOW_POLICY = {"progress": "coalesce", "mcplog": "drop_oldest", "elicitation": "keep", "assistant": "drop_oldest"}
+
+
 def _channel_name(session_id: str) -> str:
-    return f"sse:{session_id}"
+    return f"{_CHANNEL_PREFIX}{session_id}"
 
 
-# ── Session: local queue fed by a Redis subscription ─────────────────────────
-class Session:
+def _stream_key(session_id: str) -> str:
+    return f"sse-stream:{session_id}"
+
+
+# One XADD (trimmed) per frame, one EXPIRE and one PUBLISH of [[entry id, frame], ...] for a
+# batch of a session's frames (ARGV[4..]), in one round trip; returns the entry ids
+_PUBLISH_LUA = """
+local out, ids = {}, {}
+for i = 4, #ARGV do
+  local id = redis.call('XADD', KEYS[1], 'MAXLEN', '~', ARGV[1], '*', 'f', ARGV[i])
+  ids[#ids + 1] = id
+  out[#out + 1] = {id, ARGV[i]}
+end
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+redis.call('PUBLISH', ARGV[3], cjson.encode(out))
+return ids
+"""
+_publish_script = None
+
+# Publish micro-batching: a session's events are held up to this many ms, or until this many
+# are pending, and sent in one round trip (0 = publish every event immediately)
+SSE_BATCH_WINDOW_MS = float(os.getenv("SSE_BATCH_WINDOW_MS", "5"))
+SSE_BATCH_MAX = int(os.getenv("SSE_BATCH_MAX", "32"))
+
+
+def event_id_key(event_id: str) -> tuple[int, int]:
+    """Stream entry id '1700000000000-3' -> (ms, seq), for ordering; malformed ids sort first."""
+    ms, _, seq = (event_id or "").partition("-")
+    try:
+        return int(ms), int(seq or 0)
+    except ValueError:
+        return (-1, -1)
+
+
+def with_event_id(event_id: str, frame: str) -> str:
+    """Prefix an sse_event() frame with its SSE id: field (the Redis Stream entry id)."""
+    return f"id: {event_id}\n{frame}"
+
+
+# ── Subscriber: one Redis connection per process for every local session ─────
+class _Subscriber:
     """
-    Each SSE listener creates a Session. It subscribes to the Redis channel
-    for the given session_id and relays messages into a local asyncio.Queue
-    so the StreamingResponse generator can yield them.
+    Process-wide PSUBSCRIBE sse:* on one dedicated Redis connection: the live path of
+    the bus (the per-session stream is only read to replay after a reconnect). Each message is
+    handed to the local session for its channel with a dict lookup; messages for
+    sessions connected to other pods are dropped here. Sessions come and go without
+    any Redis command, and a browser tab no longer holds a pool connection.
+    Every pod receives every session's messages: the cost is one delivery per pod,
+    which is cheaper than a SUBSCRIBE per tab until pods number in the dozens.
     """
-    def __init__(self, session_id: str) -> None:
-        self.session_id = session_id
-        self.q: asyncio.Queue[str] = asyncio.Queue()
-        self.closed = False
-        self._pubsub: Optional[aioredis.client.PubSub] = None
-        self._listener_task: Optional[asyncio.Task] = None
+    def __init__(self, manager: "SessionManager") -> None:
+        self._manager = manager
+        self._task: Optional[asyncio.Task] = None
+        self._ready: Optional[asyncio.Event] = None
+
+    async def ensure_started(self) -> None:
+        """Start the listener on first use and wait until the pattern subscription is active."""
+        if self._task is None or self._task.done():
+            self._ready = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+        await self._ready.wait()
+
+    async def _run(self) -> None:
+        backoff = 0.5
+        while True:
+            pubsub = None
+            try:
+                pubsub = (await _get_redis()).pubsub(ignore_subscribe_messages=True)
+                await pubsub.psubscribe(SSE_CHANNEL_PATTERN)
+                self._ready.set()
+                backoff = 0.5
+                async for raw_msg in pubsub.listen():
+                    if raw_msg["type"] == "pmessage":
+                        session_id = raw_msg["channel"][len(_CHANNEL_PREFIX):]
+                        for event_id, frame in json.loads(raw_msg["data"]):
+                            self._manager.dispatch(session_id, event_id, frame)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Redis subscriber error, reconnecting in {backoff:.1f}s: {e}")
+                self._ready.set()  # don't hold /events open while Redis is down
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 10.0)
+            finally:
+                if pubsub is not None:
+                    try:
+                        await pubsub.aclose()
+                    except Exception:
+                        pass
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def _event_name(frame: str) -> str:
+    # sse_event() frames start with "event: <name>\n"
+    return frame[7:frame.find("\n")] if frame.startswith("event: ") else "message"
+
+
+def _progress_token(frame: str) -> str | None:
+    try:
+        return str(json.loads(frame.split("data: ", 1)[1])["params"]["progressToken"])
+    except (IndexError, KeyError, TypeError, ValueError):
+        return None
 
-    async def start_listening(self) -> None:
-        """Subscribe to the Redis channel and pump messages into self.q."""
-        r = await _get_redis()
-        self._pubsub = r.pubsub()
-        await self._pubsub.subscribe(_channel_name(self.session_id))
-        self._listener_task = asyncio.create_task(self._listen_loop())
 
-    async def _listen_loop(self) -> None:
+# ── EventQueue: bounded session queue with per-event-type overflow ───────────
+class EventQueue:
+    """
+    Bounded FIFO of (event id, frame) for one session (SSE_QUEUE_MAX). Overflow follows
+    SSE_OVERFLOW_POLICY: a progress event replaces the queued one for its token (moved to
+    the back, so ids stay in order), a full queue evicts its oldest drop_oldest event,
+    then its oldest progress, to make room; "keep" events are queued even when nothing can
+    be evicted. Dropped events are reported by one mcplog marker before the next event.
+    `full_since` is when the queue last became full (None while it has room).
+    """
+    def __init__(self, maxsize: int = SSE_QUEUE_MAX) -> None:
+        self.maxsize = maxsize
+        self._items: deque[list] = deque()   # [event id, frame, event name, progress token, alive]
+        self._size = 0
+        self._progress: Dict[str, list] = {}
+        self._dropped = 0
+        self._ready = asyncio.Event()
+        self.full_since: Optional[float] = None
+
+    def qsize(self) -> int:
+        return self._size
+
+    def put_nowait(self, item: tuple[str, str]) -> None:
+        event_id, frame = item
+        name = _event_name(frame)
+        policy = SSE_OVERFLOW_POLICY.get(name, "drop_oldest")
+        token = _progress_token(frame) if policy == "coalesce" else None
+        entry = [event_id, frame, name, token, True]
+        if token is not None:
+            old = self._progress.get(token)
+            if old is not None and old[4]:
+                old[4] = False
+                self._size -= 1
+                SSE_QUEUE_EVENTS.labels(name, "coalesced").inc()
+        if self._size >= self.maxsize and not self._evict() and policy != "keep":
+            self._dropped += 1
+            SSE_QUEUE_EVENTS.labels(name, "dropped").inc()
+            return
+        self._items.append(entry)
+        self._size += 1
+        if token is not None:
+            # Only a queued entry may be coalesced later: a dropped one was never counted
+            self._progress[token] = entry
+        if len(self._items) > 2 * max(self.maxsize, self._size):
+            # Coalesced / evicted entries are skipped lazily; compact when they pile up
+            self._items = deque(e for e in self._items if e[4])
+        if self._size >= self.maxsize and self.full_since is None:
+            self.full_since = time.monotonic()
+        self._ready.set()
+
+    def _evict(self) -> bool:
+        """Drop the oldest drop_oldest event, else the oldest progress; False if there is none."""
+        for wanted in ("drop_oldest", "coalesce"):
+            for entry in self._items:
+                if entry[4] and SSE_OVERFLOW_POLICY.get(entry[2], "drop_oldest") == wanted:
+                    entry[4] = False
+                    self._size -= 1
+                    self._dropped += 1
+                    SSE_QUEUE_EVENTS.labels(entry[2], "dropped").inc()
+                    return True
+        return False
+
+    async def get(self) -> tuple[str, str]:
+        """Next (event id, frame); a pending drop marker comes first, with an empty id."""
+        while True:
+            if self._dropped:
+                marker = sse_event({
+                    "jsonrpc": JSONRPC,
+                    "method": "notifications/mcplog",
+                    "params": {"level": "warn", "text": f"{self._dropped} events dropped (slow connection)"},
+                }, event="mcplog")
+                self._dropped = 0
+                return "", marker
+            while self._items and not self._items[0][4]:
+                self._items.popleft()
+            if self._items:
+                event_id, frame, _, token, _ = self._items.popleft()
+                self._size -= 1
+                if self._size < self.maxsize:
+                    self.full_since = None
+                if token is not None:
+                    self._progress.pop(token, None)
+                return event_id, frame
+            self._ready.clear()
+            await self._ready.wait()
+
+    def clear(self) -> None:
+        self._items.clear()
+        self._progress.clear()
+        self._size = self._dropped = 0
+        self.full_since = None
+
+
+# ── Batcher: micro-batched publishing per session ────────────────────────────
+class _Batcher:
+    """
+    Buffers each session's outgoing frames for SSE_BATCH_WINDOW_MS (or until SSE_BATCH_MAX
+    are pending) and sends them with one publish script call: one round trip and one PUBLISH
+    per batch instead of per event. A session's batches are sent one after another, so
+    events keep their order; flush() waits for everything enqueued so far.
+    """
+    def __init__(self, manager: "SessionManager") -> None:
+        self._manager = manager
+        self._pending: Dict[str, list[str]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    async def enqueue(self, session_id: str, frame: str) -> None:
+        if SSE_BATCH_WINDOW_MS <= 0:
+            await self._manager.publish(session_id, frame)
+            return
+        pending = self._pending.setdefault(session_id, [])
+        pending.append(frame)
+        if len(pending) >= SSE_BATCH_MAX:
+            self._start(session_id)
+        elif session_id not in self._timers:
+            self._timers[session_id] = asyncio.get_running_loop().call_later(
+                SSE_BATCH_WINDOW_MS / 1000, self._start, session_id)
+
+    def _start(self, session_id: str) -> Optional[asyncio.Task]:
+        """Send the session's pending frames after its in-flight batch; returns the last send task."""
+        timer = self._timers.pop(session_id, None)
+        if timer is not None:
+            timer.cancel()
+        frames = self._pending.pop(session_id, None)
+        previous = self._inflight.get(session_id)
+        if not frames:
+            return previous
+        task = asyncio.get_running_loop().create_task(self._send(session_id, frames, previous))
+        self._inflight[session_id] = task
+        task.add_done_callback(lambda t: self._inflight.pop(session_id, None) if self._inflight.get(session_id) is t else None)
+        return task
+
+    async def _send(self, session_id: str, frames: list[str], previous: Optional[asyncio.Task]) -> None:
+        if previous is not None:
+            await asyncio.wait([previous])
         try:
-            async for raw_msg in self._pubsub.listen():
-                if self.closed:
-                    break
-                if raw_msg["type"] == "message":
-                    await self.q.put(raw_msg["data"])
-        except asyncio.CancelledError:
-            pass
+            await self._manager.publish_many(session_id, frames)
         except Exception as e:
-            logger.warning(f"Redis listener error for session {self.session_id}: {e}")
+            logger.warning(f"SSE publish of {len(frames)} events for session {session_id} failed: {e}")
+
+    async def flush(self, session_id: Optional[str] = None) -> None:
+        """Send pending frames now (one session, or all) and wait until they are published."""
+        sessions = [session_id] if session_id is not None else list(self._pending)
+        for sid in sessions:
+            self._start(sid)
+        tasks = [t for sid, t in list(self._inflight.items()) if session_id is None or sid == session_id]
+        if tasks:
+            await asyncio.wait(tasks)
+
+
+# ── Session: local queue fed by the process-wide subscriber ──────────────────
+class Session:
+    """
+    Each SSE session_id connected to this process has one Session: the subscriber
+    puts its (event id, frame) messages into a bounded EventQueue so the
+    StreamingResponse generator can yield them. `listeners` counts the /events
+    connections using it.
+    """
+    def __init__(self, session_id: str) -> None:
+        self.session_id = session_id
+        self.q = EventQueue()
+        self.closed = False
+        self.listeners = 0
 
     async def close(self) -> None:
         self.closed = True
-        if self._listener_task:
-            self._listener_task.cancel()
-            try:
-                await self._listener_task
-            except asyncio.CancelledError:
-                pass
-            self._listener_task = None
-        if self._pubsub:
-            await self._pubsub.unsubscribe(_channel_name(self.session_id))
-            await self._pubsub.aclose()
-            self._pubsub = None
+        self.q.clear()
 
 
-# ── SessionManager: publish goes to Redis, subscribe is per-listener ─────────
+# ── SessionManager: publish goes to Redis, delivery through the subscriber ───
 class SessionManager:
     def __init__(self) -> None:
         self._sessions: Dict[str, Session] = {}
-        self._lock = asyncio.Lock()
+        self._subscriber = _Subscriber(self)
+        self._batcher = _Batcher(self)
 
     async def get_or_create(self, session_id: str) -> Session:
-        """Get an existing local session or create one with a Redis subscription."""
-        async with self._lock:
-            s = self._sessions.get(session_id)
-            if s is None or s.closed:
-                s = Session(session_id)
-                await s.start_listening()
-                self._sessions[session_id] = s
-            return s
-
-    async def publish(self, session_id: str, msg: str) -> None:
-        """Publish to Redis — all nodes subscribed to this session_id receive it."""
+        """Get or register the local session for an /events connection (no Redis round trip
+        once the process-wide subscription is up). Pair with release() on disconnect."""
+        await self._subscriber.ensure_started()
+        s = self._sessions.get(session_id)
+        if s is None or s.closed:
+            s = Session(session_id)
+            self._sessions[session_id] = s
+        s.listeners += 1
+        return s
+
+    async def release(self, session: Session) -> None:
+        """An /events connection ended; the session is dropped with its last listener."""
+        session.listeners -= 1
+        if session.listeners <= 0 and self._sessions.get(session.session_id) is session:
+            del self._sessions[session.session_id]
+            await session.close()
+
+    def dispatch(self, session_id: str, event_id: str, msg: str) -> None:
+        """Subscriber callback: queue a bus message for a local session, if there is one."""
+        s = self._sessions.get(session_id)
+        if s is None:
+            SSE_RECEIVED.labels("no_session").inc()
+            return
+        full_since = s.q.full_since
+        if full_since is not None and time.monotonic() - full_since > SSE_QUEUE_FULL_SECONDS:
+            # Slow consumer: drop the session; its /events stream ends and the browser
+            # reconnects with Last-Event-ID, catching up from the Redis Stream
+            logger.warning(f"SSE session {session_id} full for over {SSE_QUEUE_FULL_SECONDS:.0f}s; disconnecting")
+            SSE_SLOW_DISCONNECTS.inc()
+            del self._sessions[session_id]
+            s.closed = True
+            s.q.clear()
+            return
+        s.q.put_nowait((event_id, msg))
+        SSE_RECEIVED.labels("delivered").inc()
+
+    async def publish(self, session_id: str, msg: str) -> str:
+        """Publish one event now, bypassing the batcher; returns its SSE id. See publish_many."""
+        return (await self.publish_many(session_id, [msg]))[0]
+
+    async def publish_many(self, session_id: str, msgs: list[str]) -> list[str]:
+        """Append the events to the session's Redis Stream and publish them for live delivery,
+        in order and in one round trip; every pod's subscriber receives them, the one holding
+        session_id delivers them. Returns the stream entry ids, which are the events' SSE ids."""
+        global _publish_script
         r = await _get_redis()
-        await r.publish(_channel_name(session_id), msg)
+        if _publish_script is None:
+            _publish_script = r.register_script(_PUBLISH_LUA)
+        started = time.perf_counter()
+        event_ids = await _publish_script(
+            keys=[_stream_key(session_id)],
+            args=[SSE_STREAM_MAXLEN, SSE_STREAM_TTL, _channel_name(session_id), *msgs],
+        )
+        REDIS_PUBLISH_LATENCY.observe(time.perf_counter() - started)
+        SSE_PUBLISH_BATCH.observe(len(msgs))
+        for msg in msgs:
+            SSE_MESSAGES.labels(_event_name(msg)).inc()
+        return event_ids
+
+    async def enqueue(self, session_id: str, msg: str) -> None:
+        """Publish an event through the micro-batcher (sent within SSE_BATCH_WINDOW_MS)."""
+        await self._batcher.enqueue(session_id, msg)
+
+    async def flush(self, session_id: Optional[str] = None) -> None:
+        """Publish enqueued events now and wait for them (one session, or all)."""
+        await self._batcher.flush(session_id)
+
+    async def replay(self, session_id: str, last_event_id: str) -> tuple[list[tuple[str, str]], bool]:
+        """Events of the session's stream after `last_event_id`, oldest first, at most
+        SSE_REPLAY_MAX: ([(event id, frame)], complete). complete is False when events are
+        missing: more than SSE_REPLAY_MAX were missed, or the oldest missed ones were trimmed."""
+        r = await _get_redis()
+        key = _stream_key(session_id)
+        started = time.perf_counter()
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.xread({key: last_event_id}, count=SSE_REPLAY_MAX)
+            pipe.xrange(key, count=1)
+            pipe.xlen(key)
+            result, first, length = await pipe.execute()
+        entries = [(entry_id, fields.get("f", "")) for _, items in (result or []) for entry_id, fields in items]
+        # MAXLEN trimming has passed last_event_id: the oldest missed events are gone
+        trimmed = bool(first) and length >= SSE_STREAM_MAXLEN and event_id_key(first[0][0]) > event_id_key(last_event_id)
+        complete = len(entries) < SSE_REPLAY_MAX and not trimmed
+        SSE_REPLAY_LATENCY.observe(time.perf_counter() - started)
+        SSE_REPLAYED.inc(len(entries))
+        return entries, complete
 
     async def delete(self, session_id: str) -> bool:
-        async with self._lock:
-            s = self._sessions.pop(session_id, None)
+        s = self._sessions.pop(session_id, None)
         if s:
             await s.close()
             return True
         return False
 
     async def exists(self, session_id: str) -> bool:
-        async with self._lock:
-            return session_id in self._sessions
+        return session_id in self._sessions
 
     async def close_all(self) -> None:
-        """Shutdown hook: close all local subscriptions."""
-        async with self._lock:
-            for s in self._sessions.values():
-                await s.close()
-            self._sessions.clear()
+        """Shutdown hook: publish pending batches, stop the subscriber and drop all local sessions."""
+        try:
+            await self._batcher.flush()
+        except Exception as e:
+            logger.warning(f"Flushing SSE batches at shutdown failed: {e}")
+        await self._subscriber.stop()
+        for s in self._sessions.values():
+            await s.close()
+        self._sessions.clear()
         if _redis_pool:
             await _redis_pool.aclose()
 
+    def queue_depths(self) -> list[int]:
+        return [s.q.qsize() for s in self._sessions.values()]
+
 
 SESSIONS = SessionManager()
 
+# Scrape-time gauges: nothing is updated on the message path
+SSE_SESSIONS.set_function(lambda: len(SESSIONS._sessions))
+SSE_QUEUE_DEPTH.labels("total").set_function(lambda: sum(SESSIONS.queue_depths()))
+SSE_QUEUE_DEPTH.labels("max").set_function(lambda: max(SESSIONS.queue_depths(), default=0))
+SSE_QUEUE_DEPTH.labels("full_sessions").set_function(lambda: sum(d >= SSE_QUEUE_MAX for d in SESSIONS.queue_depths()))
+
 # Optional: map user_id -> session_id for actor lookups
 _USER_SESSION: Dict[str, str] = {}
 
@@ -142,7 +488,7 @@ async def publish_progress(session_id: str, token: str, progress: float) -> None
         "params": {"progressToken": token, "progress": float(progress)},
     }
     print(f"Publishing progress update: {payload}")
-    await SESSIONS.publish(session_id, sse_event(payload, event="progress"))
+    await SESSIONS.enqueue(session_id, sse_event(payload, event="progress"))
 
 async def publish_message(session_id: str, text: str, level: str = "info", extra: dict | None = None) -> None:
     payload = {
@@ -156,7 +502,7 @@ async def publish_message(session_id: str, text: str, level: str = "info", extra
     if extra:
         payload["params"].update(extra)
     print(f"Publishing message: {payload}")
-    await SESSIONS.publish(session_id, sse_event(payload, event="assistant"))
+    await SESSIONS.enqueue(session_id, sse_event(payload, event="assistant"))
 
 async def publish_mcplog(session_id: str, text: str, level: str = "info") -> None:
     payload = {
@@ -168,7 +514,7 @@ async def publish_mcplog(session_id: str, text: str, level: str = "info") -> Non
         },
     }
     print(f"Publishing mcplog: {payload}")
-    await SESSIONS.publish(session_id, sse_event(payload, event="mcplog"))
+    await SESSIONS.enqueue(session_id, sse_event(payload, event="mcplog"))
 
 
 # ── Elicitation: push to browser, await user response ────────────────────────
@@ -197,7 +543,9 @@ async def publish_elicitation(
             "provided": provided,
         },
     }
-    await SESSIONS.publish(session_id, sse_event(payload, event="elicitation"))
+    # Sent right away, after the events enqueued before it: the user is waiting on it
+    await SESSIONS.enqueue(session_id, sse_event(payload, event="elicitation"))
+    await SESSIONS.flush(session_id)
 
     try:
         # Wait up to 60 seconds for user to respond
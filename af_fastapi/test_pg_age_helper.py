@@ -0,0 +1,104 @@
+# test_pg_age_helper.py
+"""
+PGAgeHelper regressions against a live Postgres with AGE (PG* env vars, as pg_age_helper.DSN);
+skipped when psycopg is missing or the database cannot be reached. Uses its own graph.
+
+Run:  python -m pytest -q test_pg_age_helper.py
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("psycopg")
+
+from psycopg import sql
+
+import pg_age_helper
+from pg_age_helper import DSN, PGAgeHelper
+
+TEST_GRAPH = "pg_age_helper_test"
+NODES = 30
+
+
+async def _helper() -> PGAgeHelper:
+    try:
+        return await PGAgeHelper.create(DSN, TEST_GRAPH)
+    except Exception as e:
+        pytest.skip(f"Postgres with AGE not reachable: {e}")
+
+
+def test_stream_survives_commits_and_rollbacks_on_the_helper(monkeypatch):
+    monkeypatch.setattr(pg_age_helper, "STREAM_BATCH_ROWS", 5)  # several fetches per stream
+
+    async def run():
+        helper = await _helper()
+        try:
+            await helper.recreate_graph()
+            await helper.insert_nodes_batch([{"label": "Item", "payload": {"id": f"i{i}"}} for i in range(NODES)])
+
+            stream = helper.stream_nodes("Item", NODES)
+            records = [await anext(stream)]
+            # Commits (single and batch inserts) and a rollback on the shared connection mid-stream
+            await helper.insert_node({"id": "late"}, "Item")
+            await helper.insert_nodes_batch([{"label": "Item", "payload": {"id": "late2"}}])
+            await helper._conn.rollback()
+            records += [r async for r in stream]
+
+            assert [r["kind"] for r in records] == ["node"] * NODES
+            assert len({r["id"] for r in records}) == NODES
+            assert len(helper._stream_conns) == 1  # returned for reuse
+        finally:
+            await helper.close()
+
+    asyncio.run(run())
+
+
+def test_failing_batch_does_not_roll_back_a_concurrent_batch():
+    async def run():
+        helper = await _helper()
+        try:
+            await helper.recreate_graph()
+            items = [{"label": "Item", "payload": {"id": f"i{i}"}} for i in range(200)]
+            failing = sql.SQL("SELECT 1 / 0 AS ord, '' AS id;")  # every chunk fails
+
+            async def fail_chunks():
+                results = [None] * 10
+                for i in range(10):
+                    await helper._insert_chunk(failing, {}, [i], results)
+                return results
+
+            ok, failed = await asyncio.gather(helper.insert_nodes_batch(items, chunk_size=10), fail_chunks())
+
+            assert all(r["ok"] for r in ok)
+            assert not any(r["ok"] for r in failed)
+            async with helper._conn.cursor() as cur:
+                await cur.execute(sql.SQL("SELECT count(*) AS n FROM {};").format(sql.Identifier(TEST_GRAPH, "Item")))
+                assert (await cur.fetchone())["n"] == len(items)
+        finally:
+            await helper.close()
+
+    asyncio.run(run())
+
+
+def test_expand_truncation_counts_only_label_filtered_candidates():
+    async def run():
+        helper = await _helper()
+        try:
+            await helper.recreate_graph()
+            nodes = [{"label": "Hub", "payload": {"id": "hub"}}, {"label": "Wanted", "payload": {"id": "w0"}}]
+            nodes += [{"label": "Other", "payload": {"id": f"o{i}"}} for i in range(5)]
+            seed = (await helper.insert_nodes_batch(nodes))[0]["id"]
+            await helper.create_edges_batch([
+                {"label": "LINKS", "src_label": "Hub", "dst_label": n["label"], "src": "hub",
+                 "dst": n["payload"]["id"], "payload": {}}
+                for n in nodes[1:]
+            ])
+
+            result = await helper.expand([seed], labels=["Wanted"], per_hop_limit=1)
+            assert [e["label"] for e in result["elements"] if e["kind"] == "node" and e["hop"] == 1] == ['"Wanted"']
+            assert result["truncated"] is False
+        finally:
+            await helper.close()
+
+    asyncio.run(run())
@@ -0,0 +1,69 @@
+# test_sse_bus.py
+"""
+EventQueue overflow regressions (no Redis needed: the queue is local to the process).
+
+Run:  python -m pytest -q test_sse_bus.py
+"""
+
+import asyncio
+
+import pytest
+
+pytest.importorskip("redis")
+pytest.importorskip("prometheus_client")
+
+from sse_bus import JSONRPC, EventQueue, sse_event
+
+
+def _progress(token: str, progress: float) -> str:
+    return sse_event({"jsonrpc": JSONRPC, "method": "notifications/progress",
+                      "params": {"progressToken": token, "progress": progress}}, event="progress")
+
+
+def _elicitation(n: int) -> str:
+    return sse_event({"jsonrpc": JSONRPC, "method": "elicitation/create",
+                      "params": {"elicitationId": f"e{n}"}}, event="elicitation")
+
+
+def _drain(q: EventQueue) -> list[tuple[str, str]]:
+    async def run():
+        out = []
+        while q._dropped or any(e[4] for e in q._items):
+            out.append(await q.get())
+        return out
+    return asyncio.run(run())
+
+
+def test_progress_dropped_while_full_of_keep_events_then_same_token():
+    q = EventQueue(maxsize=3)
+    for i in range(3):
+        q.put_nowait((f"1-{i}", _elicitation(i)))
+    q.put_nowait(("2-0", _progress("t", 0.1)))
+    q.put_nowait(("2-1", _progress("t", 0.2)))
+
+    assert q.qsize() == 3
+    assert sum(e[4] for e in q._items) == 3
+    assert "t" not in q._progress
+
+    events = _drain(q)
+    assert [event_id for event_id, _ in events if event_id] == ["1-0", "1-1", "1-2"]
+    assert q.qsize() == 0
+
+
+def test_progress_coalesces_per_token():
+    q = EventQueue(maxsize=4)
+    q.put_nowait(("1-0", _progress("t", 0.1)))
+    q.put_nowait(("1-1", _progress("t", 0.5)))
+    assert q.qsize() == 1
+    assert [event_id for event_id, _ in _drain(q)] == ["1-1"]
+    assert q.qsize() == 0
+
+
+def test_assistant_events_are_bounded():
+    q = EventQueue(maxsize=3)
+    for i in range(10):
+        q.put_nowait((f"1-{i}", sse_event({"n": i}, event="assistant")))
+    assert q.qsize() == 3
+    events = _drain(q)
+    assert events[0][0] == ""  # "7 events dropped" marker
+    assert [event_id for event_id, _ in events[1:]] == ["1-7", "1-8", "1-9"]
@@ -11,13 +11,18 @@ if sys.platform.startswith("win"):
         os.environ.setdefault("PSYCOPG_IMPL", "python")
     except (ImportError, OSError):
         pass  # no system libpq — keep using binary backend
-from typing import Annotated
+from typing import Annotated, Literal
 from fastmcp import FastMCP, Context
 from fastmcp.server.context import AcceptedElicitation, DeclinedElicitation, CancelledElicitation
 from starlette.middleware import Middleware
 from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
 from dotenv import load_dotenv
-from pg_age_helper import PGAgeHelper
+from pg_age_helper import PGAgeHelper, QueryGuardError, PROBE_ROW_LIMIT
+from query_log import QUERY_LOG
+from metrics import ToolMetricsMiddleware, render_metrics
+from tracing import ToolTracingMiddleware
 
 # --- File logging ---
 _log_dir = os.path.join(os.path.dirname(__file__), "logs")
@@ -39,6 +44,15 @@ logger.info(f"Logging to {_log_file}")
 load_dotenv()
 
 mcp = FastMCP("Graph Age MCP Server")
+mcp.add_middleware(ToolMetricsMiddleware())
+mcp.add_middleware(ToolTracingMiddleware())
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics_endpoint(request: Request) -> Response:
+    """Prometheus scrape endpoint."""
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
 
 
 def _strip_agtype(val) -> str:
@@ -52,6 +66,14 @@ def _strip_agtype(val) -> str:
         val = val[1:-1]
     return val
 
+
+def _session_id(ctx: Context | None) -> str | None:
+    """MCP session id for query logging; None outside a session (e.g. direct calls)."""
+    try:
+        return ctx.session_id if ctx else None
+    except Exception:
+        return None
+
 GRAPH_NAME = os.getenv("GRAPH_NAME", "")
 _ONTOLOGY_MEMORY: dict[str, str] = {}
 # Track which graph names have been confirmed via elicitation per user session.
@@ -213,37 +235,42 @@ async def resolve_entity_ids(
     print(f"[resolve_entity_ids] SQL: {sql}")
     if ctx: await ctx.info(f"[resolve_entity_ids] Searching for '{fts_term}' (label: {node_label or 'all'})")
 
-    rows = await pg_helper.query_using_sql_cypher(sql, None)
-
-    # Fallback: retry with shorter terms if nothing found
-    if not rows:
-        words = fts_term.split()
-        retry_terms = []
-        for trim_count in range(1, min(3, len(words))):
-            shorter = " ".join(words[: len(words) - trim_count])
-            if len(shorter.split()) >= 2 and shorter not in retry_terms:
-                retry_terms.append(shorter)
-        for trim_count in range(1, min(3, len(words))):
-            shorter = " ".join(words[trim_count:])
-            if len(shorter.split()) >= 2 and shorter not in retry_terms:
-                retry_terms.append(shorter)
-        if len(words) >= 2:
-            for w in words:
-                if len(w) >= 3 and w not in retry_terms:
-                    retry_terms.append(w)
-
-        for shorter in retry_terms:
-            sql_retry = f"""
-                SELECT {json_path} AS entity_id, node_label
-                FROM public.search_graph_nodes('{shorter.replace("'", "''")}')
-                {"WHERE node_label = '" + node_label.replace("'", "''") + "'" if node_label else ""}
-                ORDER BY rank DESC;
-            """
-            print(f"[resolve_entity_ids] Retry with shorter term: {shorter}")
-            if ctx: await ctx.info(f"[resolve_entity_ids] Retrying with shorter term: '{shorter}'")
-            rows = await pg_helper.query_using_sql_cypher(sql_retry, None)
-            if rows:
-                break
+    try:
+        rows = await pg_helper.query_using_sql_cypher(sql, None, tool="resolve_entity_ids", session_id=_session_id(ctx))
+
+        # Fallback: retry with shorter terms if nothing found
+        if not rows:
+            words = fts_term.split()
+            retry_terms = []
+            for trim_count in range(1, min(3, len(words))):
+                shorter = " ".join(words[: len(words) - trim_count])
+                if len(shorter.split()) >= 2 and shorter not in retry_terms:
+                    retry_terms.append(shorter)
+            for trim_count in range(1, min(3, len(words))):
+                shorter = " ".join(words[trim_count:])
+                if len(shorter.split()) >= 2 and shorter not in retry_terms:
+                    retry_terms.append(shorter)
+            if len(words) >= 2:
+                for w in words:
+                    if len(w) >= 3 and w not in retry_terms:
+                        retry_terms.append(w)
+
+            for shorter in retry_terms:
+                sql_retry = f"""
+                    SELECT {json_path} AS entity_id, node_label
+                    FROM public.search_graph_nodes('{shorter.replace("'", "''")}')
+                    {"WHERE node_label = '" + node_label.replace("'", "''") + "'" if node_label else ""}
+                    ORDER BY rank DESC;
+                """
+                print(f"[resolve_entity_ids] Retry with shorter term: {shorter}")
+                if ctx: await ctx.info(f"[resolve_entity_ids] Retrying with shorter term: '{shorter}'")
+                rows = await pg_helper.query_using_sql_cypher(sql_retry, None, tool="resolve_entity_ids", session_id=_session_id(ctx))
+                if rows:
+                    break
+    except QueryGuardError as e:
+        print(f"[resolve_entity_ids] Guard: {e.message}")
+        if ctx: await ctx.warning(f"[resolve_entity_ids] {e.message}")
+        return e.to_dict()
 
     # Group IDs by label — cap at 10 IDs per label to save context
     ids_by_label: dict[str, list[str]] = {}
@@ -307,7 +334,7 @@ async def resolve_entity_ids(
   RETURN n.{cypher_id_path} AS id, n.payload.name AS name
 $$) AS (id ag_catalog.agtype, name ag_catalog.agtype);"""
     try:
-        verify_rows = await pg_helper.query_using_sql_cypher(verify_sql, graph_name)
+        verify_rows = await pg_helper.query_using_sql_cypher(verify_sql, graph_name, tool="resolve_entity_ids", session_id=_session_id(ctx))
         search_words = _extract_search_words(search_term)
         if search_words and verify_rows:
             verified_ids = []
@@ -349,7 +376,7 @@ $$) AS (id ag_catalog.agtype, name ag_catalog.agtype);"""
 $$) AS (rel ag_catalog.agtype, tgt ag_catalog.agtype, cnt ag_catalog.agtype);"""
         print(f"[resolve_entity_ids] Discovering outbound edges...")
         if ctx: await ctx.info(f"[resolve_entity_ids] Discovering outbound edges for {anchor_label}...")
-        out_rows = await pg_helper.query_using_sql_cypher(out_sql, graph_name)
+        out_rows = await pg_helper.query_using_sql_cypher(out_sql, graph_name, tool="resolve_entity_ids", session_id=_session_id(ctx))
         outbound_edges = [{"rel": _strip_agtype(r["rel"]), "target_label": _strip_agtype(r["tgt"]), "count": r["cnt"]} for r in out_rows]
     except Exception as e:
         print(f"[resolve_entity_ids] Outbound edge discovery failed: {e}")
@@ -364,7 +391,7 @@ $$) AS (rel ag_catalog.agtype, tgt ag_catalog.agtype, cnt ag_catalog.agtype);"""
 $$) AS (src ag_catalog.agtype, rel ag_catalog.agtype, cnt ag_catalog.agtype);"""
         print(f"[resolve_entity_ids] Discovering inbound edges...")
         if ctx: await ctx.info(f"[resolve_entity_ids] Discovering inbound edges for {anchor_label}...")
-        in_rows = await pg_helper.query_using_sql_cypher(in_sql, graph_name)
+        in_rows = await pg_helper.query_using_sql_cypher(in_sql, graph_name, tool="resolve_entity_ids", session_id=_session_id(ctx))
         inbound_edges = [{"source_label": _strip_agtype(r["src"]), "rel": _strip_agtype(r["rel"]), "count": r["cnt"]} for r in in_rows]
     except Exception as e:
         print(f"[resolve_entity_ids] Inbound edge discovery failed: {e}")
@@ -429,7 +456,7 @@ $$) AS (id ag_catalog.agtype, name ag_catalog.agtype, properties ag_catalog.agty
     print(f"[find_related_nodes] SQL: {sql}")
 
     try:
-        rows = await pg_helper.query_using_sql_cypher(sql, graph_name)
+        rows = await pg_helper.query_using_sql_cypher(sql, graph_name, tool="find_related_nodes")
     except Exception as e:
         return {
             "related_nodes": [],
@@ -481,7 +508,12 @@ $$) AS (label ag_catalog.agtype, sample_payload ag_catalog.agtype);"""
 
     print(f"[discover_nodes] graph_name={graph_name}")
     if ctx: await ctx.info(f"[discover_nodes] Discovering node labels in graph '{graph_name}'...")
-    rows = await pg_helper.query_using_sql_cypher(sql, graph_name)
+    try:
+        rows = await pg_helper.query_using_sql_cypher(sql, graph_name, tool="discover_nodes", session_id=_session_id(ctx))
+    except QueryGuardError as e:
+        print(f"[discover_nodes] Guard: {e.message}")
+        if ctx: await ctx.warning(f"[discover_nodes] {e.message}")
+        return [e.to_dict()]
     print(f"[discover_nodes] Found {len(rows)} distinct node labels")
     if ctx: await ctx.info(f"[discover_nodes] Found {len(rows)} distinct node labels")
 
@@ -570,32 +602,37 @@ async def search_graph(
         LIMIT {max_results};
     """
 
-    rows = await pg_helper.query_using_sql_cypher(sql, None)
-    print(f"[search_graph] Found {len(rows)} results")
-    if ctx: await ctx.info(f"[search_graph] Found {len(rows)} results")
-
-    # If no results, try progressively shorter search terms
-    if not rows and len(fts_term.split()) > 1:
-        words = fts_term.split()
-        for trim in range(1, min(4, len(words))):
-            shorter = " ".join(words[:len(words) - trim])
-            if len(shorter) < 3:
-                break
-            retry_sql = f"""
-                SELECT props->'payload'->>'id' AS entity_id,
-                       node_label,
-                       props->'payload'->>'name' AS name,
-                       props->'payload' AS payload,
-                       rank
-                FROM public.search_graph_nodes('{shorter.replace(chr(39), chr(39)+chr(39))}')
-                {label_clause}
-                ORDER BY rank DESC
-                LIMIT {max_results};
-            """
-            rows = await pg_helper.query_using_sql_cypher(retry_sql, None)
-            if rows:
-                print(f"[search_graph] Retry with '{shorter}' found {len(rows)} results")
-                break
+    try:
+        rows = await pg_helper.query_using_sql_cypher(sql, None, tool="search_graph", session_id=_session_id(ctx))
+        print(f"[search_graph] Found {len(rows)} results")
+        if ctx: await ctx.info(f"[search_graph] Found {len(rows)} results")
+
+        # If no results, try progressively shorter search terms
+        if not rows and len(fts_term.split()) > 1:
+            words = fts_term.split()
+            for trim in range(1, min(4, len(words))):
+                shorter = " ".join(words[:len(words) - trim])
+                if len(shorter) < 3:
+                    break
+                retry_sql = f"""
+                    SELECT props->'payload'->>'id' AS entity_id,
+                           node_label,
+                           props->'payload'->>'name' AS name,
+                           props->'payload' AS payload,
+                           rank
+                    FROM public.search_graph_nodes('{shorter.replace(chr(39), chr(39)+chr(39))}')
+                    {label_clause}
+                    ORDER BY rank DESC
+                    LIMIT {max_results};
+                """
+                rows = await pg_helper.query_using_sql_cypher(retry_sql, None, tool="search_graph", session_id=_session_id(ctx))
+                if rows:
+                    print(f"[search_graph] Retry with '{shorter}' found {len(rows)} results")
+                    break
+    except QueryGuardError as e:
+        print(f"[search_graph] Guard: {e.message}")
+        if ctx: await ctx.warning(f"[search_graph] {e.message}")
+        return e.to_dict()
 
     # Group by label for summary
     from collections import Counter
@@ -644,17 +681,27 @@ async def search_graph(
 @mcp.tool
 async def query_using_sql_cypher(
     sql_query: Annotated[str, "SQL Query"],
-    graph_name: Annotated[str, "Graph name to use for ag_catalog.cypher(...)"]
-    , ctx: Context = None,
-) -> list[dict]:
+    graph_name: Annotated[str, "Graph name to use for ag_catalog.cypher(...)"],
+    mode: Annotated[Literal["full", "probe", "count"], "'full' returns all rows, 'probe' only the first probe_limit rows plus has_more, 'count' only the row count"] = "full",
+    probe_limit: Annotated[int, "Rows to return in probe mode"] = PROBE_ROW_LIMIT,
+    ctx: Context = None,
+) -> list[dict] | dict:
     """
     Execute the sql statement against a PostgreSQL database with the AGE extension.
     The sql query is generated by another agent. This tool simply executes the query and returns the result.
+    Queries are cost-checked with EXPLAIN first and run under a statement_timeout; a query that is too
+    expensive or times out returns a single {"error", "message", "hint"} entry instead of rows.
+    Use mode='probe' while validating (does it run, does it return rows?) and mode='full' only for the
+    final answer — a full run of SQL whose probe already returned every row reuses the probe result.
     Args:
         sql_query: The SQL query to execute.
         graph_name: Graph name to use when executing AGE cypher calls.
+        mode: 'full' (default), 'probe' or 'count'.
+        probe_limit: Number of rows returned in probe mode.
     Returns:
-        The query result as a list of dictionaries.
+        full: the query result as a list of dictionaries.
+        probe: {mode, query_key, rows, row_count, has_more}.
+        count: {mode, query_key, count}.
     """
     if ctx: await ctx.info(f"[query_using_sql_cypher] Executing query against graph '{graph_name}'...")
     # --- Elicitation: confirm graph name (once per session per graph name, serialized) ---
@@ -680,12 +727,145 @@ async def query_using_sql_cypher(
                     await ctx.info(f"[elicitation] Not available: {type(e).__name__}: {e}")
                     _CONFIRMED_GRAPHS.setdefault(_sid, set()).add(graph_name)
     if ctx: await ctx.info(f"[query_using_sql_cypher] SQL: {sql_query[:200]}{'...' if len(sql_query) > 200 else ''}")
-    rows = await pg_helper.query_using_sql_cypher(sql_query, graph_name)
+    try:
+        if mode == "probe":
+            result = await pg_helper.probe_query(sql_query, graph_name, limit=max(1, probe_limit), tool="query_using_sql_cypher", session_id=_session_id(ctx))
+            print(f"[query_using_sql_cypher] Probe returned {result['row_count']} rows, has_more={result['has_more']}")
+            if ctx: await ctx.info(f"[query_using_sql_cypher] Probe returned {result['row_count']} rows (has_more={result['has_more']})")
+            return result
+        if mode == "count":
+            result = await pg_helper.count_query(sql_query, graph_name, tool="query_using_sql_cypher", session_id=_session_id(ctx))
+            print(f"[query_using_sql_cypher] Count: {result['count']}")
+            if ctx: await ctx.info(f"[query_using_sql_cypher] Query produces {result['count']} rows")
+            return result
+        rows = await pg_helper.query_using_sql_cypher(sql_query, graph_name, tool="query_using_sql_cypher", session_id=_session_id(ctx), guard=True)
+    except QueryGuardError as e:
+        print(f"[query_using_sql_cypher] Guard: {e.message}")
+        if ctx: await ctx.warning(f"[query_using_sql_cypher] {e.message}")
+        return [e.to_dict()]
     print("Query executed, result:\n", rows)
     if ctx: await ctx.info(f"[query_using_sql_cypher] Query returned {len(rows)} rows")
     return rows
 
 
+@mcp.tool
+async def explain_query(
+    sql_query: Annotated[str, "SQL Query to check (same format as query_using_sql_cypher)"],
+    graph_name: Annotated[str, "Graph name to use for ag_catalog.cypher(...)"],
+    ctx: Context = None,
+) -> dict:
+    """
+    Check a query WITHOUT executing it. The SQL is normalized exactly like query_using_sql_cypher
+    and then planned with EXPLAIN, so this returns in milliseconds even for expensive queries.
+    Use it to validate syntax and cost before running the final query.
+    Args:
+        sql_query: The SQL query to check.
+        graph_name: Graph name to use when planning AGE cypher calls.
+    Returns:
+        A dict with:
+        - ok: True if the query parses and its RETURN/AS column counts match
+        - normalized_sql: the exact SQL query_using_sql_cypher would execute
+        - error: {sqlstate, message, hint} if the query failed to parse or plan
+        - as_column_check: {return_columns, as_columns, match}
+        - estimated_rows, estimated_cost: planner estimates
+        - indexes_used: list of {index, relation, scan}; seq_scans: relations read by sequential scan
+        - within_guard_limits: False if query_using_sql_cypher would reject the query as too expensive
+    """
+    if ctx: await ctx.info(f"[explain_query] Planning query against graph '{graph_name}'...")
+    result = await pg_helper.explain_query(sql_query, graph_name)
+    if "error" in result:
+        print(f"[explain_query] Planning failed: {result['error']['message']}")
+        if ctx: await ctx.info(f"[explain_query] Planning failed: {result['error']['message']}")
+    else:
+        print(f"[explain_query] cost={result['estimated_cost']:.0f} rows={result['estimated_rows']:.0f} indexes={len(result['indexes_used'])}")
+        if ctx: await ctx.info(
+            f"[explain_query] Estimated {result['estimated_rows']:.0f} rows, cost {result['estimated_cost']:.0f}, "
+            f"{len(result['indexes_used'])} index scans"
+        )
+    return result
+
+
+@mcp.tool
+async def find_paths(
+    graph_name: Annotated[str, "Graph name (e.g., 'customer_graph')"],
+    source_id: Annotated[str, "payload.id of the start node (e.g., an anchor_id from resolve_entity_ids)"],
+    target_id: Annotated[str, "payload.id of the end node"],
+    source_label: Annotated[str, "Node label of the start node; '' = any label"] = "",
+    target_label: Annotated[str, "Node label of the end node; '' = any label"] = "",
+    max_depth: Annotated[int, "Maximum path length in edges"] = 4,
+    k: Annotated[int, "Number of shortest paths to return"] = 3,
+    direction: Annotated[Literal["both", "out", "in"], "'out' follows edges from source to target, 'in' the reverse, 'both' ignores direction"] = "both",
+    edge_types: Annotated[list[str], "Only traverse these edge labels; empty = all"] = [],
+    ctx: Context = None,
+) -> dict:
+    """
+    Find how two nodes are connected: up to k shortest paths of at most max_depth edges.
+    Use this instead of writing variable-length Cypher such as MATCH p=(a)-[*1..4]-(b), which
+    is exponential in AGE. The search is a bidirectional BFS over the edge tables; very
+    high-degree nodes (hubs) are not expanded through and are listed in stats.hubs.
+    Args:
+        graph_name: The graph to search.
+        source_id / target_id: payload.id of the endpoints.
+        source_label / target_label: Labels of the endpoints (faster and unambiguous when given).
+        max_depth: Maximum number of edges in a path.
+        k: Number of paths to return, shortest first.
+        direction: 'both' (default), 'out' or 'in'.
+        edge_types: Restrict the search to these edge labels.
+    Returns:
+        A dict with:
+        - paths: list of {length, nodes, edges, text}, where text reads like
+          "Contoso (Customer) -[ADOPTED_FEATURE]-> Copilot (Feature)"
+        - nodes: graphid -> {label, name}; edges: edge id -> {label, src, dst}
+        - stats: {levels, visited, hubs, truncated, ms}
+    """
+    # Normalize labels in case they arrive in agtype format: ["Label"] -> Label
+    source_label, target_label = _strip_agtype(source_label), _strip_agtype(target_label)
+    if ctx: await ctx.info(f"[find_paths] {source_label or '*'}:{source_id} -> {target_label or '*'}:{target_id} (max_depth={max_depth}, k={k})")
+    try:
+        result = await pg_helper.find_paths(
+            graph_name,
+            {"id": source_id, "label": source_label},
+            {"id": target_id, "label": target_label},
+            max_depth=max_depth, k=k, direction=direction, edge_types=[_strip_agtype(t) for t in edge_types] or None,
+            session_id=_session_id(ctx),
+        )
+    except QueryGuardError as e:
+        if ctx: await ctx.warning(f"[find_paths] {e.message}")
+        return e.to_dict()
+    except (ValueError, LookupError) as e:
+        print(f"[find_paths] {e}")
+        return {"error": type(e).__name__, "message": str(e), "paths": []}
+    print(f"[find_paths] {len(result['paths'])} paths, stats={result['stats']}")
+    if ctx: await ctx.info(f"[find_paths] Found {len(result['paths'])} paths in {result['stats']['ms']} ms")
+    return result
+
+
+@mcp.tool
+async def slow_queries(
+    top_n: Annotated[int, "Number of query shapes to return"] = 10,
+    order_by: Annotated[Literal["max_ms", "mean_ms", "total_ms", "calls", "slow_calls"], "Ranking metric"] = "max_ms",
+    ctx: Context = None,
+) -> list[dict]:
+    """
+    List the slowest query shapes executed by this server (literals replaced by '?').
+    Each entry has fingerprint, shape, calls, slow_calls, mean_ms, max_ms, total_ms, rows, bytes,
+    tools, graphs, sample_sql and — when one was sampled — the EXPLAIN (ANALYZE, BUFFERS) plan.
+    """
+    shapes = QUERY_LOG.top(top_n, order_by)
+    if ctx: await ctx.info(f"[slow_queries] Returning {len(shapes)} query shapes ordered by {order_by}")
+    return shapes
+
+
+@mcp.custom_route("/slow-queries", methods=["GET"])
+async def slow_queries_http(request: Request) -> JSONResponse:
+    """HTTP view of slow_queries: GET /slow-queries?top_n=10&order_by=max_ms"""
+    try:
+        top_n = int(request.query_params.get("top_n", "10"))
+    except ValueError:
+        top_n = 10
+    order_by = request.query_params.get("order_by", "max_ms")
+    return JSONResponse(QUERY_LOG.top(top_n, order_by))
+
 
 @mcp.tool
 async def build_query_context(
@@ -728,7 +908,7 @@ async def build_query_context(
 $$) AS (label ag_catalog.agtype, sample_payload ag_catalog.agtype);"""
 
     try:
-        disc_rows = await pg_helper.query_using_sql_cypher(discover_sql, graph_name)
+        disc_rows = await pg_helper.query_using_sql_cypher(discover_sql, graph_name, tool="build_query_context", session_id=_session_id(ctx))
     except Exception as e:
         return {"error": f"Schema discovery failed: {e}"}
 
@@ -770,7 +950,12 @@ $$) AS (label ag_catalog.agtype, sample_payload ag_catalog.agtype);"""
         FROM public.search_graph_nodes('{fts_term.replace("'", "''")}')
         ORDER BY rank DESC;
     """
-    rows_all = await pg_helper.query_using_sql_cypher(search_sql_all, None)
+    try:
+        rows_all = await pg_helper.query_using_sql_cypher(search_sql_all, None, tool="build_query_context", session_id=_session_id(ctx))
+    except QueryGuardError as e:
+        print(f"[build_query_context] Guard: {e.message}")
+        if ctx: await ctx.warning(f"[build_query_context] {e.message}")
+        return e.to_dict()
 
     if rows_all:
         from collections import Counter
@@ -804,7 +989,7 @@ $$) AS (label ag_catalog.agtype, sample_payload ag_catalog.agtype);"""
   RETURN n.payload.id AS id, n.payload.name AS name
 $$) AS (id ag_catalog.agtype, name ag_catalog.agtype);"""
             try:
-                _bqc_rows = await pg_helper.query_using_sql_cypher(_bqc_verify_sql, graph_name)
+                _bqc_rows = await pg_helper.query_using_sql_cypher(_bqc_verify_sql, graph_name, tool="build_query_context", session_id=_session_id(ctx))
                 _bqc_verified = [
                     _strip_agtype(r.get("id"))
                     for r in _bqc_rows
@@ -832,7 +1017,12 @@ $$) AS (id ag_catalog.agtype, name ag_catalog.agtype);"""
                 FROM public.search_graph_nodes('{shorter.replace("'", "''")}')
                 ORDER BY rank DESC;
             """
-            retry_rows = await pg_helper.query_using_sql_cypher(retry_sql, None)
+            try:
+                retry_rows = await pg_helper.query_using_sql_cypher(retry_sql, None, tool="build_query_context", session_id=_session_id(ctx))
+            except QueryGuardError as e:
+                print(f"[build_query_context] Guard: {e.message}")
+                if ctx: await ctx.warning(f"[build_query_context] {e.message}")
+                return e.to_dict()
             if retry_rows:
                 from collections import Counter
                 label_counts = Counter(r.get("node_label", "") for r in retry_rows)
@@ -876,12 +1066,12 @@ $$) AS (src ag_catalog.agtype, rel ag_catalog.agtype, cnt ag_catalog.agtype);"""
     outbound = []
     inbound = []
     try:
-        out_rows = await pg_helper.query_using_sql_cypher(out_sql, graph_name)
+        out_rows = await pg_helper.query_using_sql_cypher(out_sql, graph_name, tool="build_query_context", session_id=_session_id(ctx))
         outbound = [{"rel": _strip_agtype(r["rel"]), "target_label": _strip_agtype(r["tgt"]), "count": r["cnt"]} for r in out_rows]
     except Exception as e:
         print(f"[build_query_context] Outbound edge discovery failed: {e}")
     try:
-        in_rows = await pg_helper.query_using_sql_cypher(in_sql, graph_name)
+        in_rows = await pg_helper.query_using_sql_cypher(in_sql, graph_name, tool="build_query_context", session_id=_session_id(ctx))
         inbound = [{"source_label": _strip_agtype(r["src"]), "rel": _strip_agtype(r["rel"]), "count": r["cnt"]} for r in in_rows]
     except Exception as e:
         print(f"[build_query_context] Inbound edge discovery failed: {e}")
@@ -936,6 +1126,7 @@ async def _confirm_graph_name(
         rows = await pg_helper.query_using_sql_cypher(
             "SELECT name FROM ag_catalog.ag_graph WHERE name != 'ag_graph' ORDER BY name;",
             None,
+            tool="_confirm_graph_name", session_id=_session_id(ctx),
         )
         available_graphs = [r["name"] for r in rows if r.get("name")]
     except Exception as e:
@@ -1010,7 +1201,7 @@ async def analyze_graph_statistics(
   MATCH (n) RETURN labels(n) AS label, count(*) AS cnt
 $$) AS (label ag_catalog.agtype, cnt ag_catalog.agtype);"""
     try:
-        node_rows = await pg_helper.query_using_sql_cypher(node_sql, graph_name)
+        node_rows = await pg_helper.query_using_sql_cypher(node_sql, graph_name, tool="analyze_graph_statistics", session_id=_session_id(ctx))
         for r in node_rows:
             lbl = _strip_agtype(r["label"])
             cnt = int(str(r["cnt"]).strip('"'))
@@ -1027,7 +1218,7 @@ $$) AS (label ag_catalog.agtype, cnt ag_catalog.agtype);"""
   MATCH ()-[r]->() RETURN type(r) AS rel, count(*) AS cnt
 $$) AS (rel ag_catalog.agtype, cnt ag_catalog.agtype);"""
     try:
-        edge_rows = await pg_helper.query_using_sql_cypher(edge_sql, graph_name)
+        edge_rows = await pg_helper.query_using_sql_cypher(edge_sql, graph_name, tool="analyze_graph_statistics", session_id=_session_id(ctx))
         for r in edge_rows:
             rel = _strip_agtype(r["rel"])
             cnt = int(str(r["cnt"]).strip('"'))
@@ -0,0 +1,64 @@
+# bench_metrics_overhead.py
+"""
+Measure the cost of the metrics recorded on every MCP tool call and SQL statement.
+
+Run:  python bench_metrics_overhead.py [iterations]
+
+Per tool call the server does: 1 tool histogram observe + 1 tool counter inc (middleware),
+2 DB histogram observes, a lock-wait histogram observe, 2 gauge inc/dec pairs, and ~16
+normalizer before/after comparisons. The script times exactly that sequence and compares it
+with an empty loop and with a 1 ms statement (a fast AGE lookup).
+"""
+
+import sys, time
+
+from metrics import (
+    DB_CONNECTIONS, DB_QUERY_LATENCY, DB_ROWS_RETURNED, DB_WAIT, DB_WAITING,
+    TOOL_CALLS, TOOL_LATENCY, count_rewrite,
+)
+
+_QUERY = (
+    "SELECT * FROM ag_catalog.cypher('meetings_graph', $$ MATCH (p:Person)-[:ATTENDED]->(m:Meeting) "
+    "WHERE p.payload.name = 'Larry Klein' RETURN m.payload.date AS date $$) AS (date ag_catalog.agtype);"
+)
+_RULES = (
+    "escaped_quotes", "cypher_prefix", "date_keyword", "date_function", "type_cast", "as_column_types",
+    "outer_select", "comments_semicolon", "in_parens", "ilike", "where_label", "payload_prefix",
+)
+
+
+def _per_call(tool: str) -> None:
+    DB_WAITING.inc()
+    DB_WAITING.dec()
+    DB_WAIT.observe(0.00001)
+    DB_CONNECTIONS.labels("in_use").inc()
+    for rule in _RULES:
+        count_rewrite(rule, _QUERY, _QUERY)
+    DB_QUERY_LATENCY.labels(tool).observe(0.012)
+    DB_ROWS_RETURNED.labels(tool).observe(42)
+    DB_CONNECTIONS.labels("in_use").dec()
+    TOOL_LATENCY.labels(tool).observe(0.015)
+    TOOL_CALLS.labels(tool, "ok").inc()
+
+
+def _timed(fn, n: int) -> float:
+    started = time.perf_counter()
+    for _ in range(n):
+        fn("query_using_sql_cypher")
+    return (time.perf_counter() - started) / n
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    _timed(_per_call, 1000)  # warm up label children
+    baseline = _timed(lambda tool: None, n)
+    instrumented = _timed(_per_call, n)
+    overhead_us = (instrumented - baseline) * 1e6
+    print(f"iterations:              {n}")
+    print(f"metrics per tool call:   {overhead_us:.2f} µs")
+    print(f"vs 1 ms statement:       {overhead_us / 1000 * 100:.3f} %")
+    print(f"vs 15 ms tool call:      {overhead_us / 15000 * 100:.4f} %")
+
+
+if __name__ == "__main__":
+    main()
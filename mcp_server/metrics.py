@@ -0,0 +1,81 @@
+# metrics.py
+"""
+Prometheus metrics for the AGE MCP server, served on GET /metrics.
+
+Everything here is a plain prometheus_client counter/histogram/gauge update (a lock and an
+add per observation), so collection stays on in production; see bench_metrics_overhead.py.
+"""
+
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+from fastmcp.server.middleware import Middleware, MiddlewareContext
+
+# Latency buckets (seconds) sized for DB-backed tool calls: 5 ms … 60 s
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+_ROW_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+TOOL_CALLS = Counter(
+    "mcp_tool_calls_total", "MCP tool calls", ["tool", "outcome"],
+)
+TOOL_LATENCY = Histogram(
+    "mcp_tool_latency_seconds", "MCP tool call latency", ["tool"], buckets=_LATENCY_BUCKETS,
+)
+
+DB_QUERY_LATENCY = Histogram(
+    "age_db_query_latency_seconds", "Statement execution latency (execute + fetch)", ["tool"],
+    buckets=_LATENCY_BUCKETS,
+)
+DB_ROWS_RETURNED = Histogram(
+    "age_db_rows_returned", "Rows returned per statement", ["tool"], buckets=_ROW_BUCKETS,
+)
+DB_WAIT = Histogram(
+    "age_db_connection_wait_seconds", "Time a statement waited for the shared connection",
+    buckets=_LATENCY_BUCKETS,
+)
+DB_CONNECTIONS = Gauge(
+    "age_db_connections", "Database connections held by PGAgeHelper", ["state"],
+)
+DB_WAITING = Gauge(
+    "age_db_connection_waiters", "Statements currently waiting for the shared connection",
+)
+DB_RECONNECTS = Counter(
+    "age_db_reconnects_total", "Reconnects after a connection error",
+)
+
+GUARD_OUTCOMES = Counter(
+    "age_query_guard_total", "Cost guard / statement timeout outcomes", ["outcome", "tool"],
+)
+RESULT_CACHE = Counter(
+    "age_result_cache_total", "Probe result cache lookups", ["result"],
+)
+NORMALIZER_REWRITES = Counter(
+    "age_normalizer_rewrites_total", "Times a _normalize_cypher_query rule changed the query", ["rule"],
+)
+
+
+def count_rewrite(rule: str, before: str, after: str) -> None:
+    """Count a normalizer rule as fired when it changed the text."""
+    if before != after:
+        NORMALIZER_REWRITES.labels(rule).inc()
+
+
+class ToolMetricsMiddleware(Middleware):
+    """FastMCP middleware: per-tool call counter and latency histogram."""
+
+    async def on_call_tool(self, context: MiddlewareContext, call_next):
+        tool = getattr(context.message, "name", "unknown")
+        started = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await call_next(context)
+            outcome = "ok"
+            return result
+        finally:
+            TOOL_LATENCY.labels(tool).observe(time.perf_counter() - started)
+            TOOL_CALLS.labels(tool, outcome).inc()
+
+
+def render_metrics() -> tuple[bytes, str]:
+    """Return (body, content_type) for the /metrics endpoint."""
+    return generate_latest(), CONTENT_TYPE_LATEST
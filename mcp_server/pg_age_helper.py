@@ -1,16 +1,26 @@
 # pg_age_helper.py
 
-import os, asyncio, json, re, logging
+import os, asyncio, json, re, logging, hashlib, time
+from contextlib import asynccontextmanager
 import psycopg
 from psycopg import sql
 from psycopg.rows import dict_row   # 👈 NEW
 from dotenv import load_dotenv
+from collections import Counter, OrderedDict
 from typing import Any, List
 
 logger = logging.getLogger("age_mcp")
 
 load_dotenv()
 
+from query_log import QUERY_LOG, result_bytes
+from metrics import (
+    DB_CONNECTIONS, DB_QUERY_LATENCY, DB_RECONNECTS, DB_ROWS_RETURNED, DB_WAIT, DB_WAITING,
+    GUARD_OUTCOMES, NORMALIZER_REWRITES, RESULT_CACHE, count_rewrite,
+)
+from tracing import start_span
+import graph_paths
+
 DSN = dict(
     host=os.getenv("PGHOST", "localhost"),
     port=int(os.getenv("PGPORT", "5432")),
@@ -28,10 +38,69 @@ if not GRAPH:
 print("Using graph:", GRAPH)
 print("Using DSN:", {k: (v if k != "password" else "****") for k, v in DSN.items()})
 
+# --- Cost guard / statement timeouts for LLM-generated SQL ---
+# Defaults apply to every graph; QUERY_GUARD_LIMITS overrides them per graph, e.g.
+#   QUERY_GUARD_LIMITS='{"meetings_graph_v2": {"max_cost": 5000000, "max_rows": 20000}}'
+QUERY_MAX_COST = float(os.getenv("QUERY_MAX_COST", "10000000"))
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "10000"))
+QUERY_GUARD_LIMITS: dict[str, dict] = json.loads(os.getenv("QUERY_GUARD_LIMITS") or "{}")
+
+# statement_timeout (ms) applied to every statement; TOOL_STATEMENT_TIMEOUTS overrides it per MCP tool, e.g.
+#   TOOL_STATEMENT_TIMEOUTS='{"query_using_sql_cypher": 15000, "analyze_graph_statistics": 120000}'
+STATEMENT_TIMEOUT_MS = int(os.getenv("STATEMENT_TIMEOUT_MS", "30000"))
+TOOL_STATEMENT_TIMEOUTS: dict[str, int] = json.loads(os.getenv("TOOL_STATEMENT_TIMEOUTS") or "{}")
+
+# Guard outcomes (rejected / auto_limited / timed_out), keyed by outcome and tool name.
+GUARD_STATS: Counter = Counter()
+
+# Probe mode: rows returned by default, and how long a complete probe result can be
+# reused by a later full execution of the same normalized SQL.
+PROBE_ROW_LIMIT = int(os.getenv("PROBE_ROW_LIMIT", "5"))
+RESULT_CACHE_TTL_S = float(os.getenv("RESULT_CACHE_TTL_S", "120"))
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "256"))
+
+
+class QueryGuardError(Exception):
+    """Raised when a statement is rejected by the cost guard or killed by statement_timeout.
+
+    `to_dict()` is the agent-facing shape returned by the MCP tools instead of rows.
+    """
+
+    def __init__(self, reason: str, message: str, hint: str, **details: Any):
+        super().__init__(message)
+        self.reason = reason
+        self.message = message
+        self.hint = hint
+        self.details = details
+
+    def to_dict(self) -> dict:
+        return {"error": self.reason, "message": self.message, "hint": self.hint, **self.details}
+
+
+def _guard_limits(graph_name: str | None) -> tuple[float, int]:
+    """Return (max_cost, max_rows) for a graph, falling back to the global defaults."""
+    limits = QUERY_GUARD_LIMITS.get(graph_name or "", {})
+    return float(limits.get("max_cost", QUERY_MAX_COST)), int(limits.get("max_rows", QUERY_MAX_ROWS))
+
+
+def _statement_timeout_ms(tool: str | None) -> int:
+    return int(TOOL_STATEMENT_TIMEOUTS.get(tool or "", STATEMENT_TIMEOUT_MS))
+
 class PGAgeHelper:
     def __init__(self, conn: psycopg.AsyncConnection):
         self._conn = conn
         self.graph = GRAPH
+        # Complete result sets keyed by query_key(); see probe_query()
+        self._result_cache: OrderedDict[str, tuple[float, list[dict]]] = OrderedDict()
+        # Separate connection for sampled EXPLAIN (ANALYZE, BUFFERS) captures of slow statements,
+        # so a capture never runs inside a tool call's transaction; see _capture_plan()
+        self._capture_conn: psycopg.AsyncConnection | None = None
+        self._capture_lock = asyncio.Lock()
+        self._capture_tasks: set[asyncio.Task] = set()
+        # Tool calls run concurrently but share one connection; each statement's transaction
+        # (SET LOCAL ... rollback) holds this lock so they can't interleave. See _acquire().
+        self._conn_lock = asyncio.Lock()
+        DB_CONNECTIONS.labels("open").set_function(self._open_connections)
 
     @classmethod
     async def create(cls) -> "PGAgeHelper":
@@ -117,9 +186,60 @@ class PGAgeHelper:
             print(f"Error closing old connection: {e}")
         
         print("Creating new database connection...")
+        DB_RECONNECTS.inc()
         self._conn = await self._create_connection()
         print("Reconnection successful")
 
+    def _open_connections(self) -> int:
+        return sum(1 for c in (self._conn, self._capture_conn) if c is not None and not c.closed)
+
+    @asynccontextmanager
+    async def _acquire(self):
+        """Hold the shared connection for one transaction, recording wait time and usage."""
+        DB_WAITING.inc()
+        started = time.perf_counter()
+        try:
+            await self._conn_lock.acquire()
+        finally:
+            DB_WAITING.dec()
+        DB_WAIT.observe(time.perf_counter() - started)
+        DB_CONNECTIONS.labels("in_use").inc()
+        try:
+            yield
+        finally:
+            DB_CONNECTIONS.labels("in_use").dec()
+            self._conn_lock.release()
+
+    @staticmethod
+    def _return_columns(query: str) -> tuple[str | None, int | None, int | None]:
+        """
+        Return (RETURN text, RETURN column count, AS (...) column count) for a $$-wrapped query.
+        Counts are None when the Cypher body has no RETURN or the query has no AS (...) clause.
+        """
+        dollar_parts = query.split('$$')
+        if len(dollar_parts) < 3:
+            return None, None, None
+        ret_m = re.search(r'RETURN\s+(.*?)$', dollar_parts[1], re.IGNORECASE | re.DOTALL)
+        as_m = re.search(r'AS\s*\(([^)]+)\)\s*;?\s*$', query, re.IGNORECASE)
+        if not ret_m:
+            return None, None, None
+
+        # Count RETURN columns (split by comma, but respect function calls)
+        ret_text = ret_m.group(1).strip().rstrip(';')
+        # Simple split: count top-level commas (not inside parens)
+        depth = 0
+        ret_col_count = 1
+        for ch in ret_text:
+            if ch == '(':
+                depth += 1
+            elif ch == ')':
+                depth -= 1
+            elif ch == ',' and depth == 0:
+                ret_col_count += 1
+
+        as_col_count = len(as_m.group(1).strip().split(',')) if as_m else None
+        return ret_text, ret_col_count, as_col_count
+
     @staticmethod
     def _normalize_cypher_query(query: str, graph_name: str | None = None) -> str:
         """
@@ -134,7 +254,9 @@ class PGAgeHelper:
         #    Fix: extract body, wrap with $$ + proper AS clause
 
         # Strip backslash-escaped quotes that some models produce: \' → '
+        before = query
         query = query.replace("\\'", "'")
+        count_rewrite("escaped_quotes", before, query)
 
         # Pattern A: cypher('graph_name', 'MATCH...') — body as 2nd arg in single quotes
         m_quoted_body = re.search(
@@ -154,6 +276,7 @@ class PGAgeHelper:
                 as_cols = "result ag_catalog.agtype"
             query = f"SELECT * FROM ag_catalog.cypher('{gn}', $${cypher_body}$$) AS ({as_cols});"
             print(f"[normalize] Fixed single-quoted body (pattern A): {query[:200]}...")
+            NORMALIZER_REWRITES.labels("quoted_body").inc()
 
         # Pattern B: cypher('MATCH...') — body as 1st arg (no graph name)
         elif not m_quoted_body:
@@ -173,23 +296,32 @@ class PGAgeHelper:
                     as_cols = "result ag_catalog.agtype"
                 query = f"SELECT * FROM ag_catalog.cypher('{graph_name}', $${cypher_body}$$) AS ({as_cols});"
                 print(f"[normalize] Fixed missing $$ wrapper (pattern B): {query[:200]}...")
+                NORMALIZER_REWRITES.labels("missing_dollar_wrapper").inc()
 
         # 1. Ensure ag_catalog.cypher() prefix
+        before = query
         #    Also fix: graph_name.cypher('...') → ag_catalog.cypher('graph_name', $$...$$)
         query = re.sub(r'\b\w+\.cypher\s*\(', 'ag_catalog.cypher(', query, flags=re.IGNORECASE)
         pattern = r'\b(FROM|JOIN)\s+cypher\s*\('
         replacement = r'\1 ag_catalog.cypher('
         query = re.sub(pattern, replacement, query, flags=re.IGNORECASE)
+        count_rewrite("cypher_prefix", before, query)
 
         # 2. Remove DATE keyword before string literals inside Cypher body
         #    e.g., DATE '2022-01-01' → '2022-01-01'
+        before = query
         query = re.sub(r'\bDATE\s+(\'[^\']+\')', r'\1', query, flags=re.IGNORECASE)
+        count_rewrite("date_keyword", before, query)
 
         # 3. Remove date() function calls — date('2022-01-01') → '2022-01-01'
+        before = query
         query = re.sub(r'\bdate\s*\(\s*(\'[^\']+\')\s*\)', r'\1', query, flags=re.IGNORECASE)
+        count_rewrite("date_function", before, query)
 
         # 4. Remove type casts like ::date, ::text, ::integer, ::bigint
+        before = query
         query = re.sub(r'::(date|text|integer|bigint|int|varchar|numeric)\b', '', query, flags=re.IGNORECASE)
+        count_rewrite("type_cast", before, query)
 
         # 5. Fix column types in AS (...) clause — replace int/bigint/text/integer/agtype with ag_catalog.agtype
         #    Also fix: AS t(col1 text) → AS (col1 ag_catalog.agtype)
@@ -210,45 +342,28 @@ class PGAgeHelper:
             return as_block
 
         # Find AS ... (...) after $$) — handle both AS (...) and AS alias(...)
+        before = query
         query = re.sub(r'\bAS\s+\w*\s*\([^)]+\)', fix_as_clause, query)
+        count_rewrite("as_column_types", before, query)
 
         # 5b. Fix column count mismatch — count RETURN aliases vs AS columns
         #     If they don't match, rebuild AS clause from RETURN
-        dollar_parts = query.split('$$')
-        if len(dollar_parts) >= 3:
-            cypher_body = dollar_parts[1]
-            ret_m = re.search(r'RETURN\s+(.*?)$', cypher_body, re.IGNORECASE | re.DOTALL)
-            as_m = re.search(r'AS\s*\(([^)]+)\)\s*;?\s*$', query, re.IGNORECASE)
-            if ret_m and as_m:
-                # Count RETURN columns (split by comma, but respect function calls)
-                ret_text = ret_m.group(1).strip().rstrip(';')
-                # Simple split: count top-level commas (not inside parens)
-                depth = 0
-                ret_col_count = 1
-                for ch in ret_text:
-                    if ch == '(':
-                        depth += 1
-                    elif ch == ')':
-                        depth -= 1
-                    elif ch == ',' and depth == 0:
-                        ret_col_count += 1
-
-                as_text = as_m.group(1).strip()
-                as_col_count = len(as_text.split(','))
-
-                if ret_col_count != as_col_count:
-                    # Rebuild AS clause from RETURN aliases
-                    aliases = re.findall(r'\bAS\s+(\w+)', ret_text, re.IGNORECASE)
-                    if not aliases or len(aliases) != ret_col_count:
-                        aliases = [f"col{i+1}" for i in range(ret_col_count)]
-                    new_as = ", ".join(f"{a} ag_catalog.agtype" for a in aliases)
-                    query = re.sub(r'AS\s*\([^)]+\)\s*;?\s*$', f'AS ({new_as});', query, flags=re.IGNORECASE)
-                    print(f"[normalize] Fixed AS column count: {as_col_count} → {ret_col_count}")
+        ret_text, ret_col_count, as_col_count = PGAgeHelper._return_columns(query)
+        if ret_text is not None and as_col_count is not None and ret_col_count != as_col_count:
+            # Rebuild AS clause from RETURN aliases
+            aliases = re.findall(r'\bAS\s+(\w+)', ret_text, re.IGNORECASE)
+            if not aliases or len(aliases) != ret_col_count:
+                aliases = [f"col{i+1}" for i in range(ret_col_count)]
+            new_as = ", ".join(f"{a} ag_catalog.agtype" for a in aliases)
+            query = re.sub(r'AS\s*\([^)]+\)\s*;?\s*$', f'AS ({new_as});', query, flags=re.IGNORECASE)
+            print(f"[normalize] Fixed AS column count: {as_col_count} → {ret_col_count}")
+            NORMALIZER_REWRITES.labels("as_column_count").inc()
 
         # 6. Fix outer SELECT — ensure it's SELECT * FROM ag_catalog.cypher
         #    e.g., SELECT cnt FROM → SELECT * FROM
         #    Only apply if the query has ag_catalog.cypher
         if 'ag_catalog.cypher' in query.lower():
+            before = query
             query = re.sub(
                 r'^\s*SELECT\s+(?!\*\s+FROM)[^*].*?\s+FROM\s+ag_catalog\.cypher',
                 'SELECT * FROM ag_catalog.cypher',
@@ -256,11 +371,12 @@ class PGAgeHelper:
                 count=1,
                 flags=re.IGNORECASE | re.DOTALL
             )
+            count_rewrite("outer_select", before, query)
 
         # 7. Strip // and -- comments from inside Cypher body (between $$ delimiters)
         dollar_parts = query.split('$$')
         if len(dollar_parts) >= 3:
-            cypher_body = dollar_parts[1]
+            cypher_body = before = dollar_parts[1]
             # Remove // comments
             cypher_body = re.sub(r'//[^\n]*', '', cypher_body)
             # Remove -- comments
@@ -269,16 +385,19 @@ class PGAgeHelper:
             cypher_body = re.sub(r'/\*.*?\*/', '', cypher_body, flags=re.DOTALL)
             # Remove trailing semicolons inside Cypher body
             cypher_body = re.sub(r';\s*$', '', cypher_body.rstrip())
+            count_rewrite("comments_semicolon", before.rstrip(), cypher_body)
 
             # 7b. Fix IN ('a','b') → IN ['a','b'] (Cypher uses square brackets)
             def fix_in_parens(m: re.Match) -> str:
                 return f"IN [{m.group(1)}]"
+            before = cypher_body
             cypher_body = re.sub(
                 r"\bIN\s*\(\s*('[^)]*')\s*\)",
                 fix_in_parens,
                 cypher_body,
                 flags=re.IGNORECASE
             )
+            count_rewrite("in_parens", before, cypher_body)
 
             dollar_parts[1] = cypher_body
             query = '$$'.join(dollar_parts)
@@ -287,7 +406,7 @@ class PGAgeHelper:
         #    p.name ILIKE '%text%' → toLower(coalesce(p.name, '')) CONTAINS toLower('text')
         dollar_parts = query.split('$$')
         if len(dollar_parts) >= 3:
-            cypher_body = dollar_parts[1]
+            cypher_body = before = dollar_parts[1]
             def ilike_to_contains(m: re.Match) -> str:
                 prop = m.group(1).strip()
                 text = m.group(2).strip().strip('%')
@@ -298,6 +417,7 @@ class PGAgeHelper:
                 cypher_body,
                 flags=re.IGNORECASE
             )
+            count_rewrite("ilike", before, cypher_body)
 
             # 8b. Fix WHERE var:Label → move label into MATCH
             #     Patterns: WHERE m:City_Council_Meeting AND ...
@@ -305,6 +425,7 @@ class PGAgeHelper:
             #     AGE doesn't support label checks in WHERE — they must be in MATCH
             #     Simple fix: remove label predicates from WHERE (they're redundant
             #     if the MATCH already constrains the label, or can't be fixed automatically)
+            before = cypher_body
             cypher_body = re.sub(
                 r'\bWHERE\s+(\w+):(\w+)\s+AND\s+',
                 r'WHERE ',
@@ -339,10 +460,12 @@ class PGAgeHelper:
                 cypher_body,
                 flags=re.IGNORECASE
             )
+            count_rewrite("where_label", before, cypher_body)
 
             # 8d. Fix missing payload. prefix on property access
             #     Common OSS error: c.id → c.payload.id, c.name → c.payload.name
             #     Only fix if NOT already preceded by "payload."
+            before = cypher_body
             cypher_body = re.sub(
                 r'(?<!payload\.)(?<!payload\.attributes\.)\b(\w+)\.id\b(?!entifier)',
                 r'\1.payload.id',
@@ -355,6 +478,7 @@ class PGAgeHelper:
             )
             # Avoid double-fixing: payload.payload.id → payload.id
             cypher_body = cypher_body.replace('.payload.payload.', '.payload.')
+            count_rewrite("payload_prefix", before, cypher_body)
 
             dollar_parts[1] = cypher_body
             query = '$$'.join(dollar_parts)
@@ -369,47 +493,433 @@ class PGAgeHelper:
         replacement = f"ag_catalog.cypher('{graph_name}',"
         return re.sub(pattern, replacement, query, flags=re.IGNORECASE)
 
-    async def query_using_sql_cypher(self, query: str, graph_name: str | None = None) -> list[dict]:
-        query = self._normalize_cypher_query(query, graph_name)
-        query = self._apply_graph_name(query, graph_name)
-        print("Executing query:\n", query)
+    @staticmethod
+    def _with_cypher_limit(query: str, limit: int) -> str | None:
+        """Append `LIMIT n` to the Cypher body between $$ delimiters.
+        Returns None if the query has no $$ body or the body already ends with a LIMIT."""
+        dollar_parts = query.split('$$')
+        if len(dollar_parts) < 3:
+            return None
+        cypher_body = dollar_parts[1].rstrip()
+        if re.search(r'\bLIMIT\s+\S+$', cypher_body, re.IGNORECASE):
+            return None
+        dollar_parts[1] = f"{cypher_body}\nLIMIT {int(limit)}\n"
+        return '$$'.join(dollar_parts)
 
-        max_retries = 2
-        for attempt in range(max_retries):
+    @staticmethod
+    def _prepare_query(query: str, graph_name: str | None) -> str:
+        """Normalize LLM-generated SQL and pin the graph name — the exact text that gets executed."""
+        query = PGAgeHelper._normalize_cypher_query(query, graph_name)
+        return PGAgeHelper._apply_graph_name(query, graph_name)
+
+    async def _explain_plan(self, cur: psycopg.AsyncCursor, query: str) -> dict:
+        """Run EXPLAIN (FORMAT JSON) without executing the query and return the top plan node."""
+        await cur.execute(f"EXPLAIN (FORMAT JSON) {query.strip().rstrip(';')}")
+        row = await cur.fetchone()
+        plan_json = next(iter(row.values()))
+        if isinstance(plan_json, str):
+            plan_json = json.loads(plan_json)
+        return plan_json[0]["Plan"]
+
+    async def _explain_estimate(self, cur: psycopg.AsyncCursor, query: str) -> tuple[float, float]:
+        """Return the planner's (total_cost, plan_rows) for the top plan node."""
+        plan = await self._explain_plan(cur, query)
+        return float(plan.get("Total Cost", 0.0)), float(plan.get("Plan Rows", 0.0))
+
+    @staticmethod
+    def _plan_scans(plan: dict) -> tuple[list[dict], list[str]]:
+        """Walk a JSON plan tree and return (indexes used, relations read by sequential scan)."""
+        indexes: list[dict] = []
+        seq_scans: list[str] = []
+        stack = [plan]
+        while stack:
+            node = stack.pop()
+            if node.get("Index Name"):
+                indexes.append({
+                    "index": node["Index Name"],
+                    "relation": node.get("Relation Name"),
+                    "scan": node.get("Node Type"),
+                })
+            elif node.get("Node Type") == "Seq Scan" and node.get("Relation Name"):
+                seq_scans.append(node["Relation Name"])
+            stack.extend(node.get("Plans", []))
+        return indexes, seq_scans
+
+    async def _guard_query(self, cur: psycopg.AsyncCursor, query: str, graph_name: str | None, tool: str | None) -> str:
+        """
+        Cost guard for LLM-generated SQL. Queries estimated to return more than max_rows get a
+        LIMIT appended to the Cypher body when that brings them under max_cost; anything still
+        above max_cost is rejected. Returns the (possibly limited) query to execute.
+        """
+        max_cost, max_rows = _guard_limits(graph_name)
+        cost, rows = await self._explain_estimate(cur, query)
+        print(f"[guard] estimated cost={cost:.0f} rows={rows:.0f} (max_cost={max_cost:.0f}, max_rows={max_rows})")
+
+        if rows > max_rows:
+            limited = self._with_cypher_limit(query, max_rows)
+            if limited is not None:
+                limited_cost, _ = await self._explain_estimate(cur, limited)
+                if limited_cost <= max_cost:
+                    GUARD_STATS[("auto_limited", tool)] += 1
+                    GUARD_OUTCOMES.labels("auto_limited", tool or "").inc()
+                    logger.info(f"[guard] Auto-limited query to {max_rows} rows (estimated {rows:.0f})")
+                    return limited
+
+        if cost > max_cost:
+            GUARD_STATS[("rejected", tool)] += 1
+            GUARD_OUTCOMES.labels("rejected", tool or "").inc()
+            logger.warning(f"[guard] Rejected query: estimated cost {cost:.0f} > {max_cost:.0f}")
+            raise QueryGuardError(
+                "too_expensive",
+                f"Query too expensive: estimated cost {cost:.0f} exceeds the limit of {max_cost:.0f} "
+                f"for graph '{graph_name}' (estimated rows: {rows:.0f}).",
+                "Add a node label to every MATCH pattern, bound variable-length patterns (e.g. [*1..2]), "
+                "filter on an indexed property, or add a LIMIT.",
+                estimated_cost=cost,
+                estimated_rows=rows,
+                max_cost=max_cost,
+            )
+        return query
+
+    async def explain_query(self, query: str, graph_name: str | None = None, *, tool: str | None = "explain_query") -> dict:
+        """
+        Normalize a query exactly like query_using_sql_cypher and run EXPLAIN on it without
+        executing it. Returns parse errors, the RETURN/AS column count check, the planner's
+        estimated rows and cost, the indexes used and whether the cost guard would accept it.
+        """
+        normalized = self._prepare_query(query, graph_name)
+        _, ret_col_count, as_col_count = self._return_columns(normalized)
+        max_cost, max_rows = _guard_limits(graph_name)
+        result: dict[str, Any] = {
+            "ok": False,
+            "normalized_sql": normalized,
+            "rewritten": normalized.strip() != query.strip(),
+            "as_column_check": {
+                "return_columns": ret_col_count,
+                "as_columns": as_col_count,
+                "match": ret_col_count is None or as_col_count is None or ret_col_count == as_col_count,
+            },
+        }
+
+        async with self._acquire():
+            await self._ensure_connected()
             try:
-                # Ensure connection is alive before executing
-                await self._ensure_connected()
-                
                 async with self._conn.cursor() as cur:
-                    # Ensure search path includes ag_catalog
                     await cur.execute('SET search_path = ag_catalog, "$user", public;')
-                    await cur.execute(query)
-                    rows = await cur.fetchall()
-                    print("Raw rows:", rows)
-                    return rows
-            except psycopg.OperationalError as e:
-                logger.error(f"Connection error on attempt {attempt + 1}/{max_retries}: {e}")
-                logger.error(f"Failed query: {query[:300]}...")
-                if attempt < max_retries - 1:
-                    logger.info("Attempting to reconnect and retry...")
+                    await cur.execute(f"SET LOCAL statement_timeout = {_statement_timeout_ms(tool)};")
+                    plan = await self._explain_plan(cur, normalized)
+            except psycopg.Error as e:
+                diag = getattr(e, "diag", None)
+                result["error"] = {
+                    "sqlstate": getattr(e, "sqlstate", None),
+                    "message": (getattr(diag, "message_primary", None) or str(e)).strip(),
+                    "hint": getattr(diag, "message_hint", None),
+                }
+                return result
+            finally:
+                try:
+                    await self._conn.rollback()
+                except Exception:
+                    pass
+
+        cost = float(plan.get("Total Cost", 0.0))
+        rows = float(plan.get("Plan Rows", 0.0))
+        indexes, seq_scans = self._plan_scans(plan)
+        result.update({
+            "ok": result["as_column_check"]["match"],
+            "estimated_cost": cost,
+            "estimated_rows": rows,
+            "indexes_used": indexes,
+            "seq_scans": sorted(set(seq_scans)),
+            "within_guard_limits": cost <= max_cost,
+            "guard_limits": {"max_cost": max_cost, "max_rows": max_rows},
+        })
+        return result
+
+    @staticmethod
+    def query_key(prepared_query: str, graph_name: str | None) -> str:
+        """Stable key for a normalized query — shared by probe, count and full executions."""
+        text = f"{graph_name or ''}\n{' '.join(prepared_query.split())}"
+        return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+    def _cache_get(self, key: str) -> list[dict] | None:
+        entry = self._result_cache.get(key)
+        if entry is None:
+            RESULT_CACHE.labels("miss").inc()
+            return None
+        stored_at, rows = entry
+        if time.monotonic() - stored_at > RESULT_CACHE_TTL_S:
+            self._result_cache.pop(key, None)
+            RESULT_CACHE.labels("expired").inc()
+            return None
+        self._result_cache.move_to_end(key)
+        RESULT_CACHE.labels("hit").inc()
+        return rows
+
+    def _cache_put(self, key: str, rows: list[dict]) -> None:
+        self._result_cache[key] = (time.monotonic(), rows)
+        self._result_cache.move_to_end(key)
+        while len(self._result_cache) > RESULT_CACHE_SIZE:
+            self._result_cache.popitem(last=False)
+
+    async def query_using_sql_cypher(
+        self,
+        query: str,
+        graph_name: str | None = None,
+        *,
+        tool: str | None = None,
+        session_id: str | None = None,
+        guard: bool = False,
+    ) -> list[dict]:
+        """
+        Normalize and execute a SQL/Cypher statement.
+        Every statement runs under the tool's statement_timeout; with guard=True the statement
+        is first checked by the EXPLAIN-based cost guard. Raises QueryGuardError when the
+        statement is rejected or cancelled by the timeout.
+        A complete result already produced by probe_query() for the same SQL is reused.
+        """
+        query = self._prepare_query(query, graph_name)
+        key = self.query_key(query, graph_name)
+        cached = self._cache_get(key)
+        if cached is not None:
+            print(f"Reusing complete probe result for query {key} ({len(cached)} rows)")
+            return cached
+        return await self._execute(query, graph_name, tool=tool, session_id=session_id, guard=guard)
+
+    async def probe_query(
+        self,
+        query: str,
+        graph_name: str | None = None,
+        *,
+        limit: int = PROBE_ROW_LIMIT,
+        tool: str | None = None,
+        session_id: str | None = None,
+    ) -> dict:
+        """
+        Run a query only far enough to see whether it parses, runs and returns rows.
+        A LIMIT of limit+1 is appended to the Cypher body (or wrapped around the SQL when the
+        body already ends in a LIMIT) so has_more can be reported. When the probe returned
+        every row, the rows are cached so a later full execution of the same SQL is free.
+        """
+        prepared = self._prepare_query(query, graph_name)
+        key = self.query_key(prepared, graph_name)
+        rows = self._cache_get(key)
+        if rows is None:
+            limited = self._with_cypher_limit(prepared, limit + 1)
+            if limited is None:
+                limited = f"SELECT * FROM ({prepared.strip().rstrip(';')}) AS _probe LIMIT {int(limit) + 1};"
+            rows = await self._execute(limited, graph_name, tool=tool, session_id=session_id, guard=True)
+            if len(rows) <= limit:
+                self._cache_put(key, rows)
+        return {
+            "mode": "probe",
+            "query_key": key,
+            "rows": rows[:limit],
+            "row_count": min(len(rows), limit),
+            "has_more": len(rows) > limit,
+        }
+
+    async def count_query(
+        self,
+        query: str,
+        graph_name: str | None = None,
+        *,
+        tool: str | None = None,
+        session_id: str | None = None,
+    ) -> dict:
+        """Return only the number of rows a query produces (answered from the cache when possible)."""
+        prepared = self._prepare_query(query, graph_name)
+        key = self.query_key(prepared, graph_name)
+        cached = self._cache_get(key)
+        if cached is not None:
+            return {"mode": "count", "query_key": key, "count": len(cached)}
+        count_sql = f"SELECT count(*) AS count FROM ({prepared.strip().rstrip(';')}) AS _count;"
+        rows = await self._execute(count_sql, graph_name, tool=tool, session_id=session_id, guard=True)
+        return {"mode": "count", "query_key": key, "count": int(rows[0]["count"]) if rows else 0}
+
+    async def find_paths(
+        self,
+        graph_name: str,
+        source: dict,
+        target: dict,
+        *,
+        tool: str | None = "find_paths",
+        session_id: str | None = None,
+        **options: Any,
+    ) -> dict:
+        """
+        graph_paths.find_paths in one read-only transaction on the shared connection, under the
+        tool's statement_timeout. A timeout is raised as QueryGuardError like any other statement.
+        """
+        timeout_ms = _statement_timeout_ms(tool)
+        with start_span("db.find_paths", kind="client", stage="db", tool=tool, graph=graph_name) as span:
+            async with self._acquire():
+                await self._ensure_connected()
+                started = time.perf_counter()
+                try:
+                    async with self._conn.cursor() as cur:
+                        await cur.execute('SET search_path = ag_catalog, "$user", public;')
+                        await cur.execute(f"SET LOCAL statement_timeout = {timeout_ms};")
+                        result = await graph_paths.find_paths(cur, graph_name, source, target, **options)
+                except psycopg.errors.QueryCanceled as e:
+                    GUARD_STATS[("timed_out", tool)] += 1
+                    GUARD_OUTCOMES.labels("timed_out", tool or "").inc()
+                    raise QueryGuardError(
+                        "timeout",
+                        f"Path search cancelled: it ran longer than the {timeout_ms} ms statement_timeout.",
+                        "Lower max_depth, restrict edge_types, or pick more specific endpoints.",
+                        timeout_ms=timeout_ms,
+                    ) from e
+                finally:
                     try:
-                        await self._reconnect()
-                    except Exception as reconnect_error:
-                        logger.error(f"Reconnection failed: {reconnect_error}")
+                        await self._conn.rollback()
+                    except Exception:
+                        pass
+            latency_ms = (time.perf_counter() - started) * 1000
+            DB_QUERY_LATENCY.labels(tool or "").observe(latency_ms / 1000)
+            DB_ROWS_RETURNED.labels(tool or "").observe(len(result["paths"]))
+            QUERY_LOG.record(
+                query=f"graph_paths.find_paths levels={result['stats']['levels']}", tool=tool,
+                session_id=session_id, graph=graph_name, latency_ms=latency_ms,
+                rows=len(result["paths"]), nbytes=result_bytes(result["paths"]),
+            )
+            span.set_attribute("levels", result["stats"]["levels"])
+            span.set_attribute("rows", len(result["paths"]))
+            return result
+
+    async def _execute(
+        self,
+        query: str,
+        graph_name: str | None,
+        *,
+        tool: str | None = None,
+        session_id: str | None = None,
+        guard: bool = False,
+    ) -> list[dict]:
+        """
+        Execute an already-prepared statement with timeout, optional cost guard and reconnect/retry.
+        Each executed statement is recorded in QUERY_LOG; sampled slow ones get a plan capture.
+        """
+        timeout_ms = _statement_timeout_ms(tool)
+        print("Executing query:\n", query)
+
+        with start_span("db.statement", kind="client", stage="db", tool=tool, graph=graph_name) as span:
+            async with self._acquire():
+                max_retries = 2
+                for attempt in range(max_retries):
+                    try:
+                        # Ensure connection is alive before executing
+                        await self._ensure_connected()
+                
+                        async with self._conn.cursor() as cur:
+                            # Ensure search path includes ag_catalog
+                            await cur.execute('SET search_path = ag_catalog, "$user", public;')
+                            # SET LOCAL only lasts for this transaction, which is closed below
+                            await cur.execute(f"SET LOCAL statement_timeout = {timeout_ms};")
+                            if guard:
+                                query = await self._guard_query(cur, query, graph_name, tool)
+                            started = time.perf_counter()
+                            await cur.execute(query)
+                            rows = await cur.fetchall()
+                            latency_ms = (time.perf_counter() - started) * 1000
+                            print("Raw rows:", rows)
+                            DB_QUERY_LATENCY.labels(tool or "").observe(latency_ms / 1000)
+                            DB_ROWS_RETURNED.labels(tool or "").observe(len(rows))
+                        # Read-only path: end the transaction so the timeout and snapshot don't leak
+                        await self._conn.rollback()
+                        rec = QUERY_LOG.record(
+                            query=query, tool=tool, session_id=session_id, graph=graph_name,
+                            latency_ms=latency_ms, rows=len(rows), nbytes=result_bytes(rows),
+                        )
+                        span.set_attribute("fingerprint", rec["fingerprint"])
+                        span.set_attribute("rows", len(rows))
+                        if QUERY_LOG.should_capture(rec):
+                            self._schedule_plan_capture(query, rec["fingerprint"], timeout_ms)
+                        return rows
+                    except psycopg.errors.QueryCanceled as e:
+                        # statement_timeout fired — must be caught before OperationalError (its base class)
+                        GUARD_STATS[("timed_out", tool)] += 1
+                        GUARD_OUTCOMES.labels("timed_out", tool or "").inc()
+                        QUERY_LOG.record(
+                            query=query, tool=tool, session_id=session_id, graph=graph_name,
+                            latency_ms=float(timeout_ms), rows=0, nbytes=0,
+                        )
+                        logger.warning(f"[guard] Statement cancelled after {timeout_ms} ms (tool={tool}): {e}")
+                        try:
+                            await self._conn.rollback()
+                        except Exception:
+                            pass
+                        raise QueryGuardError(
+                            "timeout",
+                            f"Query cancelled: it ran longer than the {timeout_ms} ms statement_timeout.",
+                            "Query too expensive: add a label or LIMIT, bound variable-length patterns, "
+                            "or filter on an indexed property.",
+                            timeout_ms=timeout_ms,
+                        ) from e
+                    except QueryGuardError:
+                        try:
+                            await self._conn.rollback()
+                        except Exception:
+                            pass
                         raise
-                else:
-                    logger.error("Max retries reached, giving up.")
-                    raise
+                    except psycopg.OperationalError as e:
+                        logger.error(f"Connection error on attempt {attempt + 1}/{max_retries}: {e}")
+                        logger.error(f"Failed query: {query[:300]}...")
+                        if attempt < max_retries - 1:
+                            logger.info("Attempting to reconnect and retry...")
+                            try:
+                                await self._reconnect()
+                            except Exception as reconnect_error:
+                                logger.error(f"Reconnection failed: {reconnect_error}")
+                                raise
+                        else:
+                            logger.error("Max retries reached, giving up.")
+                            raise
+                    except Exception as e:
+                        logger.error(f"Error executing query: {e}")
+                        logger.error(f"Failed query: {query[:500]}")
+                        try:
+                            logger.info("Attempting to rollback transaction...")
+                            await self._conn.rollback()
+                            logger.info("Rollback successful.")
+                        except Exception:
+                            pass
+                        raise
+
+    def _schedule_plan_capture(self, query: str, fingerprint: str, timeout_ms: int) -> None:
+        """Capture the plan in the background so the tool call returns without waiting for it."""
+        if self._capture_lock.locked():
+            return  # one capture at a time; the next slow run of this shape gets sampled again
+        task = asyncio.create_task(self._capture_plan(query, fingerprint, timeout_ms))
+        self._capture_tasks.add(task)
+        task.add_done_callback(self._capture_tasks.discard)
+
+    async def _capture_plan(self, query: str, fingerprint: str, timeout_ms: int) -> None:
+        """Run EXPLAIN (ANALYZE, BUFFERS) for a slow statement on the capture connection and attach the plan."""
+        async with self._capture_lock:
+            try:
+                if self._capture_conn is None or self._capture_conn.closed or self._capture_conn.broken:
+                    self._capture_conn = await self._create_connection()
+                started = time.perf_counter()
+                async with self._capture_conn.cursor() as cur:
+                    await cur.execute('SET search_path = ag_catalog, "$user", public;')
+                    await cur.execute(f"SET LOCAL statement_timeout = {timeout_ms};")
+                    await cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query.strip().rstrip(';')}")
+                    row = await cur.fetchone()
+                # ANALYZE executes the statement: never keep its effects
+                await self._capture_conn.rollback()
+                plan = next(iter(row.values()))
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                QUERY_LOG.attach_plan(fingerprint, plan[0] if isinstance(plan, list) else plan,
+                                      latency_ms=(time.perf_counter() - started) * 1000)
+                logger.info(f"[query_log] Captured EXPLAIN ANALYZE for fp={fingerprint}")
             except Exception as e:
-                logger.error(f"Error executing query: {e}")
-                logger.error(f"Failed query: {query[:500]}")
+                logger.warning(f"[query_log] Plan capture failed for fp={fingerprint}: {e}")
                 try:
-                    logger.info("Attempting to rollback transaction...")
-                    await self._conn.rollback()
-                    logger.info("Rollback successful.")
+                    if self._capture_conn is not None:
+                        await self._capture_conn.rollback()
                 except Exception:
                     pass
-                raise
 
    
 
@@ -0,0 +1,213 @@
+# query_log.py
+"""
+Per-statement instrumentation for PGAgeHelper.
+
+Every executed statement is recorded (tool, session, graph, query fingerprint, latency,
+rows, bytes) into in-memory aggregates keyed by query shape. Statements slower than
+SLOW_QUERY_MS are appended to logs/slow_queries.jsonl (rotated at SLOW_QUERY_LOG_MAX_BYTES);
+a sample of them also get an EXPLAIN (ANALYZE, BUFFERS) plan captured by PGAgeHelper and
+attached to their shape. Per-statement log lines are DEBUG.
+"""
+
+import os, json, re, time, random, hashlib, logging, threading
+from collections import OrderedDict
+from typing import Any
+
+logger = logging.getLogger("age_mcp")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "1000"))
+# Fraction of slow statements that get an EXPLAIN (ANALYZE, BUFFERS) capture
+SLOW_QUERY_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_SAMPLE_RATE", "0.2"))
+# At most one plan capture per query shape in this window
+SLOW_QUERY_CAPTURE_INTERVAL_S = float(os.getenv("SLOW_QUERY_CAPTURE_INTERVAL_S", "300"))
+SLOW_QUERY_MAX_SHAPES = int(os.getenv("SLOW_QUERY_MAX_SHAPES", "1000"))
+SLOW_QUERY_LOG_FILE = os.getenv("SLOW_QUERY_LOG_FILE") or os.path.join(
+    os.path.dirname(__file__), "logs", "slow_queries.jsonl"
+)
+# The slow-query file is rotated to .1, .2, ... at this size, keeping this many old files;
+# startup reloads aggregates from the current file only
+SLOW_QUERY_LOG_MAX_BYTES = int(os.getenv("SLOW_QUERY_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+SLOW_QUERY_LOG_BACKUPS = int(os.getenv("SLOW_QUERY_LOG_BACKUPS", "3"))
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_LIST_LITERAL = re.compile(r"\[\s*\?(?:\s*,\s*\?)*\s*\]")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def query_shape(query: str) -> str:
+    """Replace literals so statements that differ only by values share one shape."""
+    shape = _STRING_LITERAL.sub("?", query)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _LIST_LITERAL.sub("[?]", shape)
+    return _WHITESPACE.sub(" ", shape).strip().rstrip(";")
+
+
+def fingerprint(query: str) -> tuple[str, str]:
+    """Return (fingerprint, shape) for a statement."""
+    shape = query_shape(query)
+    return hashlib.sha1(shape.encode("utf-8")).hexdigest()[:16], shape
+
+
+def result_bytes(rows: list[dict]) -> int:
+    """Approximate result size: total length of the returned values' text form."""
+    return sum(len(v) if isinstance(v, str) else len(str(v)) for row in rows for v in row.values())
+
+
+class QueryLog:
+    """In-memory per-shape aggregates plus a JSONL file of slow statements."""
+
+    def __init__(self, path: str = SLOW_QUERY_LOG_FILE, slow_ms: float = SLOW_QUERY_MS,
+                 sample_rate: float = SLOW_QUERY_SAMPLE_RATE, max_shapes: int = SLOW_QUERY_MAX_SHAPES,
+                 max_bytes: int = SLOW_QUERY_LOG_MAX_BYTES, backups: int = SLOW_QUERY_LOG_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.max_shapes = max_shapes
+        self._shapes: OrderedDict[str, dict[str, Any]] = OrderedDict()
+        self._file_lock = threading.Lock()
+        self._load()
+
+    def _shape_entry(self, fp: str, shape: str) -> dict[str, Any]:
+        entry = self._shapes.get(fp)
+        if entry is None:
+            entry = {
+                "fingerprint": fp, "shape": shape[:2000], "calls": 0, "slow_calls": 0,
+                "total_ms": 0.0, "max_ms": 0.0, "rows": 0, "bytes": 0,
+                "tools": [], "graphs": [], "last_seen": None, "sample_sql": None,
+                "plan": None, "plan_captured_at": None,
+            }
+            self._shapes[fp] = entry
+            while len(self._shapes) > self.max_shapes:
+                self._shapes.popitem(last=False)
+        self._shapes.move_to_end(fp)
+        return entry
+
+    def record(self, *, query: str, tool: str | None, session_id: str | None, graph: str | None,
+               latency_ms: float, rows: int, nbytes: int) -> dict[str, Any]:
+        """Record one executed statement. Returns the record (with fingerprint and `slow` flag)."""
+        fp, shape = fingerprint(query)
+        rec = {
+            "ts": time.time(), "tool": tool, "session_id": session_id, "graph": graph,
+            "fingerprint": fp, "latency_ms": round(latency_ms, 2), "rows": rows, "bytes": nbytes,
+            "slow": latency_ms >= self.slow_ms,
+        }
+        logger.debug(
+            f"[query] tool={tool} sid={session_id} graph={graph} fp={fp} "
+            f"ms={latency_ms:.1f} rows={rows} bytes={nbytes}"
+        )
+
+        entry = self._shape_entry(fp, shape)
+        entry["calls"] += 1
+        entry["total_ms"] += latency_ms
+        entry["max_ms"] = max(entry["max_ms"], latency_ms)
+        entry["rows"] += rows
+        entry["bytes"] += nbytes
+        entry["last_seen"] = rec["ts"]
+        if tool and tool not in entry["tools"]:
+            entry["tools"].append(tool)
+        if graph and graph not in entry["graphs"]:
+            entry["graphs"].append(graph)
+
+        if rec["slow"]:
+            entry["slow_calls"] += 1
+            entry["sample_sql"] = query[:4000]
+            self._append({**rec, "shape": entry["shape"], "sql": entry["sample_sql"]})
+        return rec
+
+    def should_capture(self, rec: dict[str, Any]) -> bool:
+        """Sample slow statements for an EXPLAIN (ANALYZE, BUFFERS) capture, at most once per interval per shape."""
+        if not rec.get("slow") or random.random() >= self.sample_rate:
+            return False
+        entry = self._shapes.get(rec["fingerprint"])
+        last = entry.get("plan_captured_at") if entry else None
+        return last is None or time.time() - last >= SLOW_QUERY_CAPTURE_INTERVAL_S
+
+    def attach_plan(self, fp: str, plan: Any, latency_ms: float | None = None) -> None:
+        entry = self._shapes.get(fp)
+        if entry is None:
+            return
+        entry["plan"] = plan
+        entry["plan_captured_at"] = time.time()
+        self._append({"ts": entry["plan_captured_at"], "fingerprint": fp, "shape": entry["shape"],
+                      "plan": plan, "explain_ms": latency_ms})
+
+    def top(self, n: int = 10, order_by: str = "max_ms") -> list[dict[str, Any]]:
+        """Top-N query shapes by max_ms, mean_ms, total_ms or calls."""
+        shapes = []
+        for entry in self._shapes.values():
+            item = dict(entry)
+            item["mean_ms"] = round(entry["total_ms"] / entry["calls"], 2) if entry["calls"] else 0.0
+            item["total_ms"] = round(entry["total_ms"], 2)
+            item["max_ms"] = round(entry["max_ms"], 2)
+            shapes.append(item)
+        key = order_by if order_by in {"max_ms", "mean_ms", "total_ms", "calls", "slow_calls"} else "max_ms"
+        shapes.sort(key=lambda e: e[key], reverse=True)
+        return shapes[:max(1, n)]
+
+    def _append(self, record: dict[str, Any]) -> None:
+        try:
+            line = json.dumps(record, default=str, ensure_ascii=False)
+            with self._file_lock:
+                self._rotate()
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+        except OSError as e:
+            logger.warning(f"[query_log] Could not write {self.path}: {e}")
+
+    def _rotate(self) -> None:
+        """path -> path.1 -> ... -> path.<backups> once path reaches max_bytes (caller holds the lock)."""
+        if self.max_bytes <= 0 or not os.path.exists(self.path) or os.path.getsize(self.path) < self.max_bytes:
+            return
+        if self.backups <= 0:
+            os.remove(self.path)
+            return
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def _load(self) -> None:
+        """Rebuild slow-shape aggregates and captured plans from the JSONL file (its last
+        max_bytes at most, in case it predates rotation)."""
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "rb") as f:
+                size = os.path.getsize(self.path)
+                if self.max_bytes > 0 and size > self.max_bytes:
+                    f.seek(size - self.max_bytes)
+                    f.readline()  # skip the partial line
+                for raw in f:
+                    line = raw.decode("utf-8", errors="replace")
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    fp = rec.get("fingerprint")
+                    if not fp:
+                        continue
+                    entry = self._shape_entry(fp, rec.get("shape") or "")
+                    if "plan" in rec:
+                        entry["plan"] = rec["plan"]
+                        entry["plan_captured_at"] = rec.get("ts")
+                        continue
+                    latency = float(rec.get("latency_ms") or 0.0)
+                    entry["calls"] += 1
+                    entry["slow_calls"] += 1
+                    entry["total_ms"] += latency
+                    entry["max_ms"] = max(entry["max_ms"], latency)
+                    entry["rows"] += int(rec.get("rows") or 0)
+                    entry["bytes"] += int(rec.get("bytes") or 0)
+                    entry["last_seen"] = rec.get("ts")
+                    entry["sample_sql"] = rec.get("sql")
+                    for field, value in (("tools", rec.get("tool")), ("graphs", rec.get("graph"))):
+                        if value and value not in entry[field]:
+                            entry[field].append(value)
+        except OSError as e:
+            logger.warning(f"[query_log] Could not read {self.path}: {e}")
+
+
+QUERY_LOG = QueryLog()
@@ -0,0 +1,344 @@
+# tracing.py
+"""
+Minimal OpenTelemetry-style tracing shared by the FastAPI backend and the MCP server.
+
+- Spans nest through a contextvar, so `with start_span(...)` inside any coroutine becomes a
+  child of whatever span is current in that task.
+- Context crosses process boundaries as a W3C `traceparent` string (inject() / extract()); the
+  MCP client puts it in the tools/call request `_meta`.
+- Finished spans go to pluggable exporters: InMemorySpanExporter and OTLPFileSpanExporter
+  (OTLP/JSON, one ExportTraceServiceRequest per line) are built in; TRACE_EXPORTERS picks them.
+- Spans carrying a `stage` attribute add their duration to a per-trace total that
+  stage_breakdown() returns (e.g. llm / mcp / elicitation / db milliseconds for one answer).
+"""
+
+import os, json, time, secrets, threading, atexit, logging
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "age_mcp_server")
+# Comma-separated: memory, otlp_file, none
+TRACE_EXPORTERS = os.getenv("TRACE_EXPORTERS", "memory")
+TRACE_FILE = os.getenv("TRACE_FILE") or os.path.join(os.path.dirname(__file__), "logs", "traces.jsonl")
+TRACE_MEMORY_SPANS = int(os.getenv("TRACE_MEMORY_SPANS", "5000"))
+
+_KIND_CODES = {"internal": 1, "server": 2, "client": 3}
+_MAX_TRACKED_TRACES = 1000
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "kind", "attributes", "events",
+                 "start_ns", "end_ns", "status", "status_message", "local_root")
+
+    def __init__(self, name: str, trace_id: str, parent_id: str | None, kind: str,
+                 attributes: dict[str, Any], local_root: bool):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.kind = kind
+        self.attributes = attributes
+        self.events: list[tuple[int, str, dict[str, Any]]] = []
+        self.start_ns = time.time_ns()
+        self.end_ns: int | None = None
+        self.status = "unset"
+        self.status_message: str | None = None
+        self.local_root = local_root
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def add_event(self, name: str, **attributes: Any) -> None:
+        self.events.append((time.time_ns(), name, attributes))
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = "error"
+        self.status_message = f"{type(exc).__name__}: {exc}"
+        self.add_event("exception", type=type(exc).__name__, message=str(exc))
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name, "trace_id": self.trace_id, "span_id": self.span_id,
+            "parent_id": self.parent_id, "kind": self.kind, "start_ns": self.start_ns,
+            "end_ns": self.end_ns, "duration_ms": round(self.duration_ms, 3),
+            "status": self.status, "status_message": self.status_message,
+            "attributes": self.attributes,
+            "events": [{"ts_ns": ts, "name": n, "attributes": a} for ts, n, a in self.events],
+        }
+
+
+# ── Exporters ────────────────────────────────────────────────────────────────
+class SpanExporter:
+    """Exporter interface: export() is called once per finished span."""
+
+    def export(self, span: Span) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+
+class InMemorySpanExporter(SpanExporter):
+    """Keeps the most recent spans in memory (bounded) for inspection and tests."""
+
+    def __init__(self, max_spans: int = TRACE_MEMORY_SPANS):
+        self._spans: deque[Span] = deque(maxlen=max_spans)
+
+    def export(self, span: Span) -> None:
+        self._spans.append(span)
+
+    def spans(self, trace_id: str | None = None) -> list[Span]:
+        return [s for s in self._spans if trace_id is None or s.trace_id == trace_id]
+
+    def clear(self) -> None:
+        self._spans.clear()
+
+
+def _otlp_value(value: Any) -> dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": value if isinstance(value, str) else json.dumps(value, default=str)}
+
+
+def _otlp_attributes(attributes: dict[str, Any]) -> list[dict[str, Any]]:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items() if v is not None]
+
+
+class OTLPFileSpanExporter(SpanExporter):
+    """
+    Appends OTLP/JSON to a file, one ExportTraceServiceRequest per line (the format of the
+    OpenTelemetry Collector file exporter), so traces can be loaded into any OTLP tool offline.
+    Spans are buffered and written when a local root span ends or the buffer fills.
+    """
+
+    def __init__(self, path: str = TRACE_FILE, service_name: str = SERVICE_NAME, batch_size: int = 64):
+        self.path = path
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self._buffer: list[Span] = []
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        atexit.register(self.flush)
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._buffer.append(span)
+            if not (span.local_root or len(self._buffer) >= self.batch_size):
+                return
+            batch, self._buffer = self._buffer, []
+        self._write(batch)
+
+    def flush(self) -> None:
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if batch:
+            self._write(batch)
+
+    def _write(self, spans: list[Span]) -> None:
+        request = {"resourceSpans": [{
+            "resource": {"attributes": _otlp_attributes({"service.name": self.service_name})},
+            "scopeSpans": [{"scope": {"name": "tracing"}, "spans": [self._otlp_span(s) for s in spans]}],
+        }]}
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(request, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.warning(f"[tracing] Could not write {self.path}: {e}")
+
+    @staticmethod
+    def _otlp_span(span: Span) -> dict[str, Any]:
+        out = {
+            "traceId": span.trace_id,
+            "spanId": span.span_id,
+            "name": span.name,
+            "kind": _KIND_CODES.get(span.kind, 1),
+            "startTimeUnixNano": str(span.start_ns),
+            "endTimeUnixNano": str(span.end_ns or span.start_ns),
+            "attributes": _otlp_attributes(span.attributes),
+            "events": [
+                {"timeUnixNano": str(ts), "name": n, "attributes": _otlp_attributes(a)}
+                for ts, n, a in span.events
+            ],
+            "status": {"code": {"unset": 0, "ok": 1, "error": 2}[span.status]},
+        }
+        if span.parent_id:
+            out["parentSpanId"] = span.parent_id
+        if span.status_message:
+            out["status"]["message"] = span.status_message
+        return out
+
+
+_EXPORTERS: list[SpanExporter] = []
+MEMORY_EXPORTER: InMemorySpanExporter | None = None
+
+
+def add_exporter(exporter: SpanExporter) -> None:
+    _EXPORTERS.append(exporter)
+
+
+def _configure_from_env() -> None:
+    global MEMORY_EXPORTER
+    for name in (n.strip().lower() for n in TRACE_EXPORTERS.split(",")):
+        if name == "memory":
+            MEMORY_EXPORTER = InMemorySpanExporter()
+            add_exporter(MEMORY_EXPORTER)
+        elif name == "otlp_file":
+            add_exporter(OTLPFileSpanExporter())
+        elif name and name != "none":
+            logger.warning(f"[tracing] Unknown exporter '{name}' in TRACE_EXPORTERS")
+
+
+_configure_from_env()
+
+
+# ── Context and span lifecycle ───────────────────────────────────────────────
+_CURRENT: ContextVar[Span | None] = ContextVar("current_span", default=None)
+_STAGES: OrderedDict[str, Counter] = OrderedDict()
+
+
+def current_span() -> Span | None:
+    return _CURRENT.get()
+
+
+def extract(traceparent: str | None) -> tuple[str, str] | None:
+    """Parse a W3C traceparent into (trace_id, parent_span_id); None if absent or malformed."""
+    if not traceparent:
+        return None
+    parts = traceparent.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+def inject(carrier: dict[str, Any], span: Span | None = None) -> dict[str, Any]:
+    """Add `traceparent` for the given (or current) span to a metadata/header dict."""
+    span = span or current_span()
+    if span is not None:
+        carrier["traceparent"] = span.traceparent
+    return carrier
+
+
+def record_stage(trace_id: str, stage: str, duration_ms: float) -> None:
+    """Add time to a trace's stage totals (used for time measured in another process)."""
+    totals = _STAGES.get(trace_id)
+    if totals is None:
+        totals = _STAGES[trace_id] = Counter()
+        while len(_STAGES) > _MAX_TRACKED_TRACES:
+            _STAGES.popitem(last=False)
+    totals[stage] += duration_ms
+
+
+def stage_breakdown(trace_id: str | None = None, *, pop: bool = False) -> dict[str, float]:
+    """Milliseconds per stage for a trace (default: the current one)."""
+    if trace_id is None:
+        span = current_span()
+        trace_id = span.trace_id if span else None
+    if trace_id is None:
+        return {}
+    totals = _STAGES.pop(trace_id, None) if pop else _STAGES.get(trace_id)
+    return {stage: round(ms, 1) for stage, ms in (totals or {}).items()}
+
+
+def _end(span: Span) -> None:
+    span.end_ns = time.time_ns()
+    stage = span.attributes.get("stage")
+    if stage:
+        record_stage(span.trace_id, stage, span.duration_ms)
+    for exporter in _EXPORTERS:
+        try:
+            exporter.export(span)
+        except Exception as e:
+            logger.warning(f"[tracing] Exporter {type(exporter).__name__} failed: {e}")
+
+
+@contextmanager
+def start_span(
+    name: str,
+    *,
+    kind: str = "internal",
+    parent: Span | str | None = None,
+    **attributes: Any,
+) -> Iterator[Span]:
+    """
+    Start a span as a child of `parent` (a Span or a traceparent string) or, by default, of the
+    current span; a new trace starts when there is neither. The span is current inside the block.
+    """
+    local_parent = parent if isinstance(parent, Span) else (None if isinstance(parent, str) else current_span())
+    remote = extract(parent) if isinstance(parent, str) else None
+    if local_parent is not None:
+        trace_id, parent_id = local_parent.trace_id, local_parent.span_id
+    elif remote is not None:
+        trace_id, parent_id = remote
+    else:
+        trace_id, parent_id = secrets.token_hex(16), None
+
+    span = Span(name, trace_id, parent_id, kind, attributes, local_root=local_parent is None)
+    token = _CURRENT.set(span)
+    try:
+        yield span
+        if span.status == "unset":
+            span.status = "ok"
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        try:
+            _CURRENT.reset(token)
+        except ValueError:
+            # Generator closed from another context (e.g. client disconnect finalizer)
+            pass
+        _end(span)
+
+
+# ── FastMCP integration ──────────────────────────────────────────────────────
+from fastmcp.server.middleware import Middleware, MiddlewareContext
+
+
+def _request_traceparent(context: MiddlewareContext) -> str | None:
+    """traceparent sent by the client in the tools/call request `_meta`, if any."""
+    try:
+        meta = context.fastmcp_context.request_context.meta
+    except Exception:
+        return None
+    if meta is None:
+        return None
+    return getattr(meta, "traceparent", None) or (getattr(meta, "model_extra", None) or {}).get("traceparent")
+
+
+class ToolTracingMiddleware(Middleware):
+    """
+    FastMCP middleware: one server span per tool call, continuing the caller's trace. The
+    call's DB time is returned to the caller in the result `_meta` as {"timings": {...}} so
+    the client can include it in its own stage breakdown.
+    """
+
+    async def on_call_tool(self, context: MiddlewareContext, call_next):
+        tool = getattr(context.message, "name", "unknown")
+        with start_span(f"mcp.tool {tool}", kind="server", parent=_request_traceparent(context), tool=tool) as span:
+            db_before = stage_breakdown(span.trace_id).get("db", 0.0)
+            result = await call_next(context)
+            timings = {
+                "tool_ms": round(span.duration_ms, 1),
+                "db_ms": round(stage_breakdown(span.trace_id).get("db", 0.0) - db_before, 1),
+            }
+            span.set_attribute("db_ms", timings["db_ms"])
+            if hasattr(result, "meta"):
+                result.meta = {**(result.meta or {}), "timings": timings}
+            return result
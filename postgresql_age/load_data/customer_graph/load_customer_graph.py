@@ -39,6 +39,30 @@ def _validate_label(label: str):
     if not _LABEL_RE.match(label or ""):
         raise ValueError(f"Invalid label: {label!r}")
 
+# Per-graph data version read by the viewer API (af_fastapi/pg_age_helper.py); bumping it
+# invalidates cached viewer responses and ETags for the graph
+GRAPH_VERSIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS public.graph_versions (
+        graph      name PRIMARY KEY,
+        version    bigint NOT NULL DEFAULT 0,
+        updated_at timestamptz NOT NULL DEFAULT now()
+    );
+"""
+BUMP_GRAPH_VERSION = """
+    INSERT INTO public.graph_versions AS gv (graph, version) VALUES (%s, 1)
+    ON CONFLICT (graph) DO UPDATE SET version = gv.version + 1, updated_at = now();
+"""
+# payload.id -> graphid lookup table used by the viewer API to resolve edge endpoints
+PAYLOAD_IDS_DDL = """
+    CREATE TABLE IF NOT EXISTS public.graph_payload_ids (
+        graph      oid NOT NULL,
+        label      name NOT NULL,
+        payload_id text NOT NULL,
+        id         ag_catalog.graphid NOT NULL,
+        PRIMARY KEY (graph, label, payload_id, id)
+    );
+"""
+
 def _read_json(path: str):
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
@@ -80,8 +104,45 @@ class PGAgeHelper:
             await cur.execute("SELECT ag_catalog.create_graph(%s::name);", (graph,))
             print("Created graph:", graph)
         await conn.commit()
+        await self.bump_graph_version()
         return self
 
+    async def sync_payload_ids(self):
+        """Fill public.graph_payload_ids for every loaded vertex (and drop rows of dropped graphs)."""
+        async with self._conn.cursor() as cur:
+            await cur.execute(PAYLOAD_IDS_DDL)
+            await cur.execute(
+                "DELETE FROM public.graph_payload_ids WHERE graph NOT IN (SELECT graphid FROM ag_catalog.ag_graph);")
+            await cur.execute(sql.SQL("""
+                INSERT INTO public.graph_payload_ids (graph, label, payload_id, id)
+                SELECT l.graph, l.name, (v.properties::text)::jsonb->'payload'->>'id', v.id
+                FROM {} v
+                JOIN ag_catalog.ag_label l ON l.relation::oid = v.tableoid
+                WHERE (v.properties::text)::jsonb->'payload'->>'id' IS NOT NULL
+                ON CONFLICT DO NOTHING;
+            """).format(sql.Identifier(self.graph, "_ag_label_vertex")))
+        await self._conn.commit()
+
+    async def analyze_labels(self):
+        """ANALYZE every label table, so the viewer API's summary and sampling read real
+        pg_class.reltuples / pg_stats instead of estimates."""
+        async with self._conn.cursor() as cur:
+            await cur.execute("""
+                SELECT l.name FROM ag_catalog.ag_label l JOIN ag_catalog.ag_graph g ON l.graph = g.graphid
+                WHERE g.name = %s;
+            """, (self.graph,))
+            names = [r[0] for r in await cur.fetchall()]
+            for name in names:
+                await cur.execute(sql.SQL("ANALYZE {};").format(sql.Identifier(self.graph, name)))
+        await self._conn.commit()
+
+    async def bump_graph_version(self):
+        """Mark the graph as changed for the viewer API (its response cache is keyed on the version)."""
+        async with self._conn.cursor() as cur:
+            await cur.execute(GRAPH_VERSIONS_DDL)
+            await cur.execute(BUMP_GRAPH_VERSION, (self.graph,))
+        await self._conn.commit()
+
     async def create_index_on_payload_id(self, label: str):
         """Create a btree index on payload.id for faster edge lookups."""
         _validate_label(label)
@@ -446,6 +507,7 @@ async def load_from_files():
         id_to_vertex: dict[str, int] = {}  # payload.id -> AGE vertex id
         for label, payloads in nodes_by_label.items():
             label_map = await helper.batch_insert_nodes(label, payloads)
+            await helper.create_index_on_payload_id(label)
             id_to_vertex.update(label_map)
             total_nodes += len(label_map)
 
@@ -471,6 +533,9 @@ async def load_from_files():
         total_edges = 0
         for edge_label, rows in edges_by_label.items():
             total_edges += await helper.batch_create_edges_direct(edge_label, rows)
+        await helper.sync_payload_ids()
+        await helper.analyze_labels()
+        await helper.bump_graph_version()
 
         print(f"Inserted nodes: {total_nodes}")
         print(f"Inserted edges: {total_edges}")
@@ -105,6 +105,31 @@ def _read_graph_json(path: str) -> dict:
     return data
 
 
+# Per-graph data version read by the viewer API (af_fastapi/pg_age_helper.py); bumping it
+# invalidates cached viewer responses and ETags for the graph
+GRAPH_VERSIONS_DDL = """
+    CREATE TABLE IF NOT EXISTS public.graph_versions (
+        graph      name PRIMARY KEY,
+        version    bigint NOT NULL DEFAULT 0,
+        updated_at timestamptz NOT NULL DEFAULT now()
+    );
+"""
+BUMP_GRAPH_VERSION = """
+    INSERT INTO public.graph_versions AS gv (graph, version) VALUES (%s, 1)
+    ON CONFLICT (graph) DO UPDATE SET version = gv.version + 1, updated_at = now();
+"""
+# payload.id -> graphid lookup table used by the viewer API to resolve edge endpoints
+PAYLOAD_IDS_DDL = """
+    CREATE TABLE IF NOT EXISTS public.graph_payload_ids (
+        graph      oid NOT NULL,
+        label      name NOT NULL,
+        payload_id text NOT NULL,
+        id         ag_catalog.graphid NOT NULL,
+        PRIMARY KEY (graph, label, payload_id, id)
+    );
+"""
+
+
 class PGAgeHelper:
     def __init__(self, conn: psycopg.AsyncConnection, graph: str):
         self._conn = conn
@@ -186,11 +211,61 @@ class PGAgeHelper:
             await conn.commit()
         print(f"Graph created in {time.time() - t0:.1f}s", flush=True)
 
-        return cls(conn, graph)
+        helper = cls(conn, graph)
+        await helper.bump_graph_version()
+        return helper
 
     async def close(self):
         await self._conn.close()
 
+    async def sync_payload_ids(self):
+        """Fill public.graph_payload_ids for every loaded vertex (and drop rows of dropped graphs)."""
+        async with self._conn.cursor() as cur:
+            await cur.execute(PAYLOAD_IDS_DDL)
+            await cur.execute(
+                "DELETE FROM public.graph_payload_ids WHERE graph NOT IN (SELECT graphid FROM ag_catalog.ag_graph);")
+            await cur.execute(sql.SQL("""
+                INSERT INTO public.graph_payload_ids (graph, label, payload_id, id)
+                SELECT l.graph, l.name, (v.properties::text)::jsonb->'payload'->>'id', v.id
+                FROM {} v
+                JOIN ag_catalog.ag_label l ON l.relation::oid = v.tableoid
+                WHERE (v.properties::text)::jsonb->'payload'->>'id' IS NOT NULL
+                ON CONFLICT DO NOTHING;
+            """).format(sql.Identifier(self.graph, "_ag_label_vertex")))
+        await self._conn.commit()
+
+    async def analyze_labels(self):
+        """ANALYZE every label table, so the viewer API's summary and sampling read real
+        pg_class.reltuples / pg_stats instead of estimates."""
+        async with self._conn.cursor() as cur:
+            await cur.execute("""
+                SELECT l.name FROM ag_catalog.ag_label l JOIN ag_catalog.ag_graph g ON l.graph = g.graphid
+                WHERE g.name = %s;
+            """, (self.graph,))
+            names = [r[0] for r in await cur.fetchall()]
+            for name in names:
+                await cur.execute(sql.SQL("ANALYZE {};").format(sql.Identifier(self.graph, name)))
+        await self._conn.commit()
+
+    async def bump_graph_version(self):
+        """Mark the graph as changed for the viewer API (its response cache is keyed on the version)."""
+        async with self._conn.cursor() as cur:
+            await cur.execute(GRAPH_VERSIONS_DDL)
+            await cur.execute(BUMP_GRAPH_VERSION, (self.graph,))
+        await self._conn.commit()
+
+    async def create_index_on_payload_id(self, label: str):
+        """Create a btree index on payload.id for faster edge lookups (the viewer API's edge
+        endpoints resolve payload ids through it)."""
+        _validate_label(label)
+        async with self._conn.cursor() as cur:
+            await cur.execute(sql.SQL("""
+                CREATE INDEX IF NOT EXISTS {idx_name}
+                ON {table} (((properties::text)::jsonb->'payload'->>'id'));
+            """).format(idx_name=sql.Identifier(f"idx_{self.graph}_{label}_payload_id"),
+                        table=sql.Identifier(self.graph, label)))
+        await self._conn.commit()
+
     async def batch_insert_nodes(self, label: str, payload_rows: list[dict], chunk_size: int = 10000) -> dict[str, str]:
         if not payload_rows:
             return {}
@@ -514,6 +589,7 @@ async def load_graph_data() -> None:
             print(f"\n[{li}/{len(node_label_items)}] Loading nodes: label={label}, count={len(payload_rows):,}", flush=True)
             t_label = time.time()
             id_map = await helper.batch_insert_nodes(label, payload_rows, chunk_size=CHUNK_SIZE)
+            await helper.create_index_on_payload_id(label)
             id_to_vertex.update(id_map)
             total_nodes += len(id_map)
             print(f"  [{label}] done in {time.time() - t_label:.1f}s  (total nodes so far: {total_nodes:,})", flush=True)
@@ -571,6 +647,11 @@ async def load_graph_data() -> None:
             for label, exc in errors[:10]:
                 print(f"    [{label}]: {exc}", flush=True)
 
+        # Edges were written on the worker connections; publish them to viewer caches once, at the end
+        await helper.sync_payload_ids()
+        await helper.analyze_labels()
+        await helper.bump_graph_version()
+
         elapsed = time.time() - started
         print("\nLoad complete")
         print(f"Inserted nodes: {total_nodes}")
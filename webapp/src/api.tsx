@@ -1,4 +1,5 @@
 // src/lib/api.ts
+import type { NodesPageQuery, SummaryQuery, TraverseQuery } from "@/api/graph";
 
 // In production, use relative URLs (nginx proxies to backend)
 // In development, use localhost
@@ -15,11 +16,42 @@ export const API = {
   graphDiscover: (graphName: string) =>
     `${BASE_URL}/graph/${encodeURIComponent(graphName)}/discover`,
   graphNodes: (graphName: string, limit?: number) =>
-    `${BASE_URL}/graph/${encodeURIComponent(graphName)}/nodes${limit ? `?limit=${limit}` : ""}`,
-  graphNodesByLabel: (graphName: string, label: string, limit?: number) =>
-    `${BASE_URL}/graph/${encodeURIComponent(graphName)}/nodes?label=${encodeURIComponent(label)}${limit ? `&limit=${limit}` : ""}`,
+    `${BASE_URL}/graph/${encodeURIComponent(graphName)}/nodes?layout=true${limit ? `&limit=${limit}` : ""}`,
+  graphNodesByLabel: (graphName: string, label: string, limit?: number, skeleton?: boolean) =>
+    `${BASE_URL}/graph/${encodeURIComponent(graphName)}/nodes?label=${encodeURIComponent(label)}${limit ? `&limit=${limit}` : ""}${skeleton ? "&skeleton=true" : ""}`,
+  graphNodesPage: (graphName: string, opts: NodesPageQuery) => {
+    const q = new URLSearchParams();
+    if (opts.label) q.set("label", opts.label);
+    if (opts.limit) q.set("limit", String(opts.limit));
+    if (opts.cursor) q.set("cursor", opts.cursor);
+    if (opts.layout) q.set("layout", "true");
+    if (opts.sample) q.set("sample", opts.sample);
+    if (opts.strategy) q.set("strategy", opts.strategy);
+    if (opts.seed !== undefined) q.set("seed", String(opts.seed));
+    if (opts.skeleton) q.set("skeleton", "true");
+    return `${BASE_URL}/graph/${encodeURIComponent(graphName)}/nodes?${q}`;
+  },
   graphNodeNeighborhood: (graphName: string, nodeId: string | number) =>
     `${BASE_URL}/graph/${encodeURIComponent(graphName)}/nodes/${encodeURIComponent(String(nodeId))}/neighborhood`,
+  graphElements: (graphName: string) =>
+    `${BASE_URL}/graph/${encodeURIComponent(graphName)}/elements`,
+  graphExpand: (graphName: string) =>
+    `${BASE_URL}/graph/${encodeURIComponent(graphName)}/expand`,
+  graphTraverse: (graphName: string, opts: TraverseQuery) => {
+    const q = new URLSearchParams();
+    for (const [key, value] of Object.entries(opts)) {
+      if (value === undefined || value === "") continue;
+      q.set(key, Array.isArray(value) ? value.join(",") : String(value));
+    }
+    return `${BASE_URL}/graph/${encodeURIComponent(graphName)}/traverse?${q}`;
+  },
+  graphSummary: (graphName: string, opts: SummaryQuery = {}) => {
+    const q = new URLSearchParams();
+    for (const [key, value] of Object.entries(opts)) {
+      if (value !== undefined && value !== "") q.set(key, String(value));
+    }
+    return `${BASE_URL}/graph/${encodeURIComponent(graphName)}/summary?${q}`;
+  },
   elicitationRespond: (elicitationId: string) =>
     `${BASE_URL}/elicitation/${encodeURIComponent(elicitationId)}/respond`,
 };
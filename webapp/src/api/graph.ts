@@ -1,6 +1,9 @@
-import { fetchJson } from "./http";
+import { fetchJson, fetchJsonAs, fetchJsonWithHeaders, postJson, streamNdjson } from "./http";
 import { API } from "@/api.tsx";
-import type { RawItem } from "@/graph/types";
+import type { ColumnarGraph, RawItem } from "@/graph/types";
+import { fromColumnar } from "@/graph/transform";
+
+export const COLUMNAR_JSON = "application/vnd.age-graph.columnar+json";
 
 export type DiscoverLabel = {
   label: string;
@@ -8,13 +11,108 @@ export type DiscoverLabel = {
   sample_payload: string;
 };
 
+export type ExpandRequest = {
+  seeds: Array<string | number>;
+  hops?: number;
+  direction?: "out" | "in" | "both";
+  edge_types?: string[];
+  labels?: string[];
+  per_hop_limit?: number;
+  max_nodes?: number;
+};
+
+export type ExpandResult = {
+  elements: RawItem[];
+  hops: number;
+  queries: number;
+  truncated: boolean;
+};
+
+export type NodesPage = {
+  items: RawItem[];
+  /** Pass back as `cursor` for the next page; undefined on the last page. */
+  nextCursor?: string;
+};
+
+/** Query of GET /graph/{graph}/nodes. */
+export type NodesPageQuery = {
+  label?: string;
+  limit?: number;
+  cursor?: string;
+  /** ask the server for precomputed x/y (see RawItem) */
+  layout?: boolean;
+  /** stratified TABLESAMPLE sample across labels instead of the first page (not paged) */
+  sample?: "system" | "bernoulli";
+  strategy?: "proportional" | "capped";
+  /** same seed, same sample (until the graph changes) */
+  seed?: number;
+  /** node properties are only {id, name, degree, skeleton: true}; see GraphAPI.elements */
+  skeleton?: boolean;
+};
+
+/** Query of GET /graph/{graph}/traverse: (s:src_label)-[edge_label]->(t:dst_label), empty labels match any. */
+export type TraverseQuery = {
+  direction?: "out" | "in" | "both";
+  src_label?: string;
+  edge_label?: string;
+  dst_label?: string;
+  /** payload.id of the focal (s) / other (t) node */
+  src_id?: string;
+  dst_id?: string;
+  edges?: boolean;
+  /** payload keys to return for each node (plus id) */
+  fields?: string[];
+  limit?: number;
+  cursor?: string;
+};
+
+/** Query of GET /graph/{graph}/summary: label super-nodes / super-edges from catalog statistics. */
+export type SummaryQuery = {
+  /** "auto" groups labels by prefix when there are more than max_groups */
+  group_by?: "auto" | "label" | "prefix";
+  /** show labels starting with this individually (a group's "drill") */
+  prefix?: string;
+  max_groups?: number;
+  max_edges?: number;
+};
+
 export const GraphAPI = {
   discoverLabels: (graphName: string) =>
     fetchJson<DiscoverLabel[]>(API.graphDiscover(graphName)),
   initialGraph: (graphName: string) =>
-    fetchJson<RawItem[]>(API.graphNodes(graphName)),
+    fetchJsonAs<ColumnarGraph>(API.graphNodes(graphName), COLUMNAR_JSON).then(fromColumnar),
   nodesByLabel: (graphName: string, label: string, limit?: number) =>
     fetchJson<RawItem[]>(API.graphNodesByLabel(graphName, label, limit)),
+  nodesPage: async (
+    graphName: string,
+    opts: NodesPageQuery = {},
+  ): Promise<NodesPage> => {
+    const { data, headers } = await fetchJsonWithHeaders<RawItem[]>(API.graphNodesPage(graphName, opts));
+    return { items: data, nextCursor: headers.get("X-Next-Cursor") ?? undefined };
+  },
+  /** NDJSON variant of nodesByLabel: onBatch is called as records arrive (nodes before their edges). */
+  streamNodesByLabel: (
+    graphName: string,
+    label: string,
+    limit: number | undefined,
+    onBatch: (items: RawItem[]) => void,
+    opts: { skeleton?: boolean } = {},
+  ) => streamNdjson<RawItem>(API.graphNodesByLabel(graphName, label, limit, opts.skeleton), onBatch),
+  /** Full records (properties included) for element ids, e.g. skeleton nodes the user inspects. */
+  elements: (graphName: string, ids: string[]) =>
+    postJson<RawItem[]>(API.graphElements(graphName), { ids }),
   nodeNeighborhood: (graphName: string, nodeId: string) =>
     fetchJson<RawItem[]>(API.graphNodeNeighborhood(graphName, nodeId)),
+  traverse: async (graphName: string, query: TraverseQuery): Promise<NodesPage> => {
+    const { data, headers } = await fetchJsonWithHeaders<RawItem[]>(API.graphTraverse(graphName, query));
+    return { items: data, nextCursor: headers.get("X-Next-Cursor") ?? undefined };
+  },
+  /** Summary records: properties carry count, degrees and a "drill" request for the real elements. */
+  summary: (graphName: string, query: SummaryQuery = {}) =>
+    fetchJson<RawItem[]>(API.graphSummary(graphName, query)),
+  expand: (graphName: string, req: ExpandRequest) =>
+    postJson<ExpandResult>(API.graphExpand(graphName), {
+      ...req,
+      seeds: req.seeds.map((s) => Number(s)),
+    }),
 };
@@ -7,3 +7,50 @@ export async function fetchJson<T>(url: string): Promise<T> {
   if (!res.ok) throw new Error(`${res.status} ${res.statusText}`);
   return res.json();
 }
+
+export async function fetchJsonAs<T>(url: string, accept: string): Promise<T> {
+  const res = await fetch(url, { headers: { Accept: accept } });
+  if (!res.ok) throw new Error(`${res.status} ${res.statusText}`);
+  return res.json();
+}
+
+export async function fetchJsonWithHeaders<T>(url: string): Promise<{ data: T; headers: Headers }> {
+  const res = await fetch(url);
+  if (!res.ok) throw new Error(`${res.status} ${res.statusText}`);
+  return { data: await res.json(), headers: res.headers };
+}
+
+export async function postJson<T>(url: string, body: unknown): Promise<T> {
+  const res = await fetch(url, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body),
+  });
+  if (!res.ok) throw new Error(`${res.status} ${res.statusText}`);
+  return res.json();
+}
+
+/**
+ * GET an NDJSON stream (Accept: application/x-ndjson) and hand over the parsed lines in
+ * batches, one batch per network chunk, so the caller can render before the last byte.
+ */
+export async function streamNdjson<T>(url: string, onBatch: (items: T[]) => void): Promise<void> {
+  const res = await fetch(url, { headers: { Accept: "application/x-ndjson" } });
+  if (!res.ok) throw new Error(`${res.status} ${res.statusText}`);
+  if (!res.body) {
+    onBatch((await res.text()).split("\n").filter(Boolean).map((l) => JSON.parse(l)));
+    return;
+  }
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  for (;;) {
+    const { done, value } = await reader.read();
+    buffer += decoder.decode(value ?? new Uint8Array(), { stream: !done });
+    const lines = buffer.split("\n");
+    buffer = done ? "" : lines.pop() ?? "";
+    const items = lines.filter(Boolean).map((l) => JSON.parse(l) as T);
+    if (items.length) onBatch(items);
+    if (done) return;
+  }
+}
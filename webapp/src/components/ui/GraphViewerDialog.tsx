@@ -5,7 +5,7 @@ import GraphCanvs3D from "@/components/ui/GraphCanvs3D";
 import NodePropertiesPanel from "@/components/ui/NodePropertiesPanel";
 import { GraphAPI } from "@/api/graph";
 import type { DiscoverLabel } from "@/api/graph";
-import { toGraph, stripAgtype, parseLabel } from "@/graph/transform";
+import { GraphBuilder, toGraph, stripAgtype, parseLabel, parseProps } from "@/graph/transform";
 import { colorForLabel } from "@/graph/colors";
 import type { GraphData, NavLevel, Node } from "@/graph/types";
 import type { ForceGraphMethods } from "react-force-graph-3d";
@@ -98,12 +98,23 @@ export default function GraphViewerDialog({ open, onClose, graphName }: Props) {
 
       setLoading(true);
       try {
-        const items = await GraphAPI.nodesByLabel(graphName, nodeId, 100);
-        const subgraph = toGraph(items);
-        if (subgraph.nodes.length === 0) return;
-        setLevels(prev => [...prev.slice(0, currentIndex + 1), { title, clickedNodeId: nodeId, graph: subgraph }]);
-        setCurrentIndex(i => i + 1);
-        setData(subgraph);
+        // Draw each streamed batch as it arrives; the level is pushed on the first batch with nodes
+        const builder = new GraphBuilder();
+        let pushed = false;
+        // Skeleton records: the canvas needs id / label / name only; properties load on selection
+        await GraphAPI.streamNodesByLabel(graphName, nodeId, 100, (items) => {
+          builder.add(items);
+          const subgraph = builder.graph();
+          if (subgraph.nodes.length === 0) return;
+          if (!pushed) {
+            pushed = true;
+            setLevels(prev => [...prev.slice(0, currentIndex + 1), { title, clickedNodeId: nodeId, graph: subgraph }]);
+            setCurrentIndex(i => i + 1);
+          } else {
+            setLevels(prev => prev.map((lvl, i) => (i === prev.length - 1 ? { ...lvl, graph: subgraph } : lvl)));
+          }
+          setData(subgraph);
+        }, { skeleton: true });
       } catch (err) {
         console.error(`Failed to fetch label nodes for ${nodeId}:`, err);
       } finally {
@@ -162,6 +173,20 @@ export default function GraphViewerDialog({ open, onClose, graphName }: Props) {
     }
   }
 
+  async function selectNode(n: Node | null) {
+    setSelectedNode(n);
+    if (!n?.raw?.skeleton) return;
+    try {
+      const [item] = await GraphAPI.elements(graphName, [n.id]);
+      if (!item) return;
+      // Keep the full properties on the graph node so re-selecting it does not refetch
+      n.raw = parseProps(item.properties);
+      setSelectedNode(cur => (cur?.id === n.id ? { ...n } : cur));
+    } catch (err) {
+      console.error(`Failed to load properties of node ${n.id}:`, err);
+    }
+  }
+
   if (!open) return null;
 
   return (
@@ -205,7 +230,7 @@ export default function GraphViewerDialog({ open, onClose, graphName }: Props) {
             ref={fgRef as any}
             graph={data}
             onNodeClick={handleNodeClick}
-            onNodeSelect={(n) => setSelectedNode(n as Node | null)}
+            onNodeSelect={(n) => selectNode(n as Node | null)}
           />
         </div>
 
@@ -1,4 +1,4 @@
-import type { GraphData, RawItem, Node, Link } from "./types";
+import type { ColumnarGraph, GraphData, RawItem, Node, Link } from "./types";
 import { colorForLabel } from "./colors";
 
 /** Strip AGE agtype quoting: "\"value\"" → "value", "123" → "123" */
@@ -31,38 +31,81 @@ export function isEdgeLike(item: RawItem): boolean {
   return k === "edge" || (!!item.src && !!item.dst);
 }
 
-export function toGraph(items: RawItem[]): GraphData {
-  const nodes = new Map<string, Node>();
-  const links: Link[] = [];
+/**
+ * Incremental toGraph: feed raw items as they arrive (e.g. NDJSON batches) and take a
+ * snapshot after each batch. A real node record replaces the placeholder created for an
+ * edge endpoint that arrived first; non-element lines (kind "meta"/"error") are skipped.
+ */
+export class GraphBuilder {
+  private nodes = new Map<string, Node>();
+  private links: Link[] = [];
+
+  add(items: RawItem[]): void {
+    for (const it of items) {
+      const kind = stripAgtype(it.kind).toLowerCase();
+      if (kind === "meta" || kind === "error") continue;
+      const id = stripAgtype(it.id);
+      if (isEdgeLike(it)) {
+        const src = stripAgtype(it.src);
+        const dst = stripAgtype(it.dst);
+        if (!src || !dst) continue;
+        this.links.push({ source: src, target: dst });
+        for (const end of [src, dst]) {
+          if (!this.nodes.has(end)) this.nodes.set(end, { id: end, group: undefined, color: colorForLabel("Unknown") });
+        }
+        continue;
+      }
 
-  for (const it of items) {
-    const id = stripAgtype(it.id);
-    if (isEdgeLike(it)) {
-      const src = stripAgtype(it.src);
-      const dst = stripAgtype(it.dst);
-      if (src && dst) links.push({ source: src, target: dst });
-      continue;
+      const group = parseLabel(it.label);
+      const props = parseProps(it.properties);
+      this.nodes.set(id, {
+        id,
+        group,
+        color: colorForLabel(group ?? "Unknown"),
+        name: props.name ?? props.id ?? id,
+        mrr: typeof props.current_mrr === "number" ? props.current_mrr : undefined,
+        raw: props,
+        ...(typeof it.x === "number" && typeof it.y === "number" ? { fx: it.x, fy: it.y, fz: 0 } : {}),
+      });
     }
+  }
 
-    const group = parseLabel(it.label);
-    const props = parseProps(it.properties);
+  graph(): GraphData {
+    return { nodes: Array.from(this.nodes.values()), links: [...this.links] };
+  }
+}
 
-    nodes.set(id, {
-      id,
-      group,
-      color: colorForLabel(group ?? "Unknown"),
-      name: props.name ?? props.id ?? id,
-      mrr: typeof props.current_mrr === "number" ? props.current_mrr : undefined,
-      raw: props,
+export function toGraph(items: RawItem[]): GraphData {
+  const builder = new GraphBuilder();
+  builder.add(items);
+  return builder.graph();
+}
+
+/** Expand a columnar payload back into viewer records (nodes first, then edges). */
+export function fromColumnar(payload: ColumnarGraph): RawItem[] {
+  const prop = (code: number) => (code < 0 ? null : JSON.stringify(payload.props[code]));
+  const items: RawItem[] = [];
+  const { nodes, edges, labels } = payload;
+  for (let i = 0; i < nodes.id.length; i++) {
+    const name = labels[nodes.label[i]];
+    items.push({
+      id: nodes.id[i],
+      label: JSON.stringify(name ? [name] : []),
+      properties: prop(nodes.props[i]),
+      kind: "node",
+      ...(nodes.extra?.[String(i)] ?? {}),
+      ...(nodes.x?.[i] != null ? { x: nodes.x[i]!, y: nodes.y![i]! } : {}),
     });
   }
-
-  // Ensure endpoints exist as nodes
-  for (const l of links) {
-    const s = String(l.source), t = String(l.target);
-    if (!nodes.has(s)) nodes.set(s, { id: s, group: undefined, color: colorForLabel("Unknown") });
-    if (!nodes.has(t)) nodes.set(t, { id: t, group: undefined, color: colorForLabel("Unknown") });
+  for (let i = 0; i < edges.id.length; i++) {
+    items.push({
+      id: edges.id[i],
+      label: JSON.stringify(labels[edges.label[i]]),
+      properties: prop(edges.props[i]),
+      kind: "edge",
+      src: edges.src[i],
+      dst: edges.dst[i],
+    });
   }
-
-  return { nodes: Array.from(nodes.values()), links };
+  return items;
 }
@@ -5,6 +5,21 @@ export type RawItem = {
   kind?: string | null;
   src?: string | null;
   dst?: string | null;
+  /** Server-side layout coordinates (GET /nodes?layout=true) */
+  x?: number;
+  y?: number;
+};
+
+/** Compact columnar viewer payload (Accept: application/vnd.age-graph.columnar+json). */
+export type ColumnarGraph = {
+  v: number;
+  labels: string[];
+  props: Record<string, any>[];
+  nodes: {
+    id: string[]; label: number[]; props: number[]; extra?: Record<string, Record<string, any>>;
+    x?: (number | null)[]; y?: (number | null)[];
+  };
+  edges: { id: string[]; label: number[]; src: string[]; dst: string[]; props: number[] };
 };
 
 export type Node = {
@@ -15,6 +30,10 @@ export type Node = {
   mrr?: number;
   raw?: any;
   _isLabel?: boolean;
+  /** Pinned position from a server-side layout; the force simulation leaves these nodes in place */
+  fx?: number;
+  fy?: number;
+  fz?: number;
 };
 
 export type Link = { source: string; target: string };